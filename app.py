@@ -1,138 +1,244 @@
 import os
 import re
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import json
+import hashlib
+import time
+import click
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, session, make_response, g, current_app, has_app_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_migrate import Migrate
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+from collections import Counter
 import pytz
 import logging
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
-from mailersend import emails
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_, update
+from sqlalchemy.orm import contains_eager
+from werkzeug.local import LocalProxy
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the entry points (main.py, the CLI commands below,
+# a WSGI server hook), not on import; see log_setup.configure_logging
+from log_setup import configure_logging
 logger = logging.getLogger(__name__)
 
-# Initialize scheduler with GMT timezone
-scheduler = BackgroundScheduler()
 gmt = pytz.timezone('GMT')
-scheduler.configure(timezone=gmt)
 
-def job_listener(event):
-    if event.exception:
-        logger.error(f'Job failed: {event.job_id}')
-        logger.error(f'Exception: {event.exception}')
-        logger.error(f'Traceback: {event.traceback}')
-    else:
-        logger.info(f'Job completed successfully: {event.job_id}')
+# Extensions; bound to each app in create_app(). State that belongs to one
+# app (page and user caches, the receipt queue, circuit breakers) is kept in
+# app.extensions, so building another app leaves this module's app alone.
+from database import db, MigrateCommands, REPLICA_BIND, pool_options, read_replica, replica_reads
+from query_profiler import QueryProfiler
+from assets import Assets
+from response_cache import ResponseCache
+from user_cache import UserCache
+from delivery_receipts import ReceiptQueue, ReceiptError, WEBHOOKS
+from resilience import (breakers, init_breakers, backoff_delay, ProviderResponseError,
+                        TransientDeliveryError, is_transient)
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+query_profiler = QueryProfiler()
+assets = Assets()
+page_cache = LocalProxy(lambda: current_app.extensions['page_cache'])
+receipt_queue = LocalProxy(lambda: current_app.extensions['receipt_queue'])
 
-scheduler.add_listener(job_listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+# Import models
+from models import User, BinSchedule, EmailLog, PostcodeSchedule, SMSTemplate, SMSLog, NotificationDelivery, NotificationRetry, DispatchRun, ApiToken, user_cache, NOTIFICATION_HOURS
 
-# Initialize extensions
-from database import db
-login_manager = LoginManager()
+# Every route and CLI command below is registered on this blueprint, which
+# create_app() adds to each app it builds
+bp = Blueprint('main', __name__, cli_group=None)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("FLASK_SECRET_KEY") or "a secret key"
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# Initialize MailerSend client with error handling
-try:
-    mailer = emails.NewEmail(os.environ.get('MAILERSEND_API_KEY'))
-    logger.info("MailerSend client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize MailerSend: {str(e)}")
-    mailer = None
-
-# Initialize extensions with app
-db.init_app(app)
-migrate = Migrate(app, db)
-login_manager.init_app(app)
-login_manager.login_view = 'login'
 
-# Import models
-from models import User, BinSchedule, EmailLog, PostcodeSchedule, SMSTemplate, SMSLog
+def create_app(config=None):
+    """
+    Build the Flask app and initialise its extensions.
+
+    Nothing here touches the database or the network: tables come from
+    migrations (or init_db()), provider clients are built on first send and
+    the scheduler only by start_scheduler(). `config` overrides settings read
+    from the environment. Each call returns an independent app: routes come
+    from the `main` blueprint and per-app state lives in app.extensions.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("FLASK_SECRET_KEY") or "a secret key"
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+        **pool_options("DATABASE"),
+    }
+    # Optional read-only replica for admin pages and reports (see read_replica)
+    if os.environ.get("DATABASE_REPLICA_URL"):
+        app.config["SQLALCHEMY_BINDS"] = {
+            REPLICA_BIND: {
+                "url": os.environ["DATABASE_REPLICA_URL"],
+                "pool_recycle": 300,
+                "pool_pre_ping": True,
+                **pool_options("DATABASE_REPLICA"),
+            },
+        }
+    app.config["USER_CACHE_TTL"] = float(os.environ.get("USER_CACHE_TTL", 10))
+    app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", 10000))
+    app.config["SQL_PROFILING"] = os.environ.get("SQL_PROFILING", "").lower() in ("1", "true", "yes")
+    app.config["SQL_SLOW_QUERY_MS"] = float(os.environ.get("SQL_SLOW_QUERY_MS", 100))
+    app.config["APP_BASE_URL"] = os.environ.get("APP_BASE_URL", "http://localhost:5000")
+    app.config["RESPONSE_CACHE_SIZE"] = int(os.environ.get("RESPONSE_CACHE_SIZE", 2000))
+    app.config["DISPATCH_SHARDS"] = int(os.environ.get("DISPATCH_SHARDS", 1))
+    app.config["DISPATCH_WORKERS"] = int(os.environ.get("DISPATCH_WORKERS", 0)) or None
+    app.config["NOTIFICATION_RETRY_LIMIT"] = int(os.environ.get("NOTIFICATION_RETRY_LIMIT", 5))
+    app.config["NOTIFICATION_RETRY_BASE_SECONDS"] = float(os.environ.get("NOTIFICATION_RETRY_BASE_SECONDS", 60))
+    app.config["NOTIFICATION_RETRY_MAX_SECONDS"] = float(os.environ.get("NOTIFICATION_RETRY_MAX_SECONDS", 3600))
+    app.config["CIRCUIT_FAILURE_THRESHOLD"] = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+    app.config["CIRCUIT_RESET_SECONDS"] = float(os.environ.get("CIRCUIT_RESET_SECONDS", 30))
+    app.config["MAILERSEND_CONNECT_TIMEOUT"] = float(os.environ.get("MAILERSEND_CONNECT_TIMEOUT", 5))
+    app.config["MAILERSEND_READ_TIMEOUT"] = float(os.environ.get("MAILERSEND_READ_TIMEOUT", 30))
+    app.config["RECEIPT_BATCH_SIZE"] = int(os.environ.get("RECEIPT_BATCH_SIZE", 500))
+    app.config["RECEIPT_FLUSH_SECONDS"] = float(os.environ.get("RECEIPT_FLUSH_SECONDS", 1))
+    app.config["RECEIPT_QUEUE_SIZE"] = int(os.environ.get("RECEIPT_QUEUE_SIZE", 100000))
+    app.config["RECEIPT_RETRY_LIMIT"] = int(os.environ.get("RECEIPT_RETRY_LIMIT", 5))
+    app.config["IMPORT_FORM_MAX_ROWS"] = int(os.environ.get("IMPORT_FORM_MAX_ROWS", 200))
+    app.config["WEBHOOK_ALLOW_UNSIGNED"] = os.environ.get("WEBHOOK_ALLOW_UNSIGNED", "").lower() in ("1", "true", "yes")
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    app.cli.add_command(MigrateCommands(app, name='db', help='Perform database migrations.'))
+    login_manager.init_app(app)
+    query_profiler.init_app(app)
+    assets.init_app(app)
+    app.extensions['page_cache'] = ResponseCache(maxsize=app.config["RESPONSE_CACHE_SIZE"])
+    app.extensions['user_cache'] = UserCache(User, ttl=app.config["USER_CACHE_TTL"],
+                                             maxsize=app.config["USER_CACHE_SIZE"])
+    ReceiptQueue(app)
+    init_breakers(app)
+    app.register_blueprint(bp)
+    return app
+
+def active_app():
+    """The app in context (a request, CLI command or test), else this module's app (scheduler jobs, shard workers)."""
+    return current_app._get_current_object() if has_app_context() else app
+
+# Built on first use by get_mailer(), start_scheduler() and get_scheduler()
+mailer = None
+scheduler = None
+leader_election = None
+
+# Fixed dispatch jobs, one per slot for every UTC hour: users' chosen hours
+# are local to their time zone, so any UTC hour can be someone's evening or
+# morning. User preference changes never touch these.
+DISPATCH_JOBS = [
+    (slot, hour)
+    for slot in NOTIFICATION_HOURS
+    for hour in range(24)
+]
+DISPATCH_FUNC = 'app:run_dispatch'
+RETRY_JOB_ID = 'notification_retries'
+SHORT_LINK_MAX_AGE = 86400
 
 # Import other dependencies after app and models are set up
 from sms_notifications import send_sms_reminder, send_test_sms
-from decorators import admin_required
+from provisioning import import_users_csv
+from leader_election import LeaderElection
+from dispatch import dispatch_sharded
+from timezones import offset_buckets, is_valid_timezone, COMMON_TIMEZONES, DEFAULT_TIMEZONE
+from planner import plan_notifications, MAX_PLAN_DAYS
+from digest import describe_bin_types, log_bin_types, group_due_schedules, group_retries
+from log_export import iter_export, export_filename, ExportError, EXPORT_FORMATS
+from decorators import admin_required, api_token_required
+from schedule_api import state_etag, serialize_state, apply_changes, ApiValidationError
+from sms_composer import preview_template
+from email_templates import reminder_cohort, render_cohort, mail_payload
+from dispatch_runs import recording, phase, process_name, run_totals, find_overlaps, trend_chart
+
+def init_db():
+    """Create any missing tables; for local runs; deployments use `flask db upgrade`."""
+    with app.app_context():
+        db.create_all()
 
-# Initialize database tables
-with app.app_context():
-    db.create_all()
+def get_mailer():
+    """MailerSend client, built on first use; None if it can't be initialised."""
+    global mailer
+    if mailer is None:
+        try:
+            from mailersend_client import MailerSendClient
+            config = active_app().config
+            client = MailerSendClient(os.environ.get('MAILERSEND_API_KEY'),
+                                      timeout=(config["MAILERSEND_CONNECT_TIMEOUT"],
+                                               config["MAILERSEND_READ_TIMEOUT"]))
+            # Allow pointing at a local stand-in (see benchmarks/fake_providers.py)
+            if os.environ.get('MAILERSEND_API_BASE'):
+                client.api_base = os.environ['MAILERSEND_API_BASE'].rstrip('/')
+                logger.info(f"Using MailerSend API base: {client.api_base}")
+            mailer = client
+            logger.info("MailerSend client initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize MailerSend: {str(e)}")
+    return mailer
+
+def check_mailersend_response(response):
+    """Raise on error responses; the MailerSend SDK returns them as 'status\\nbody'."""
+    status, _, body = str(response).partition('\n')
+    status = status.strip()
+    if not status.isdigit():
+        raise ProviderResponseError(status, body)
+    if int(status) >= 400:
+        raise ProviderResponseError(int(status), body)
+
+def send_collection_reminder(user_email, bin_type, collection_date, raise_transient=False):
+    """
+    Send email reminder with error handling and logging.
 
-def send_collection_reminder(user_email, bin_type, collection_date):
-    """Send email reminder with error handling and logging."""
+    `bin_type` may be a list of bin types collected on the same day, which are
+    sent as one digest email. With raise_transient, failures worth retrying
+    raise TransientDeliveryError (after being logged) instead of returning False.
+    """
+    bin_types = [bin_type] if isinstance(bin_type, str) else list(bin_type)
+    bins = describe_bin_types(bin_types)
     try:
+        mailer = get_mailer()
         if not mailer:
             raise Exception("MailerSend client not initialized")
 
-        with app.app_context():
+        with active_app().app_context():
             user = User.query.filter_by(email=user_email).first()
             if not user:
                 raise ValueError(f"User not found for email: {user_email}")
 
-            invite_url = url_for('register', ref=user.referral_code, _external=True)
-            logger.info(f"Preparing email for {user_email} with referral URL: {invite_url}")
-
-            mail_body = f'''Dear Resident,
-
-This is a reminder that your {bin_type} bin collection is scheduled for tomorrow, {collection_date.strftime('%A, %B %d, %Y')}.
-
-Please ensure your bin is placed outside before the collection time.
-
-Your Account Information:
-------------------------
-SMS Credits Balance: {user.sms_credits} credits
-Want more credits? Share your referral link with friends!
-
-Referral Program:
-----------------
-• You'll get 20 SMS credits for each friend who signs up
-• Your friends will get 10 bonus SMS credits to start
-• Share your unique referral link: {invite_url}
+            invite_url = url_for('main.register', ref=user.referral_code, _external=True)
+            logger.debug("Preparing email for %s with referral URL: %s", user_email, invite_url)
 
-Best regards,
-Your Bin Collection Reminder Service'''
-
-            mail_data = {
-                "from": {
-                    "email": os.environ.get('MAILERSEND_FROM_EMAIL'),
-                    "name": "Bin Collection Reminder"
-                },
-                "to": [{"email": user_email}],
-                "subject": f'Bin Collection Reminder: {bin_type.title()} Collection Tomorrow',
-                "text": mail_body
-            }
+            # The bins/date part is rendered once per cohort; only the
+            # recipient's own fields are filled in here
+            with phase('render'):
+                content = reminder_cohort(bin_types, collection_date).fill(
+                    sms_credits=user.sms_credits,
+                    invite_url=invite_url
+                )
+                mail_data = mail_payload(user_email, content)
 
-            logger.info(f"Attempting to send email to {user_email} with MailerSend")
-            logger.debug(f"Email data: {mail_data}")
+            logger.debug("Attempting to send email to %s with MailerSend", user_email)
+            logger.debug("Email data: %s", mail_data)
 
             # Send email using MailerSend
             try:
-                response = mailer.send(mail_data)
-                logger.info(f"MailerSend API Response for {user_email}: {response}")
+                with phase('send'), breakers['mailersend'].call():
+                    response = mailer.send(mail_data)
+                    logger.debug("MailerSend API Response for %s: %s", user_email, response)
+                    check_mailersend_response(response)
             except Exception as mail_error:
-                raise Exception(f"MailerSend API error: {str(mail_error)}")
+                raise Exception(f"MailerSend API error: {str(mail_error)}") from mail_error
 
             # Log successful email
             email_log = EmailLog(
                 recipient_email=user_email,
-                bin_type=bin_type,
-                status='success'
+                bin_type=log_bin_types(bin_types),
+                status='success',
+                provider_message_id=getattr(response, 'message_id', None)
             )
             db.session.add(email_log)
-            db.session.commit()
+            with phase('commit'):
+                db.session.commit()
 
-            logger.info(f"Successfully sent reminder email to {user_email} for {bin_type} collection")
+            logger.debug("Successfully sent reminder email to %s for %s collection", user_email, bins)
             return True
 
     except Exception as e:
@@ -142,46 +248,38 @@ Your Bin Collection Reminder Service'''
         try:
             email_log = EmailLog(
                 recipient_email=user_email,
-                bin_type=bin_type,
+                bin_type=log_bin_types(bin_types),
                 status='failure',
                 error_message=str(e)
             )
             db.session.add(email_log)
-            db.session.commit()
+            with phase('commit'):
+                db.session.commit()
         except Exception as log_error:
             logger.error(f"Failed to log email error: {str(log_error)}")
 
+        if raise_transient and is_transient(e):
+            raise TransientDeliveryError(str(e)) from e
         return False
 
 def send_test_email(recipient_email):
     """Send a test email to verify email configuration."""
     try:
+        mailer = get_mailer()
         if not mailer:
             raise Exception("MailerSend client not initialized")
 
         logger.info(f"Sending test email to {recipient_email}")
         logger.info(f"Using sender email: {os.environ.get('MAILERSEND_FROM_EMAIL')}")
 
-        with app.app_context():
-            mail_data = {
-                "from": {
-                    "email": os.environ.get('MAILERSEND_FROM_EMAIL'),
-                    "name": "Bin Collection Reminder"
-                },
-                "to": [{"email": recipient_email}],
-                "subject": 'Test Email - Bin Collection Reminder Service',
-                "text": '''This is a test email from your Bin Collection Reminder Service.
-
-If you received this email, the email notification system is working correctly.
-
-Best regards,
-Your Bin Collection Reminder Service'''
-            }
+        with active_app().app_context():
+            mail_data = mail_payload(recipient_email, render_cohort('test').fill())
 
             # Send email using MailerSend and get response
             try:
                 response = mailer.send(mail_data)
                 logger.info(f"MailerSend API Response for test email to {recipient_email}: {response}")
+                check_mailersend_response(response)
             except Exception as mail_error:
                 raise Exception(f"MailerSend API error: {str(mail_error)}")
 
@@ -205,107 +303,465 @@ def validate_date(date_str):
     except ValueError:
         return False
 
-def check_upcoming_collections(notification_time='evening'):
-    """Check and send reminders for tomorrow's collections using GMT timezone."""
-    with app.app_context():
-        try:
-            gmt = pytz.timezone('GMT')
-            current_time = datetime.now(gmt)
-            logger.info(f"Starting collection check at {current_time} GMT")
-
-            if notification_time == 'evening':
-                # For evening notifications, check tomorrow's collections
-                target_date = (current_time + timedelta(days=1)).date()
-                logger.info(f"Checking tomorrow's collections for {target_date}")
-            else:
-                # For morning notifications, check today's collections
-                target_date = current_time.date()
-                logger.info(f"Checking today's collections for {target_date}")
-
-            schedules = BinSchedule.query.join(User).filter(
-                BinSchedule.next_collection.between(
-                    target_date,
-                    target_date + timedelta(days=1)
-                )
-            ).all()
+CHANNEL_PROVIDERS = {'email': 'mailersend', 'sms': 'telnyx'}
+
+def send_reminder(channel, user, bin_types, collection_date):
+    """Send one reminder (a digest for several bin types); raises TransientDeliveryError for failures worth retrying."""
+    if channel == 'email':
+        return send_collection_reminder(user.email, bin_types, collection_date, raise_transient=True)
+    return send_sms_reminder(user.phone, bin_types, collection_date, user, raise_transient=True)
+
+def retry_delay(attempt):
+    config = active_app().config
+    return backoff_delay(attempt,
+                         base=config["NOTIFICATION_RETRY_BASE_SECONDS"],
+                         cap=config["NOTIFICATION_RETRY_MAX_SECONDS"])
+
+def deliver_reminder(items, channel, user, collection_date):
+    """
+    Claim, send and record one reminder channel for a user's schedules
+    collected on the same day.
+
+    `items` is a list of (delivery_key, bin_type). Each schedule is claimed in
+    the ledger; those not already sent go out as one message, a digest when
+    there are several. Returns the outcome ('sent', 'queued' for a transient
+    failure retried later by process_notification_retries, 'failed', or
+    'duplicate' when nothing was left to send) and the claimed delivery keys.
+    """
+    with phase('commit'):
+        claimed = [(key, bin_type) for key, bin_type in items if NotificationDelivery.claim(*key, channel)]
+    if not claimed:
+        logger.debug("%s reminder for schedules %s already sent, skipping", channel, [key[0] for key, _ in items])
+        return 'duplicate', []
+    keys = [key for key, _ in claimed]
+    bin_types = [bin_type for _, bin_type in claimed]
+
+    logger.debug("Attempting to send %s notification to user %s for %s", channel, user.id, bin_types)
+    try:
+        delivered = send_reminder(channel, user, bin_types, collection_date)
+    except TransientDeliveryError as e:
+        # One delay for the whole digest so the retries come due together
+        delay = retry_delay(0)
+        with phase('commit'):
+            for key in keys:
+                NotificationRetry.enqueue(*key, channel, delay=delay, error=str(e))
+        logger.warning(f"{channel} notification for user {user.id} queued for retry: {str(e)}")
+        return 'queued', keys
+
+    if not delivered:
+        with phase('commit'):
+            for key in keys:
+                NotificationDelivery.release(*key, channel)
+    logger.debug("%s notification to user %s %s", channel, user.id, 'sent' if delivered else 'failed')
+    return ('sent' if delivered else 'failed'), keys
+
+def slot_columns(notification_time):
+    if notification_time == 'evening':
+        return User.evening_notification, User.evening_notification_time
+    return User.morning_notification, User.morning_notification_time
+
+def collection_window(target_date):
+    return BinSchedule.next_collection.between(target_date, target_date + timedelta(days=1))
+
+def due_cohort_filter(notification_time, run_at):
+    """
+    Filter for schedules whose owner's local notification hour is `run_at`.
+
+    Users are bucketed by the UTC offset of their time zone at `run_at`, so
+    each bucket is one (time zones, local hour, local collection date) clause
+    served by the (slot, hour, timezone) index.
+    """
+    enabled, notification_hour = slot_columns(notification_time)
+    zones = [zone for (zone,) in db.session.query(User.timezone).distinct()]
+    clauses = []
+    for local_date, local_hour, names in offset_buckets(run_at, zones):
+        if local_hour not in NOTIFICATION_HOURS[notification_time]:
+            continue
+        target_date = local_date + timedelta(days=1) if notification_time == 'evening' else local_date
+        clauses.append(and_(
+            notification_hour == local_hour,
+            User.timezone.in_(names),
+            collection_window(target_date)
+        ))
+    if not clauses:
+        return None
+    return and_(enabled == True, or_(*clauses))
+
+def start_dispatch_run(notification_time, hour, shard, shards):
+    """Record a run as started; returns its DispatchRun id, or None if that fails (the run goes ahead)."""
+    try:
+        return DispatchRun.start(notification_time, hour=hour, shard=shard, shards=shards, process=process_name())
+    except Exception as e:
+        logger.error(f"Failed to record dispatch run start: {str(e)}")
+        return None
 
-            logger.info(f"Found {len(schedules)} collections scheduled for {target_date}")
+def finish_dispatch_run(run_id, outcomes, phases, **values):
+    """Record a run's totals and phase timings."""
+    if run_id is None:
+        return
+    try:
+        DispatchRun.finish(run_id, **run_totals(outcomes, phases), **values)
+    except Exception as e:
+        logger.error(f"Failed to record dispatch run {run_id}: {str(e)}")
 
-            for schedule in schedules:
-                notification_sent = False
-                user = schedule.user
-                logger.info(f"Processing schedule for user {user.email}, bin type: {schedule.bin_type}")
+def check_upcoming_collections(notification_time='evening', hour=None, shard=None, shards=None):
+    """
+    Check and send reminders for upcoming collections.
+
+    With `hour` (a UTC hour, as the hourly dispatch jobs pass it), only users
+    for whom that is their chosen local hour for this slot are notified, and
+    "today"/"tomorrow" are taken in their own time zone. Without it, every
+    user with the slot enabled is notified based on the GMT date. With
+    `shard`/`shards`, only users whose id falls in that partition are
+    processed (see dispatch.py). A user's schedules collected on the same
+    day are sent as one digest per channel. Each run is recorded in
+    DispatchRun with its counts and phase timings. Returns the number of
+    schedules a reminder was sent for.
+    """
+    sent = 0
+    # Per-channel outcome counts for the run summary; per-message detail is DEBUG
+    outcomes = Counter()
+    started = time.perf_counter()
+    cohort_size = users = 0
+    error = None
+    # Reminder links are built with url_for(_external=True), which needs a
+    # request context when run from the scheduler, CLI or a shard worker
+    run_app = active_app()
+    with run_app.test_request_context(base_url=run_app.config["APP_BASE_URL"]), recording(outcomes) as phases:
+        run_id = start_dispatch_run(notification_time, hour, shard, shards)
+        try:
+            current_time = datetime.now(pytz.utc)
+            logger.info(f"Starting {notification_time} collection check at {current_time} UTC (hour {hour})")
+
+            query = BinSchedule.query.join(User).options(contains_eager(BinSchedule.user))
+            if hour is not None:
+                # A late (misfired) run still dispatches the hour it was scheduled for
+                run_at = current_time.replace(hour=hour, minute=0, second=0, microsecond=0)
+                if run_at > current_time:
+                    run_at -= timedelta(days=1)
+                with phase('query'):
+                    cohort = due_cohort_filter(notification_time, run_at)
+                if cohort is None:
+                    logger.info(f"No time zone has a {notification_time} hour due at {run_at}")
+                    return sent
+                query = query.filter(cohort)
+                target_date = run_at.date()
+            else:
+                if notification_time == 'evening':
+                    # For evening notifications, check tomorrow's collections
+                    target_date = (current_time + timedelta(days=1)).date()
+                    logger.info(f"Checking tomorrow's collections for {target_date}")
+                else:
+                    # For morning notifications, check today's collections
+                    target_date = current_time.date()
+                    logger.info(f"Checking today's collections for {target_date}")
+                enabled, _ = slot_columns(notification_time)
+                query = query.filter(enabled == True, collection_window(target_date))
+            if shards:
+                query = query.filter(User.id % shards == shard)
+            with phase('query'):
+                schedules = query.all()
+            cohort_size = len(schedules)
+
+            logger.info(f"Found {len(schedules)} collections due for {notification_time} reminders ({target_date})")
+
+            for user, collection_date, group in group_due_schedules(schedules):
+                sent_ids = set()
+                handled_ids = set()
+                users += 1
+                logger.debug("Processing %d schedules for user %s", len(group), user.id)
 
                 # Determine which notification preferences to use
                 if notification_time == 'evening':
                     should_notify = user.evening_notification
                     notification_type = user.evening_notification_type
-                    logger.info(f"Evening notification settings - enabled: {should_notify}, type: {notification_type}")
                 else:
                     should_notify = user.morning_notification
                     notification_type = user.morning_notification_type
-                    logger.info(f"Morning notification settings - enabled: {should_notify}, type: {notification_type}")
 
                 if should_notify:
-                    # Send email if configured
-                    if notification_type in ['email', 'both']:
-                        logger.info(f"Attempting to send email notification to {user.email}")
-                        email_sent = send_collection_reminder(
-                            user.email,
-                            schedule.bin_type,
-                            schedule.next_collection
-                        )
-                        notification_sent = notification_sent or email_sent
-                        logger.info(f"Email notification {'sent successfully' if email_sent else 'failed'}")
-
-                    # Send SMS if configured
-                    if notification_type in ['sms', 'both']:
-                        logger.info(f"Attempting to send SMS notification to {user.phone}")
-                        sms_sent = send_sms_reminder(
-                            user.phone,
-                            schedule.bin_type,
-                            schedule.next_collection,
-                            user
-                        )
-                        notification_sent = notification_sent or sms_sent
-                        logger.info(f"SMS notification {'sent successfully' if sms_sent else 'failed'}")
-
-                    if notification_sent and notification_time == 'evening':
-                        # Update next collection date based on frequency
+                    # Each channel is claimed in the delivery ledger first, so a
+                    # repeated or overlapping run skips what was already sent
+                    items = [((schedule.id, collection_date, notification_time), schedule.bin_type)
+                             for schedule in group]
+                    channels = {'email': ['email'], 'sms': ['sms'], 'both': ['email', 'sms']}.get(notification_type, [])
+                    for channel in channels:
+                        outcome, keys = deliver_reminder(items, channel, user, collection_date)
+                        outcomes[f'{channel}_{outcome}'] += 1
+                        schedule_ids = {key[0] for key in keys}
+                        if outcome == 'sent':
+                            sent_ids |= schedule_ids
+                        # A queued retry owns the delivery from here on
+                        if outcome in ('sent', 'queued'):
+                            handled_ids |= schedule_ids
+
+                    sent += len(sent_ids)
+
+                    if handled_ids and notification_time == 'evening':
+                        # Update next collection dates based on frequency
                         try:
-                            if schedule.frequency == 'weekly':
-                                schedule.next_collection += timedelta(days=7)
-                            else:  # biweekly
-                                schedule.next_collection += timedelta(days=14)
-
-                            db.session.commit()
-                            logger.info(f"Updated next collection date to {schedule.next_collection}")
+                            for schedule in group:
+                                if schedule.id not in handled_ids:
+                                    continue
+                                if schedule.frequency == 'weekly':
+                                    schedule.next_collection += timedelta(days=7)
+                                else:  # biweekly
+                                    schedule.next_collection += timedelta(days=14)
+                                logger.debug("Updated next %s collection date to %s", schedule.bin_type, schedule.next_collection)
+
+                            user.bump_schedule_version()
+                            with phase('commit'):
+                                db.session.commit()
                         except Exception as e:
                             db.session.rollback()
                             logger.error(f"Failed to update next collection date: {str(e)}")
 
         except Exception as e:
+            error = str(e)
             logger.error(f"Error in check_upcoming_collections: {str(e)}")
+        finally:
+            finish_dispatch_run(run_id, outcomes, phases, cohort_size=cohort_size, users=users, error=error)
+
+    if outcomes:
+        logger.info(f"Finished {notification_time} collection check", extra=dict(
+            outcomes, run_id=run_id, slot=notification_time, hour=hour, shard=shard, schedules_sent=sent,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1)))
+    return sent
+
+def process_notification_retries(limit=500):
+    """
+    Retry queued deliveries whose backoff has elapsed.
+
+    Entries that were one digest (same user, date, slot and channel) are
+    retried as one message again. Entries for a provider whose circuit is
+    open are left untouched until it recovers. Each failed attempt backs off
+    exponentially with jitter; after NOTIFICATION_RETRY_LIMIT attempts the
+    delivery is dropped. Returns the number of schedules a reminder was sent
+    for.
+    """
+    sent = 0
+    run_app = active_app()
+    with run_app.test_request_context(base_url=run_app.config["APP_BASE_URL"]):
+        try:
+            now = NotificationRetry.utcnow()
+            due = NotificationRetry.query.filter(
+                NotificationRetry.next_attempt_at <= now
+            ).order_by(NotificationRetry.next_attempt_at).limit(limit).all()
+            if due:
+                logger.info(f"Retrying {len(due)} queued notifications")
+
+            for group in group_retries(due):
+                first = group[0]
+                channel = first.channel
+                if breakers[CHANNEL_PROVIDERS[channel]].is_open():
+                    continue
+
+                keys = [(retry.bin_schedule_id, retry.collection_date, retry.slot) for retry in group]
+                bin_types = [retry.bin_schedule.bin_type for retry in group]
+                try:
+                    delivered = send_reminder(channel, first.bin_schedule.user, bin_types, first.collection_date)
+                except TransientDeliveryError as e:
+                    attempts = max(retry.attempts for retry in group) + 1
+                    if attempts >= run_app.config["NOTIFICATION_RETRY_LIMIT"]:
+                        logger.error(f"Giving up on {channel} reminder for schedules {[key[0] for key in keys]} "
+                                     f"after {attempts} attempts: {str(e)}")
+                        for retry in group:
+                            db.session.delete(retry)
+                        db.session.commit()
+                        for key in keys:
+                            NotificationDelivery.release(*key, channel)
+                    else:
+                        next_attempt_at = NotificationRetry.utcnow() + timedelta(seconds=retry_delay(attempts))
+                        for retry in group:
+                            retry.attempts = attempts
+                            retry.last_error = str(e)
+                            retry.next_attempt_at = next_attempt_at
+                        db.session.commit()
+                    continue
+
+                for retry in group:
+                    db.session.delete(retry)
+                db.session.commit()
+                if delivered:
+                    sent += len(keys)
+                else:
+                    for key in keys:
+                        NotificationDelivery.release(*key, channel)
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error in process_notification_retries: {str(e)}")
+
+    return sent
+
+def run_dispatch(notification_time, hour=None):
+    """Scheduled entry point: dispatch in-process or across DISPATCH_SHARDS worker processes."""
+    config = active_app().config
+    shards = config["DISPATCH_SHARDS"]
+    if shards > 1:
+        return dispatch_sharded(notification_time, hour, shards=shards,
+                                workers=config["DISPATCH_WORKERS"]).sent
+    return check_upcoming_collections(notification_time, hour)
+
+def job_listener(event):
+    if event.exception:
+        logger.error(f'Job failed: {event.job_id}')
+        logger.error(f'Exception: {event.exception}')
+        logger.error(f'Traceback: {event.traceback}')
+    else:
+        logger.info(f'Job completed successfully: {event.job_id}')
+
+def get_scheduler():
+    """
+    The notification scheduler, created (not started) on first use.
+
+    Jobs are kept in the database so that whichever process wins leader
+    election (see leader_election.py) runs the same definitions, including
+    any run missed during a handover.
+    """
+    global scheduler
+    if scheduler is None:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+
+        jobstores = {}
+        if app.config["SQLALCHEMY_DATABASE_URI"]:
+            jobstores['default'] = SQLAlchemyJobStore(
+                url=app.config["SQLALCHEMY_DATABASE_URI"],
+                engine_options={"pool_recycle": 300, "pool_pre_ping": True}
+            )
+        scheduler = BackgroundScheduler(
+            jobstores=jobstores,
+            job_defaults={'coalesce': True, 'misfire_grace_time': 15 * 60}
+        )
+        scheduler.configure(timezone=gmt)
+        scheduler.add_listener(job_listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+    return scheduler
+
+def register_dispatch_jobs():
+    """
+    Make sure the fixed dispatch jobs exist in the job store.
+
+    Jobs whose definition is unchanged are left alone so a newly elected
+    leader keeps their stored next run time (and runs anything it missed).
+    Dispatch jobs that are no longer defined are removed.
+    """
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    scheduler = get_scheduler()
+    wanted = set()
+    for slot, hour in DISPATCH_JOBS:
+        job_id = f'{slot}_notifications_{hour:02d}'
+        wanted.add(job_id)
+        trigger = CronTrigger(hour=hour, minute=0, timezone=gmt)
+        existing = scheduler.get_job(job_id)
+        if (existing and existing.func_ref == DISPATCH_FUNC and str(existing.trigger) == str(trigger)
+                and list(existing.args) == [slot, hour]):
+            continue
+        scheduler.add_job(
+            DISPATCH_FUNC,
+            trigger,
+            id=job_id,
+            args=[slot, hour],
+            replace_existing=True
+        )
+        logger.info(f"Registered {slot} notification job at {hour}:00 UTC")
+
+    retry_trigger = IntervalTrigger(minutes=1, timezone=gmt)
+    existing = scheduler.get_job(RETRY_JOB_ID)
+    if not existing or str(existing.trigger) != str(retry_trigger):
+        scheduler.add_job('app:process_notification_retries', retry_trigger,
+                          id=RETRY_JOB_ID, replace_existing=True)
+        logger.info("Registered notification retry job")
+    wanted.add(RETRY_JOB_ID)
+
+    for job in scheduler.get_jobs():
+        if job.id not in wanted and job.func_ref in (DISPATCH_FUNC, 'app:check_upcoming_collections'):
+            scheduler.remove_job(job.id)
+            logger.info(f"Removed stale notification job {job.id}")
+
+def start_scheduler():
+    """
+    Start the scheduler paused and join leader election.
+
+    Only processes that should run dispatch jobs call this (main.py, or a
+    WSGI server's post-fork hook); CLI commands and shard workers never do.
+    """
+    global leader_election
+    if leader_election is None:
+        leader_election = LeaderElection(
+            app,
+            get_scheduler(),
+            lease_seconds=int(os.environ.get('SCHEDULER_LEASE_SECONDS', 15)),
+            renew_interval=int(os.environ.get('SCHEDULER_RENEW_SECONDS', 5)),
+            on_elected=register_dispatch_jobs
+        )
+    leader_election.start()
+    return leader_election
+
+def stop_scheduler():
+    """Hand the lease over straight away and shut the scheduler down."""
+    if leader_election is not None:
+        leader_election.stop()
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown()
+        logger.info("Scheduler shut down successfully")
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(db.session, int(user_id))
+
 
+def render_user_page(name, render):
+    """
+    Serve a per-user page through the version-keyed cache with ETag/304.
 
-@app.route('/')
+    The page is keyed on the user's schedule_version and credits (fetched in
+    one small query) plus the date and host. A matching If-None-Match costs
+    nothing more; a cache hit skips the page's queries and template render.
+    """
+    if session.get('_flashes'):
+        # Flash messages are shown once, so this render can't be reused
+        return render()
+
+    version, credits = db.session.query(User.schedule_version, User.sms_credits).filter(
+        User.id == current_user.id
+    ).one()
+    today = datetime.now(pytz.utc).date().isoformat()
+    key = f'{name}:{current_user.id}:{version}:{credits}:{today}:{request.host_url}'
+    etag = hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        body = page_cache.get(etag)
+        if body is None:
+            body = render()
+            page_cache.put(etag, body)
+        response = make_response(body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@bp.route('/')
 def home():  # Changed function name from index to home
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('home.html')
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
-    schedules = BinSchedule.query.filter_by(user_id=current_user.id).all()
-    replit_slug = os.environ.get('REPLIT_SLUG', '')
-    return render_template('dashboard.html', schedules=schedules, replit_slug=replit_slug)
-
-@app.route('/test-email')
+    def render():
+        schedules = BinSchedule.query.filter_by(user_id=current_user.id).all()
+        replit_slug = os.environ.get('REPLIT_SLUG', '')
+        return render_template('dashboard.html', schedules=schedules, replit_slug=replit_slug,
+                               timezones=COMMON_TIMEZONES)
+    return render_user_page('dashboard', render)
+
+@bp.route('/test-email')
 @login_required
 def test_email_route():
     """Route to test email functionality."""
@@ -313,36 +769,38 @@ def test_email_route():
         flash('Test email sent successfully! Please check your inbox.')
     else:
         flash('Failed to send test email. Please check the server logs.')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/calendar')
+@bp.route('/calendar')
 @login_required
 def calendar_view():
-    schedules = BinSchedule.query.filter_by(user_id=current_user.id).all()
-    events = []
-
-    for schedule in schedules:
-        # Calculate all collections for the next 3 months
-        current_date = schedule.next_collection
-        end_date = datetime.now() + timedelta(days=90)
-
-        while current_date <= end_date:
-            events.append({
-                'title': f"{schedule.bin_type.title()} Collection",
-                'start': current_date.strftime('%Y-%m-%d'),
-                'binType': schedule.bin_type,
-                'allDay': True
-            })
-
-            # Add next collection based on frequency
-            if schedule.frequency == 'weekly':
-                current_date += timedelta(days=7)
-            else:  # biweekly
-                current_date += timedelta(days=14)
-
-    return render_template('calendar.html', events=events)
-
-@app.route('/test-sms')
+    def render():
+        schedules = BinSchedule.query.filter_by(user_id=current_user.id).all()
+        events = []
+
+        for schedule in schedules:
+            # Calculate all collections for the next 3 months
+            current_date = schedule.next_collection
+            end_date = datetime.now() + timedelta(days=90)
+
+            while current_date <= end_date:
+                events.append({
+                    'title': f"{schedule.bin_type.title()} Collection",
+                    'start': current_date.strftime('%Y-%m-%d'),
+                    'binType': schedule.bin_type,
+                    'allDay': True
+                })
+
+                # Add next collection based on frequency
+                if schedule.frequency == 'weekly':
+                    current_date += timedelta(days=7)
+                else:  # biweekly
+                    current_date += timedelta(days=14)
+
+        return render_template('calendar.html', events=events)
+    return render_user_page('calendar', render)
+
+@bp.route('/test-sms')
 @login_required
 def test_sms():
     """Route to test SMS functionality."""
@@ -350,20 +808,20 @@ def test_sms():
         flash('Test SMS sent successfully! Please check your phone.')
     else:
         flash('Failed to send test SMS. Please check the server logs.')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         try:
-            email = request.form.get('email')
+            email = User.normalize_email(request.form.get('email'))
             password = request.form.get('password')
 
             if not email or not password:
                 flash('Please provide both email and password')
                 return render_template('auth/login.html')
 
-            user = User.query.filter_by(email=email).first()
+            user = User.find_by_email(email)
 
             if not user:
                 flash('Invalid email or password')
@@ -377,9 +835,9 @@ def login():
 
             # Redirect to first-login page for new users with postcode
             if user.first_login and user.postcode:
-                return redirect(url_for('first_login'))
+                return redirect(url_for('main.first_login'))
 
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
 
         except Exception as e:
             logger.error(f"Login error: {str(e)}")
@@ -388,26 +846,30 @@ def login():
 
     return render_template('auth/login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         try:
-            email = request.form.get('email')
+            email = User.normalize_email(request.form.get('email'))
             phone = request.form.get('phone')
             postcode = request.form.get('postcode')  # Get postcode from form
             password = request.form.get('password')
             referral_code = request.args.get('ref')  # Get referral code from URL
 
-            if User.query.filter_by(email=email).first():
+            if User.find_by_email(email):
                 flash('Email already registered')
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
 
             if not validate_phone(phone):
                 flash('Invalid phone number format. Please use a valid format (e.g., +1234567890)')
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
+
+            timezone = request.form.get('timezone')
+            if not is_valid_timezone(timezone):
+                timezone = DEFAULT_TIMEZONE
 
             # Create new user with default 6 credits and postcode
-            user = User(email=email, phone=phone, postcode=postcode, sms_credits=6)
+            user = User(email=email, phone=phone, postcode=postcode, sms_credits=6, timezone=timezone)
             user.set_password(password)
 
             # Handle referral if present
@@ -417,15 +879,16 @@ def register():
                     user.referred_by_id = referrer.id
                     user.sms_credits = 10  # Bonus credits for being referred
                     referrer.sms_credits += 20  # Bonus credits for referrer
+                    referrer.bump_schedule_version()  # Their dashboard shows the referral count
                     logger.info(f"User {email} referred by {referrer.email}")
 
-            db.session.add(user)
+            user.insert_with_unique_referral_code()
             db.session.commit()
 
             # Send welcome email with referral link
             # (This section needs 'mail' object, which is missing from the provided code)
 
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         except Exception as e:
             logger.error(f"Error during registration: {str(e)}")
             flash('An error occurred during registration. Please try again.')
@@ -433,12 +896,21 @@ def register():
 
     return render_template('auth/register.html', referral_code=request.args.get('ref'))
 
-@app.route('/first-login')
+@bp.route('/r/<string(maxlength=10):code>')
+def short_link(code):
+    """Short invite link used in SMS; redirects to registration with the referral code."""
+    # No lookup: register() ignores unknown codes, so the redirect can be
+    # cached by browsers and proxies
+    response = redirect(url_for('main.register', ref=code))
+    response.headers['Cache-Control'] = f'public, max-age={SHORT_LINK_MAX_AGE}'
+    return response
+
+@bp.route('/first-login')
 @login_required
 def first_login():
     """Handle first-time login and schedule suggestions."""
     if not current_user.first_login:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     try:
         # Get collection schedules for user's postcode
@@ -463,9 +935,9 @@ def first_login():
     except Exception as e:
         logger.error(f"Error loading first login page: {str(e)}")
         flash('Error loading collection schedules')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
-@app.route('/confirm-schedules', methods=['POST'])
+@bp.route('/confirm-schedules', methods=['POST'])
 @login_required
 def confirm_schedules():
     """Handle confirmation of suggested schedules."""
@@ -494,6 +966,7 @@ def confirm_schedules():
 
         # Mark first login as complete
         current_user.first_login = False
+        current_user.bump_schedule_version()
         db.session.commit()
         flash('Collection schedules have been set up successfully')
     except Exception as e:
@@ -501,9 +974,9 @@ def confirm_schedules():
         db.session.rollback()
         flash('Error setting up collection schedules')
 
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/schedule/update', methods=['POST'])
+@bp.route('/schedule/update', methods=['POST'])
 @login_required
 def update_schedule():
     try:
@@ -513,11 +986,11 @@ def update_schedule():
 
         if not validate_date(next_collection_str):
             flash('Invalid date. Please select a date from today onwards.')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
 
         if frequency not in ['weekly', 'biweekly']:
             flash('Invalid frequency selected')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
 
         next_collection = datetime.strptime(next_collection_str, '%Y-%m-%d')
 
@@ -538,6 +1011,7 @@ def update_schedule():
             )
             db.session.add(schedule)
 
+        current_user.bump_schedule_version()
         db.session.commit()
         flash(f'{bin_type.title()} bin schedule updated successfully')
     except Exception as e:
@@ -545,9 +1019,30 @@ def update_schedule():
         db.session.rollback()
         flash('An error occurred while updating the schedule')
 
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/notification-preferences', methods=['POST'])
+@bp.route('/timezone', methods=['POST'])
+@login_required
+def update_timezone():
+    timezone = request.form.get('timezone')
+    if not is_valid_timezone(timezone):
+        flash('Invalid time zone selected')
+        return redirect(url_for('main.dashboard'))
+
+    try:
+        current_user.timezone = timezone
+        current_user.bump_schedule_version()
+        db.session.commit()
+        logger.info(f"Updated time zone for user {current_user.email} to {timezone}")
+        flash('Time zone updated successfully')
+    except Exception as e:
+        logger.error(f"Error updating time zone: {str(e)}")
+        flash('Error updating time zone')
+        db.session.rollback()
+
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/notification-preferences', methods=['POST'])
 @login_required
 def update_notification_preferences():
     try:
@@ -574,29 +1069,29 @@ def update_notification_preferences():
         if evening_notification:
             if evening_notification_type not in ['email', 'sms', 'both']:
                 flash('Invalid evening notification type selected')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
 
             try:
                 evening_notification_time = int(evening_notification_time)
-                if not (12 <= evening_notification_time <= 22):
+                if evening_notification_time not in NOTIFICATION_HOURS['evening']:
                     raise ValueError
             except (ValueError, TypeError):
                 flash('Invalid evening notification time selected')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
 
         # Validate morning notification settings
         if morning_notification:
             if morning_notification_type not in ['email', 'sms', 'both']:
                 flash('Invalid morning notification type selected')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
 
             try:
                 morning_notification_time = int(morning_notification_time)
-                if not (5 <= morning_notification_time <= 11):
+                if morning_notification_time not in NOTIFICATION_HOURS['morning']:
                     raise ValueError
             except (ValueError, TypeError):
                 flash('Invalid morning notification time selected')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
 
         # Update user preferences
         current_user.evening_notification = evening_notification
@@ -605,73 +1100,45 @@ def update_notification_preferences():
         current_user.morning_notification = morning_notification
         current_user.morning_notification_time = morning_notification_time
         current_user.morning_notification_type = morning_notification_type
+        current_user.bump_schedule_version()
 
         # Save to database
         db.session.commit()
         logger.info(f"Updated notification preferences for user {current_user.email}")
-        logger.info(f"Evening: {evening_notification} at {evening_notification_time}:00 GMT ({evening_notification_type})")
-        logger.info(f"Morning: {morning_notification} at {morning_notification_time}:00 GMT ({morning_notification_type})")
-
-        # Update scheduler jobs with explicit GMT timezone
-        scheduler.remove_all_jobs()
-        gmt = pytz.timezone('GMT')
-
-        # Add evening notification job if enabled
-        if evening_notification:
-            scheduler.add_job(
-                check_upcoming_collections,
-                'cron',
-                hour=evening_notification_time,
-                minute=0,
-                timezone=gmt,
-                id='evening_notifications',
-                args=['evening'],
-                replace_existing=True
-            )
-            logger.info(f"Added evening notification job at {evening_notification_time}:00 GMT")
-
-        # Add morning notification job if enabled
-        if morning_notification:
-            scheduler.add_job(
-                check_upcoming_collections,
-                'cron',
-                hour=morning_notification_time,
-                minute=0,
-                timezone=gmt,
-                id='morning_notifications',
-                args=['morning'],
-                replace_existing=True
-            )
-            logger.info(f"Added morning notification job at {morning_notification_time}:00 GMT")
+        logger.info(f"Evening: {evening_notification} at {evening_notification_time}:00 {current_user.timezone} ({evening_notification_type})")
+        logger.info(f"Morning: {morning_notification} at {morning_notification_time}:00 {current_user.timezone} ({morning_notification_type})")
 
         flash('Notification preferences updated successfully')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     except Exception as e:
         logger.error(f"Error updating notification preferences: {str(e)}")
         db.session.rollback()
         flash('An error occurred while updating preferences')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/make_admin')
+@bp.route('/make_admin')
 @login_required
 def make_admin():
     if current_user.email == User.query.order_by(User.id.asc()).first().email:
         current_user.is_admin = True
+        # The nav's Admin link is part of the cached dashboard
+        current_user.bump_schedule_version()
         db.session.commit()
         flash('Admin privileges granted')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 
 # Admin routes
-@app.route('/admin')
+@bp.route('/admin')
 @admin_required
+@read_replica
 def admin_dashboard():
     try:
         # Gather statistics
@@ -699,21 +1166,22 @@ def admin_dashboard():
     except Exception as e:
         logger.error(f"Error in admin dashboard: {str(e)}")
         flash('Error loading dashboard data')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
 
-@app.route('/admin/templates')
+@bp.route('/admin/templates')
 @admin_required
 def admin_templates():
     """View SMS templates."""
     try:
         templates = SMSTemplate.query.all()
-        return render_template('admin/templates.html', templates=templates)
+        previews = {template.id: preview_template(template) for template in templates}
+        return render_template('admin/templates.html', templates=templates, previews=previews)
     except Exception as e:
         logger.error(f"Error loading SMS templates: {str(e)}")
         flash('Error loading templates')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/templates/create', methods=['POST'])
+@bp.route('/admin/templates/create', methods=['POST'])
 @admin_required
 def create_template():
     """Create a new SMS template."""
@@ -732,14 +1200,15 @@ def create_template():
 
         logger.info(f"Created new SMS template: {name}")
         flash('Template created successfully')
+        flash_segment_warning(template)
     except Exception as e:
         logger.error(f"Error creating template: {str(e)}")
         db.session.rollback()
         flash('Error creating template')
 
-    return redirect(url_for('admin_templates'))
+    return redirect(url_for('main.admin_templates'))
 
-@app.route('/admin/templates/<int:template_id>/update', methods=['POST'])
+@bp.route('/admin/templates/<int:template_id>/update', methods=['POST'])
 @admin_required
 def update_template(template_id):
     """Update an existing SMS template."""
@@ -752,15 +1221,44 @@ def update_template(template_id):
         db.session.commit()
         logger.info(f"Updated SMS template: {template.name}")
         flash('Template updated successfully')
+        flash_segment_warning(template)
     except Exception as e:
         logger.error(f"Error updating template: {str(e)}")
         db.session.rollback()
         flash('Error updating template')
 
-    return redirect(url_for('admin_templates'))
+    return redirect(url_for('main.admin_templates'))
+
+@bp.route('/admin/templates/<int:template_id>/toggle', methods=['POST'])
+@admin_required
+def toggle_template(template_id):
+    """Activate or deactivate an SMS template."""
+    try:
+        template = SMSTemplate.query.get_or_404(template_id)
+        template.is_active = not template.is_active
+        db.session.commit()
+        logger.info(f"{'Activated' if template.is_active else 'Deactivated'} SMS template: {template.name}")
+        flash(f"Template {'activated' if template.is_active else 'deactivated'}")
+    except Exception as e:
+        logger.error(f"Error toggling template: {str(e)}")
+        db.session.rollback()
+        flash('Error updating template')
+
+    return redirect(url_for('main.admin_templates'))
 
-@app.route('/admin/users')
+def flash_segment_warning(template):
+    """Warn when a template's worst-case rendering needs more than one SMS segment."""
+    text, segments = preview_template(template)
+    if text is None:
+        flash('Warning: template could not be rendered; check its {variables}')
+    elif segments.segments > 1:
+        reason = f" (UCS-2 because of {''.join(segments.unsupported)})" if segments.unsupported else ''
+        flash(f'Warning: this template can take {segments.segments} SMS segments{reason}, '
+              f'costing {segments.segments} times as much to send')
+
+@bp.route('/admin/users')
 @admin_required
+@read_replica
 def admin_users():
     try:
         users = User.query.all()
@@ -768,25 +1266,50 @@ def admin_users():
     except Exception as e:
         logger.error(f"Error loading users: {str(e)}")
         flash('Error loading user data')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/users/create', methods=['POST'])
+@bp.route('/admin/users/create', methods=['POST'])
 @admin_required
 def create_user():
+    # Bulk import when a CSV file is uploaded instead of the single-user form.
+    # Passwords are hashed inline in the request, so uploads are capped at
+    # IMPORT_FORM_MAX_ROWS; larger files go through `flask import-users`.
+    csv_file = request.files.get('csv_file')
+    if csv_file and csv_file.filename:
+        try:
+            result = import_users_csv(
+                csv_file.read(),
+                default_credits=int(request.form.get('sms_credits') or 6),
+                validate_phone=validate_phone,
+                workers=1,
+                max_rows=current_app.config["IMPORT_FORM_MAX_ROWS"]
+            )
+            logger.info(f"Admin imported {result.created} users from {csv_file.filename}")
+            flash(f'Imported {result.created} users ({result.skipped} already registered or duplicated)')
+            for error in result.errors[:10]:
+                flash(error)
+            if len(result.errors) > 10:
+                flash(f'...and {len(result.errors) - 10} more rows with errors')
+        except Exception as e:
+            logger.error(f"Error importing users: {str(e)}")
+            db.session.rollback()
+            flash('Error importing users')
+        return redirect(url_for('main.admin_users'))
+
     try:
-        email = request.form.get('email')
+        email = User.normalize_email(request.form.get('email'))
         phone = request.form.get('phone')
         password = request.form.get('password')
         is_admin = request.form.get('is_admin') == 'on'
         sms_credits = int(request.form.get('sms_credits', 6))
 
-        if User.query.filter_by(email=email).first():
+        if User.find_by_email(email):
             flash('Email already registered')
-            return redirect(url_for('admin_users'))
+            return redirect(url_for('main.admin_users'))
 
         user = User(email=email, phone=phone, is_admin=is_admin, sms_credits=sms_credits)
         user.set_password(password)
-        db.session.add(user)
+        user.insert_with_unique_referral_code()
         db.session.commit()
 
         logger.info(f"Admin created new user: {email}")
@@ -796,10 +1319,56 @@ def create_user():
         db.session.rollback()
         flash('Error creating user')
 
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('main.admin_users'))
+
+@bp.route('/admin/users/<int:user_id>/credits', methods=['POST'])
+@admin_required
+def update_credits(user_id):
+    try:
+        user = User.query.get_or_404(user_id)
+        credits = int(request.form.get('credits'))
+        if credits < 0:
+            raise ValueError("Credits cannot be negative")
+
+        user.sms_credits = credits
+        db.session.commit()
+
+        logger.info(f"Admin set SMS credits for {user.email} to {credits}")
+        flash('Credits updated successfully')
+    except (TypeError, ValueError):
+        flash('Invalid credit amount')
+    except Exception as e:
+        logger.error(f"Error updating credits: {str(e)}")
+        db.session.rollback()
+        flash('Error updating credits')
+
+    return redirect(url_for('main.admin_users'))
+
+@bp.route('/admin/users/<int:user_id>/toggle-admin', methods=['POST'])
+@admin_required
+def toggle_admin(user_id):
+    try:
+        user = User.query.get_or_404(user_id)
+        if user.id == current_user.id:
+            flash('You cannot change your own admin status')
+            return redirect(url_for('main.admin_users'))
+
+        user.is_admin = not user.is_admin
+        user.bump_schedule_version()
+        db.session.commit()
+
+        logger.info(f"Admin {'granted' if user.is_admin else 'revoked'} admin for {user.email}")
+        flash('Admin status updated')
+    except Exception as e:
+        logger.error(f"Error toggling admin: {str(e)}")
+        db.session.rollback()
+        flash('Error updating admin status')
+
+    return redirect(url_for('main.admin_users'))
 
-@app.route('/admin/reminders')
+@bp.route('/admin/reminders')
 @admin_required
+@read_replica
 def admin_reminders():
     try:
         today = datetime.now().date()
@@ -812,10 +1381,11 @@ def admin_reminders():
     except Exception as e:
         logger.error(f"Error loading reminders: {str(e)}")
         flash('Error loading reminder data')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/emails')
+@bp.route('/admin/emails')
 @admin_required
+@read_replica
 def admin_email_logs():
     try:
         logs = EmailLog.query.order_by(EmailLog.sent_at.desc()).all()
@@ -823,10 +1393,11 @@ def admin_email_logs():
     except Exception as e:
         logger.error(f"Error loading email logs: {str(e)}")
         flash('Error loading email logs')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/sms')
+@bp.route('/admin/sms')
 @admin_required
+@read_replica
 def admin_sms_logs():
     try:
         logs = SMSLog.query.order_by(SMSLog.sent_at.desc()).all()
@@ -834,9 +1405,227 @@ def admin_sms_logs():
     except Exception as e:
         logger.error(f"Error loading SMS logs: {str(e)}")
         flash('Error loading SMS logs')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
+
+@bp.route('/admin/<any(sms, email):kind>/export')
+@admin_required
+@read_replica
+def admin_export_logs(kind):
+    """Stream SMS or email logs as CSV or JSONL, filtered by date range and status."""
+    fmt = request.args.get('format', 'csv')
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    status = request.args.get('status') or None
+    try:
+        chunks = iter_export(kind, fmt, start=start, end=end, status=status)
+    except ExportError as e:
+        flash(str(e))
+        return redirect(url_for('main.admin_sms_logs' if kind == 'sms' else 'admin_email_logs'))
+
+    logger.info(f"Admin {current_user.email} exporting {kind} logs ({fmt}, {start} to {end}, status {status})")
+    filename = export_filename(kind, fmt, start, end, status)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@bp.route('/admin/plan')
+@admin_required
+@read_replica
+def admin_plan_notifications():
+    """Dry-run forecast of reminders and SMS credits, as JSON."""
+    try:
+        start = request.args.get('date') or datetime.now(pytz.timezone('GMT')).date().isoformat()
+        days = request.args.get('days', 1, type=int)
+        slot = request.args.get('slot')
+        if slot and slot not in NOTIFICATION_HOURS:
+            return jsonify({'status': 'error', 'error': f'Unknown slot {slot}'}), 400
+        if not 1 <= days <= MAX_PLAN_DAYS:
+            return jsonify({'status': 'error', 'error': f'days must be between 1 and {MAX_PLAN_DAYS}'}), 400
+        plan = plan_notifications(start, days=days, slots=[slot] if slot else None)
+        return jsonify(dict(plan, status='success'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error planning notifications: {str(e)}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@bp.route('/admin/query-profile')
+@admin_required
+def admin_query_profile():
+    """Per-endpoint query counts and slowest statements (requires SQL_PROFILING)."""
+    if request.args.get('reset'):
+        query_profiler.reset()
+        return redirect(url_for('main.admin_query_profile'))
+    return render_template('admin/query_profile.html',
+                           enabled=query_profiler.enabled,
+                           report=query_profiler.report())
+
+DISPATCH_RUNS_LIMIT = 200
+
+@bp.route('/admin/dispatch-runs')
+@admin_required
+@read_replica
+def admin_dispatch_runs():
+    """Timeline of recent dispatch runs with duration, throughput and volume trends."""
+    slot = request.args.get('slot')
+    limit = min(max(request.args.get('limit', DISPATCH_RUNS_LIMIT, type=int), 1), 1000)
+    query = DispatchRun.query
+    if slot in NOTIFICATION_HOURS:
+        query = query.filter(DispatchRun.slot == slot)
+    runs = query.order_by(DispatchRun.started_at.desc()).limit(limit).all()
+
+    chronological = runs[::-1]
+    finished = [run for run in chronological if run.finished_at is not None]
+    charts = {
+        'Duration (s)': trend_chart(finished, [
+            ('total', lambda run: run.duration_ms / 1000),
+            ('send', lambda run: run.send_ms / 1000),
+        ]),
+        'Throughput (messages/s)': trend_chart(finished, [
+            ('messages/s', lambda run: run.throughput),
+        ]),
+        'Messages': trend_chart(finished, [
+            ('sent', lambda run: run.email_sent + run.sms_sent),
+            ('failed', lambda run: run.email_failed + run.sms_failed),
+            ('queued', lambda run: run.email_queued + run.sms_queued),
+        ]),
+    }
+    return render_template('admin/dispatch_runs.html',
+                           runs=runs,
+                           charts=charts,
+                           overlaps=find_overlaps(runs, DispatchRun.utcnow()),
+                           slot=slot,
+                           slots=list(NOTIFICATION_HOURS),
+                           limit=limit)
+
+def api_state_response(user_id):
+    """The user's current API state as compact JSON, cached by ETag."""
+    user = db.session.get(User, user_id)
+    etag = state_etag(user.id, user.schedule_version)
+    body = page_cache.get(f'api:{etag}')
+    if body is None:
+        schedules = BinSchedule.query.filter_by(user_id=user.id).all()
+        body = json.dumps(serialize_state(user, schedules), separators=(',', ':'))
+        page_cache.put(f'api:{etag}', body)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@bp.route('/api/v1/state', methods=['GET'])
+@api_token_required
+def api_get_state():
+    """
+    Schedules and notification preferences for the token's user.
+
+    Polling with If-None-Match costs the single token lookup and returns 304
+    until something changes.
+    """
+    etag = state_etag(g.api_user_id, g.api_schedule_version)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return api_state_response(g.api_user_id)
+
+@bp.route('/api/v1/state', methods=['PATCH'])
+@api_token_required
+def api_update_state():
+    """
+    Apply a batch of schedule and preference changes in one transaction.
+
+    With If-Match, the write only succeeds if the state is still the one the
+    client last saw; otherwise 412 is returned and nothing is changed.
+    """
+    etag = state_etag(g.api_user_id, g.api_schedule_version)
+    conditional = bool(request.if_match) and not request.if_match.star_tag
+    if conditional and not request.if_match.contains(etag):
+        return jsonify({'status': 'error', 'error': 'State has changed; fetch it again'}), 412
+
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({'status': 'error', 'error': 'Request body must be JSON'}), 400
+
+    try:
+        user = db.session.get(User, g.api_user_id)
+        schedules = BinSchedule.query.filter_by(user_id=user.id).all()
+        apply_changes(user, schedules, payload)
+
+        bump = update(User).where(User.id == user.id).values(schedule_version=User.schedule_version + 1)
+        if conditional:
+            # Compare-and-swap, so two clients holding the same ETag can't both write
+            bump = bump.where(User.schedule_version == g.api_schedule_version)
+        if db.session.execute(bump).rowcount == 0:
+            db.session.rollback()
+            return jsonify({'status': 'error', 'error': 'State has changed; fetch it again'}), 412
+        db.session.commit()
+        user_cache.invalidate(user.id)
+        logger.info(f"Updated schedules/preferences via API for user {user.email}")
+    except ApiValidationError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'error': str(e), 'errors': e.errors}), 400
+    except Exception as e:
+        logger.error(f"Error applying API changes: {str(e)}")
+        db.session.rollback()
+        return jsonify({'status': 'error', 'error': 'An error occurred while saving changes'}), 500
+
+    return api_state_response(g.api_user_id)
 
-@app.route('/api/check-notifications', methods=['GET'])
+@bp.route('/api-tokens', methods=['POST'])
+@login_required
+def create_api_token():
+    try:
+        name = (request.form.get('name') or 'API token').strip()[:50]
+        _, token = ApiToken.issue(current_user.id, name=name)
+        db.session.commit()
+        logger.info(f"Issued API token '{name}' for user {current_user.email}")
+        flash(f'New API token (copy it now, it will not be shown again): {token}')
+    except Exception as e:
+        logger.error(f"Error issuing API token: {str(e)}")
+        db.session.rollback()
+        flash('Error creating API token')
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/api-tokens/revoke', methods=['POST'])
+@login_required
+def revoke_api_tokens():
+    try:
+        revoked = ApiToken.query.filter_by(user_id=current_user.id).delete()
+        db.session.commit()
+        logger.info(f"Revoked {revoked} API tokens for user {current_user.email}")
+        flash(f'Revoked {revoked} API token(s)')
+    except Exception as e:
+        logger.error(f"Error revoking API tokens: {str(e)}")
+        db.session.rollback()
+        flash('Error revoking API tokens')
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/webhooks/<any(telnyx, mailersend):provider>', methods=['POST'])
+def delivery_webhook(provider):
+    """
+    Delivery receipts from Telnyx and MailerSend.
+
+    Receipts are only verified and queued here; receipt_queue applies them to
+    the logs in batches, so bursts never hold up web workers.
+    """
+    kind, verify_signature, parse = WEBHOOKS[provider]
+    body = request.get_data()
+    if not verify_signature(body, request.headers, allow_unsigned=current_app.config["WEBHOOK_ALLOW_UNSIGNED"]):
+        return jsonify({'status': 'error', 'error': 'Invalid signature'}), 401
+    try:
+        updates = parse(json.loads(body))
+    except (ValueError, ReceiptError) as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    # A non-2xx makes the provider redeliver later
+    if updates and not receipt_queue.put(kind, updates):
+        return jsonify({'status': 'error', 'error': 'Receipt queue full'}), 503
+    return jsonify({'status': 'success', 'queued': len(updates)})
+
+@bp.route('/api/check-notifications', methods=['GET'])
 def check_notifications():
     """
     Public endpoint to check and send overdue notifications.
@@ -852,50 +1641,14 @@ def check_notifications():
             'errors': 0
         }
 
-        # Check evening notifications (for tomorrow's collections)
-        evening_users = User.query.filter(
-            User.evening_notification == True
-        ).all()
-
-        for user in evening_users:
-            # Get user's notification time in GMT
-            user_notification_time = current_time.replace(
-                hour=user.evening_notification_time,
-                minute=0,
-                second=0,
-                microsecond=0
-            )
-
-            if current_time > user_notification_time:
-                try:
-                    # Check collections and send notifications
-                    check_upcoming_collections('evening')
-                    notifications_sent['evening'] += 1
-                except Exception as e:
-                    logger.error(f"Error sending evening notification: {str(e)}")
-                    notifications_sent['errors'] += 1
-
-        # Check morning notifications (for today's collections)
-        morning_users = User.query.filter(
-            User.morning_notification == True
-        ).all()
-
-        for user in morning_users:
-            # Get user's notification time in GMT
-            user_notification_time = current_time.replace(
-                hour=user.morning_notification_time,
-                minute=0,
-                second=0,
-                microsecond=0
-            )
-
-            if current_time > user_notification_time:
-                try:
-                    check_upcoming_collections('morning')
-                    notifications_sent['morning'] += 1
-                except Exception as e:
-                    logger.error(f"Error sending morning notification: {str(e)}")
-                    notifications_sent['errors'] += 1
+        # Only users whose chosen local hour is the current one; the hourly
+        # jobs (or earlier calls) have already covered the other hours
+        for slot in NOTIFICATION_HOURS:
+            try:
+                notifications_sent[slot] += check_upcoming_collections(slot, current_time.hour)
+            except Exception as e:
+                logger.error(f"Error sending {slot} notifications: {str(e)}")
+                notifications_sent['errors'] += 1
 
         logger.info(f"Notifications sent: {notifications_sent}")
         return jsonify({'status': 'success',
@@ -911,7 +1664,7 @@ def check_notifications():
         }), 500
 
 # Admin routes
-@app.route('/admin/test-email', methods=['POST'])
+@bp.route('/admin/test-email', methods=['POST'])
 @admin_required
 def admin_test_email():
     """Admin route to test email functionality."""
@@ -919,7 +1672,7 @@ def admin_test_email():
         test_email = request.form.get('test_email')
         if not test_email:
             flash('Please provide an email address')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
 
         if send_test_email(test_email):
             flash('Test email sent successfully! Please check the inbox.')
@@ -930,9 +1683,9 @@ def admin_test_email():
         logger.error(f"Error in admin test email: {str(e)}")
         flash('Error sending test email')
 
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/test-sms', methods=['POST'])
+@bp.route('/admin/test-sms', methods=['POST'])
 @admin_required
 def admin_test_sms():
     """Admin route to test SMS functionality."""
@@ -940,12 +1693,12 @@ def admin_test_sms():
         test_phone = request.form.get('test_phone')
         if not test_phone:
             flash('Please provide a phone number')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
 
         # Validate phone number
         if not validate_phone(test_phone):
             flash('Invalid phone number format. Please use a valid format (e.g., +1234567890)')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
 
         if send_test_sms(test_phone, current_user):
             flash('Test SMS sent successfully! Please check the phone.')
@@ -956,11 +1709,101 @@ def admin_test_sms():
         logger.error(f"Error in admin test SMS: {str(e)}")
         flash('Error sending test SMS')
 
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
+
+@bp.cli.command('import-users')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--credits', default=6, show_default=True, help='SMS credits for rows without sms_credits')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--workers', type=int, help='password hashing processes (default: CPU count)')
+def import_users_command(csv_path, credits, batch_size, workers):
+    """Bulk-create users from a CSV file."""
+    configure_logging()
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        result = import_users_csv(f, default_credits=credits, validate_phone=validate_phone,
+                                  batch_size=batch_size, workers=workers)
+    click.echo(f"Created {result.created} users, skipped {result.skipped}")
+    for error in result.errors:
+        click.echo(error, err=True)
+
+@bp.cli.command('dispatch')
+@click.argument('slot', type=click.Choice(list(NOTIFICATION_HOURS)))
+@click.option('--hour', type=int, help='only users who chose this hour (default: all users in the slot)')
+@click.option('--shards', default=1, show_default=True, help='number of user id partitions')
+@click.option('--shard', type=int, help='run only this partition in-process (for spreading shards across nodes)')
+@click.option('--workers', type=int, help='worker processes (default: CPU count)')
+def dispatch_command(slot, hour, shards, shard, workers):
+    """Send reminders for a slot now, optionally sharded across processes."""
+    configure_logging()
+    if shard is not None:
+        if not 0 <= shard < shards:
+            raise click.BadParameter(f'must be between 0 and {shards - 1}', param_hint='--shard')
+        sent = check_upcoming_collections(slot, hour, shard=shard, shards=shards)
+        click.echo(json.dumps({'slot': slot, 'hour': hour, 'shard': shard, 'shards': shards, 'sent': sent}))
+        return
+
+    if shards > 1:
+        result = dispatch_sharded(slot, hour, shards=shards, workers=workers)
+        click.echo(json.dumps(result.as_dict(), indent=2))
+        return
+
+    sent = check_upcoming_collections(slot, hour)
+    click.echo(json.dumps({'slot': slot, 'hour': hour, 'sent': sent}))
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create any missing tables without running migrations (local development)."""
+    configure_logging()
+    init_db()
+    click.echo("Database tables created")
+
+@bp.cli.command('plan-notifications')
+@click.option('--date', 'start', help='first run date, YYYY-MM-DD (default: today, GMT)')
+@click.option('--days', default=1, show_default=True, help=f'number of days to plan (max {MAX_PLAN_DAYS})')
+@click.option('--slot', type=click.Choice(list(NOTIFICATION_HOURS)), help='only this slot')
+@click.option('--json', 'as_json', is_flag=True, help='print the full plan as JSON')
+def plan_notifications_command(start, days, slot, as_json):
+    """Forecast reminders and SMS credits without sending anything."""
+    configure_logging()
+    start = start or datetime.now(pytz.timezone('GMT')).date().isoformat()
+    with replica_reads():
+        plan = plan_notifications(start, days=days, slots=[slot] if slot else None)
+    if as_json:
+        click.echo(json.dumps(plan, indent=2))
+        return
+
+    click.echo(f"{'run date':<12} {'slot':<8} {'email':>7} {'sms':>7} {'credits':>8} {'skipped':>8}")
+    for run in plan['runs']:
+        click.echo(f"{run['run_date']:<12} {run['slot']:<8} {run['email']:>7} {run['sms']:>7} "
+                   f"{run['credits_consumed']:>8} {run['skipped_sms']:>8}")
+    totals = plan['totals']
+    click.echo(f"{'total':<21} {totals['email']:>7} {totals['sms']:>7} "
+               f"{totals['credits_consumed']:>8} {totals['skipped_sms']:>8}")
+
+@bp.cli.group('assets')
+def assets_cli():
+    """Build fingerprinted, precompressed static assets."""
+
+@assets_cli.command('build')
+def assets_build_command():
+    """Write static/manifest.json and .gz/.br copies of text assets."""
+    manifest, compressed = assets.build()
+    click.echo(f"Fingerprinted {len(manifest)} files, precompressed {compressed}")
+
+@assets_cli.command('vendor-fullcalendar')
+def assets_vendor_fullcalendar_command():
+    """Download FullCalendar into static/ so the calendar page needs no CDN."""
+    target, size = assets.vendor_fullcalendar()
+    click.echo(f"Saved {size} bytes to {target}; run 'flask assets build' to fingerprint it")
+
+# Create the app, once every route and command is on the blueprint
+app = create_app()
 
 if __name__ == '__main__':
-    # Start the scheduler
-    scheduler.start()
+    configure_logging()
+    init_db()
+    # Start the scheduler; it only runs jobs while this process holds the lease
+    start_scheduler()
     logger.info("Notification scheduler started")
 
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,181 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import urllib.request
+
+from flask import abort, current_app, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip copies are built without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+FULLCALENDAR_VERSION = '6.1.10'
+FULLCALENDAR_URL = f'https://cdn.jsdelivr.net/npm/fullcalendar@{FULLCALENDAR_VERSION}/index.global.min.js'
+FULLCALENDAR_PATH = 'vendor/fullcalendar/index.global.min.js'
+
+_HASHED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+
+def _hashed_name(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{digest}{ext}'
+
+
+class Assets:
+    """
+    Content-hashed static files with long-lived caching.
+
+    asset_url('css/style.css') in templates returns /assets/css/style.<hash>.css.
+    Because the name changes whenever the content does, responses are served
+    with an immutable one-year Cache-Control, and pre-built .br/.gz copies
+    (see `flask assets build`) are used when the client accepts them.
+    """
+
+    def __init__(self, app=None):
+        self._manifests = {}  # static folder -> manifest
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['assets'] = self
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+        app.jinja_env.globals['asset_exists'] = self.exists
+
+    # Manifest
+
+    @property
+    def static_folder(self):
+        return current_app.static_folder
+
+    @property
+    def manifest(self):
+        # Loaded (or hashed) on first use rather than at startup
+        folder = self.static_folder
+        if folder not in self._manifests:
+            self._manifests[folder] = self._load_manifest()
+        return self._manifests[folder]
+
+    @manifest.setter
+    def manifest(self, value):
+        self._manifests[self.static_folder] = value
+
+    def _source_files(self):
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                if name == MANIFEST_NAME or name.endswith(('.gz', '.br')):
+                    continue
+                full_path = os.path.join(root, name)
+                yield os.path.relpath(full_path, self.static_folder).replace(os.sep, '/')
+
+    def _digest(self, path):
+        with open(os.path.join(self.static_folder, path), 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+
+    def build_manifest(self):
+        return {path: _hashed_name(path, self._digest(path)) for path in sorted(self._source_files())}
+
+    def _load_manifest(self):
+        manifest_path = os.path.join(self.static_folder, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                return json.load(f)
+        # No build step has run (e.g. in development): hash at startup
+        return self.build_manifest()
+
+    # Template helpers
+
+    def url(self, filename):
+        if current_app.debug:
+            # Pick up edits without a restart
+            hashed = _hashed_name(filename, self._digest(filename)) if self.exists(filename) else None
+        else:
+            hashed = self.manifest.get(filename)
+        if not hashed:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=hashed)
+
+    def exists(self, filename):
+        return filename in self.manifest or os.path.isfile(os.path.join(self.static_folder, filename))
+
+    # Serving
+
+    def serve(self, filename):
+        match = _HASHED_NAME.match(filename)
+        if not match:
+            abort(404)
+        source = f"{match.group('stem')}{match.group('ext')}"
+        source_path = safe_join(self.static_folder, source)
+        if source_path is None or not os.path.isfile(source_path):
+            abort(404)
+
+        # An old hash after a deploy still gets the current file, just not cached forever
+        current = self.manifest.get(source) or _hashed_name(source, self._digest(source))
+        immutable = current == filename
+
+        mimetype = mimetypes.guess_type(source)[0] or 'application/octet-stream'
+        # Parsed with q-values, so 'gzip;q=0' refuses gzip
+        accepted = request.accept_encodings
+        response = None
+        for encoding, suffix in PRECOMPRESSED:
+            if accepted.quality(encoding) > 0 and os.path.isfile(source_path + suffix):
+                response = send_file(source_path + suffix, mimetype=mimetype, conditional=True)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_file(source_path, mimetype=mimetype, conditional=True)
+
+        response.headers['Vary'] = 'Accept-Encoding'
+        if immutable:
+            response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    # Build
+
+    def build(self):
+        """Write manifest.json plus .gz (and .br when brotli is installed) copies."""
+        manifest = self.build_manifest()
+        compressed = 0
+        for path in manifest:
+            mimetype = mimetypes.guess_type(path)[0] or ''
+            if not mimetype.startswith(COMPRESSIBLE_TYPES):
+                continue
+            full_path = os.path.join(self.static_folder, path)
+            with open(full_path, 'rb') as f:
+                data = f.read()
+            with open(full_path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(full_path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            compressed += 1
+
+        with open(os.path.join(self.static_folder, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        self.manifest = manifest
+        return manifest, compressed
+
+    def vendor_fullcalendar(self):
+        """Download the pinned FullCalendar bundle into static/vendor."""
+        target = os.path.join(self.static_folder, FULLCALENDAR_PATH)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(FULLCALENDAR_URL, timeout=30) as response:
+            data = response.read()
+        with open(target, 'wb') as f:
+            f.write(data)
+        return target, len(data)
@@ -0,0 +1,5 @@
+"""
+Benchmark suite for the notification pipeline and web views.
+
+Run with ``python -m benchmarks.run --scale 1k``. See README.md for details.
+"""
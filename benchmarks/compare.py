@@ -0,0 +1,59 @@
+"""
+Compare two benchmark result files.
+
+Usage:
+    python -m benchmarks.compare bench_base.json bench_head.json --threshold 0.10
+
+Exits with status 1 if any benchmark's median got slower by more than the
+threshold (a fraction, default 10%).
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base, head, threshold):
+    rows = []
+    regressions = []
+    for name, head_result in head['results'].items():
+        base_result = base['results'].get(name)
+        if not base_result:
+            rows.append((name, None, head_result['median'], None))
+            continue
+        change = (head_result['median'] - base_result['median']) / base_result['median']
+        rows.append((name, base_result['median'], head_result['median'], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    base, head = load(args.base), load(args.head)
+    if base['meta'].get('scale') != head['meta'].get('scale'):
+        print(f"warning: comparing scale {base['meta'].get('scale')} against {head['meta'].get('scale')}",
+              file=sys.stderr)
+
+    rows, regressions = compare(base, head, args.threshold)
+    print(f"{'benchmark':<40} {'base ms':>10} {'head ms':>10} {'change':>8}")
+    for name, base_median, head_median, change in rows:
+        base_ms = f'{base_median * 1000:.1f}' if base_median is not None else '-'
+        change_str = f'{change:+.1%}' if change is not None else 'new'
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f'{name:<40} {base_ms:>10} {head_median * 1000:>10.1f} {change_str:>8}{flag}')
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
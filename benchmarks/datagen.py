@@ -0,0 +1,154 @@
+"""Seeded synthetic data generator for benchmarks."""
+import random
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import insert, text
+from werkzeug.security import generate_password_hash
+
+from database import db
+from models import User, BinSchedule, PostcodeSchedule, EmailLog, SMSLog
+
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+}
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+BIN_TYPES = ['refuse', 'recycling', 'garden_waste']
+FREQUENCIES = ['weekly', 'biweekly']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+NOTIFICATION_TYPES = ['email', 'sms', 'both']
+
+BATCH_SIZE = 5_000
+
+GMT_TZ = pytz.timezone('GMT')
+
+
+def parse_scale(scale):
+    """Accept either a named scale ('10k') or a plain user count."""
+    if scale in SCALES:
+        return SCALES[scale]
+    return int(scale)
+
+
+def _insert_batched(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def generate(num_users, seed=42, today=None):
+    """
+    Populate the database with a repeatable data set.
+
+    Roughly a third of users are referred by an earlier user, every user has
+    one to three bin schedules spread over the next fortnight, and each user
+    carries a short history of email and SMS logs. Returns row counts.
+    """
+    rng = random.Random(seed)
+    today = today or datetime.now(GMT_TZ).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    # Hashing is deliberately slow, so every user shares one hash.
+    password_hash = generate_password_hash(BENCHMARK_PASSWORD)
+
+    num_postcodes = max(1, num_users // 50)
+    postcodes = [f'BN{i // 100 + 1} {i % 100:02d}X' for i in range(num_postcodes)]
+
+    postcode_rows = []
+    for postcode in postcodes:
+        for bin_type in BIN_TYPES:
+            postcode_rows.append({
+                'postcode': postcode,
+                'bin_type': bin_type,
+                'collection_day': rng.choice(DAYS),
+                'frequency': rng.choice(FREQUENCIES),
+                'last_collection': today - timedelta(days=rng.randint(1, 14)),
+                'created_at': today,
+                'updated_at': today,
+            })
+    _insert_batched(PostcodeSchedule, postcode_rows)
+
+    codes = set()
+    user_rows = []
+    for user_id in range(1, num_users + 1):
+        code = '%08x' % rng.getrandbits(32)
+        while code in codes:
+            code = '%08x' % rng.getrandbits(32)
+        codes.add(code)
+
+        referred_by_id = None
+        if user_id > 1 and rng.random() < 0.3:
+            referred_by_id = rng.randint(1, user_id - 1)
+
+        user_rows.append({
+            'id': user_id,
+            'email': f'user{user_id}@example.com',
+            'phone': f'07{rng.randint(100000000, 999999999)}',
+            'postcode': rng.choice(postcodes),
+            'password_hash': password_hash,
+            'is_admin': user_id == 1,
+            'first_login': rng.random() < 0.1,
+            'created_at': today - timedelta(days=rng.randint(0, 365)),
+            'notification_type': 'both',
+            'notification_time': 16,
+            'evening_notification': rng.random() < 0.8,
+            'evening_notification_time': rng.randint(12, 22),
+            'evening_notification_type': rng.choice(NOTIFICATION_TYPES),
+            'morning_notification': rng.random() < 0.4,
+            'morning_notification_time': rng.randint(5, 11),
+            'morning_notification_type': rng.choice(NOTIFICATION_TYPES),
+            'sms_credits': rng.choice([0, 1, 6, 10, 30]),
+            'referral_code': code,
+            'referred_by_id': referred_by_id,
+        })
+    _insert_batched(User, user_rows)
+
+    schedule_rows = []
+    email_rows = []
+    sms_rows = []
+    for user in user_rows:
+        for bin_type in rng.sample(BIN_TYPES, rng.randint(1, 3)):
+            schedule_rows.append({
+                'user_id': user['id'],
+                'bin_type': bin_type,
+                'frequency': rng.choice(FREQUENCIES),
+                'next_collection': today + timedelta(days=rng.randint(0, 13)),
+            })
+
+        for _ in range(rng.randint(0, 8)):
+            email_rows.append({
+                'sent_at': today - timedelta(days=rng.randint(1, 180), minutes=rng.randint(0, 1439)),
+                'recipient_email': user['email'],
+                'bin_type': rng.choice(BIN_TYPES),
+                'status': 'success' if rng.random() < 0.97 else 'failure',
+            })
+
+        for _ in range(rng.randint(0, 5)):
+            bin_type = rng.choice(BIN_TYPES)
+            sms_rows.append({
+                'sent_at': today - timedelta(days=rng.randint(1, 180), minutes=rng.randint(0, 1439)),
+                'recipient_phone': '+44' + user['phone'][1:],
+                'message_text': f'Reminder: Your {bin_type} bin collection is scheduled for tomorrow.',
+                'status': 'success' if rng.random() < 0.95 else 'failure',
+                'bin_type': bin_type,
+            })
+
+    _insert_batched(BinSchedule, schedule_rows)
+    _insert_batched(EmailLog, email_rows)
+    _insert_batched(SMSLog, sms_rows)
+
+    if db.engine.dialect.name == 'postgresql':
+        # Explicit ids bypass the serial sequence, so move it past them.
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('\"user\"', 'id'), (SELECT MAX(id) FROM \"user\"))"
+        ))
+    db.session.commit()
+
+    return {
+        'users': len(user_rows),
+        'bin_schedules': len(schedule_rows),
+        'postcode_schedules': len(postcode_rows),
+        'email_logs': len(email_rows),
+        'sms_logs': len(sms_rows),
+    }
@@ -0,0 +1,341 @@
+"""
+Local stand-ins for the Telnyx Messages API and the MailerSend email API.
+
+Usage:
+    python -m benchmarks.fake_providers --port 8025 --latency 80 --jitter 30 \\
+        --error-rate 0.01 --rate-limit 50
+
+Then point the app at it:
+    TELNYX_API_BASE=http://127.0.0.1:8025
+    MAILERSEND_API_BASE=http://127.0.0.1:8025/v1
+
+Only the endpoints the app uses are implemented:
+    POST /v2/messages             Telnyx send message
+    POST /v1/email                MailerSend single email
+    POST /v1/bulk-email           MailerSend bulk email
+    GET  /v1/bulk-email/<id>      MailerSend bulk email status
+
+Control endpoints:
+    GET  /__stats                 request counts, status codes and latencies
+    POST /__reset                 clear the counters
+    POST /__config                change fault settings, e.g. {"error_rate": 0.5}
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+
+@dataclass
+class FaultConfig:
+    latency: float = 0.0          # mean latency in milliseconds
+    jitter: float = 0.0           # spread in milliseconds (meaning depends on distribution)
+    distribution: str = 'normal'
+    error_rate: float = 0.0       # fraction of requests answered with a 5xx
+    throttle_rate: float = 0.0    # fraction of requests answered with a 429
+    rate_limit: float = 0.0       # requests per second per provider before 429s; 0 disables
+    retry_after: int = 1          # seconds advertised in Retry-After on 429s
+
+    def sample_latency(self, rng):
+        """Return a latency in seconds drawn from the configured distribution."""
+        if self.distribution == 'fixed' or not self.jitter:
+            millis = self.latency
+        elif self.distribution == 'uniform':
+            millis = rng.uniform(self.latency - self.jitter, self.latency + self.jitter)
+        elif self.distribution == 'lognormal':
+            # Long-tailed: median around `latency`, `jitter` widens the tail.
+            sigma = self.jitter / self.latency if self.latency else 1.0
+            millis = self.latency * rng.lognormvariate(0, sigma)
+        else:
+            millis = rng.gauss(self.latency, self.jitter)
+        return max(millis, 0.0) / 1000.0
+
+
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class ProviderState:
+    """Fault settings, rate limiters and counters shared by all handler threads."""
+
+    def __init__(self, config, seed=None):
+        self.config = config
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.bulk_jobs = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.requests = {}
+            self.statuses = {}
+            self.latencies = {}
+            self.buckets = {}
+
+    def update(self, values):
+        names = {f.name for f in fields(FaultConfig)}
+        with self.lock:
+            for key, value in values.items():
+                if key in names:
+                    setattr(self.config, key, type(getattr(self.config, key))(value))
+            self.buckets = {}
+
+    def decide(self, provider):
+        """Pick latency and outcome for one request: (seconds, status or None)."""
+        with self.lock:
+            latency = self.config.sample_latency(self.rng)
+            roll = self.rng.random()
+            if self.config.rate_limit:
+                bucket = self.buckets.setdefault(provider, TokenBucket(self.config.rate_limit))
+            else:
+                bucket = None
+
+        if bucket and not bucket.take():
+            return latency, 429
+        if roll < self.config.throttle_rate:
+            return latency, 429
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            return latency, 503
+        return latency, None
+
+    def record(self, provider, status, elapsed):
+        with self.lock:
+            self.requests[provider] = self.requests.get(provider, 0) + 1
+            key = f'{provider}:{status}'
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+            self.latencies.setdefault(provider, []).append(elapsed)
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            latency = {}
+            for provider, samples in self.latencies.items():
+                ordered = sorted(samples)
+                latency[provider] = {
+                    'p50_ms': ordered[len(ordered) // 2] * 1000,
+                    'p95_ms': ordered[int(len(ordered) * 0.95)] * 1000,
+                    'max_ms': ordered[-1] * 1000,
+                }
+            return {
+                'uptime_seconds': elapsed,
+                'config': asdict(self.config),
+                'requests': dict(self.requests),
+                'throughput_rps': {p: n / elapsed for p, n in self.requests.items()} if elapsed else {},
+                'statuses': dict(self.statuses),
+                'latency': latency,
+            }
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeProviders/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def _send(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _provider_call(self, provider, handler, payload):
+        started = time.monotonic()
+        latency, fault = self.state.decide(provider)
+        time.sleep(latency)
+
+        if fault == 429:
+            status, body, headers = self._throttled(provider)
+        elif fault:
+            status, body, headers = self._server_error(provider)
+        elif payload is None:
+            status, body, headers = 400, {'message': 'Malformed JSON'}, {}
+        else:
+            status, body, headers = handler(payload)
+
+        self._send(status, body, headers)
+        self.state.record(provider, status, time.monotonic() - started)
+
+    def _throttled(self, provider):
+        headers = {'Retry-After': str(self.state.config.retry_after)}
+        if provider == 'telnyx':
+            body = {'errors': [{'code': '10011', 'title': 'Too many requests',
+                                'detail': 'Rate limit exceeded, please retry later.'}]}
+        else:
+            body = {'message': 'Too Many Attempts.'}
+        return 429, body, headers
+
+    def _server_error(self, provider):
+        if provider == 'telnyx':
+            body = {'errors': [{'code': '10007', 'title': 'Unexpected error',
+                                'detail': 'Injected fault from fake provider.'}]}
+        else:
+            body = {'message': 'Service Unavailable'}
+        return 503, body, {}
+
+    # Telnyx -----------------------------------------------------------------
+
+    def _telnyx_message(self, payload):
+        if not payload.get('to') or not payload.get('text'):
+            return 422, {'errors': [{'code': '10005', 'title': 'Invalid parameter',
+                                     'detail': "'to' and 'text' are required."}]}, {}
+        text = payload['text']
+        parts = max(1, -(-len(text) // 153)) if len(text) > 160 else 1
+        return 200, {'data': {
+            'record_type': 'message',
+            'id': str(uuid.uuid4()),
+            'direction': 'outbound',
+            'type': 'SMS',
+            'from': {'phone_number': payload.get('from')},
+            'to': [{'phone_number': payload['to'], 'status': 'queued'}],
+            'text': text,
+            'parts': parts,
+        }}, {}
+
+    # MailerSend -------------------------------------------------------------
+
+    def _mailersend_email(self, payload):
+        if not payload.get('to') or not (payload.get('text') or payload.get('html')):
+            return 422, {'message': 'The given data was invalid.'}, {}
+        return 202, None, {'X-Message-Id': uuid.uuid4().hex[:24]}
+
+    def _mailersend_bulk(self, payload):
+        if not isinstance(payload, list) or not payload:
+            return 422, {'message': 'The given data was invalid.'}, {}
+        bulk_id = uuid.uuid4().hex[:24]
+        with self.state.lock:
+            self.state.bulk_jobs[bulk_id] = len(payload)
+        return 202, {'message': 'The bulk email is being processed.', 'bulk_email_id': bulk_id}, {}
+
+    def _mailersend_bulk_status(self, bulk_id):
+        with self.state.lock:
+            count = self.state.bulk_jobs.get(bulk_id)
+        if count is None:
+            return 404, {'message': 'Not found.'}, {}
+        return 200, {'data': {
+            'id': bulk_id,
+            'state': 'completed',
+            'total_recipients_count': count,
+            'suppressed_recipients_count': 0,
+            'validation_errors_count': 0,
+            'messages_id': [uuid.uuid4().hex[:24] for _ in range(count)],
+        }}, {}
+
+    # Routing ----------------------------------------------------------------
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path == '/v2/messages':
+            self._provider_call('telnyx', self._telnyx_message, payload)
+        elif self.path == '/v1/email':
+            self._provider_call('mailersend', self._mailersend_email, payload)
+        elif self.path == '/v1/bulk-email':
+            self._provider_call('mailersend', self._mailersend_bulk, payload)
+        elif self.path == '/__reset':
+            self.state.reset()
+            self._send(204)
+        elif self.path == '/__config':
+            self.state.update(payload or {})
+            self._send(200, asdict(self.state.config))
+        else:
+            self._send(404, {'message': 'Not found.'})
+
+    def do_GET(self):
+        match = re.fullmatch(r'/v1/bulk-email/(\w+)', self.path)
+        if match:
+            bulk_id = match.group(1)
+            self._provider_call('mailersend', lambda _: self._mailersend_bulk_status(bulk_id), {})
+        elif self.path == '/__stats':
+            self._send(200, self.state.stats())
+        else:
+            self._send(404, {'message': 'Not found.'})
+
+
+def make_server(host='127.0.0.1', port=8025, config=None, seed=None, verbose=False):
+    server = ThreadingHTTPServer((host, port), FakeProviderHandler)
+    server.daemon_threads = True
+    server.state = ProviderState(config or FaultConfig(), seed)
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.0, help='mean latency in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='latency spread in ms')
+    parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='normal')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests failing with 429')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='requests/second per provider before 429s')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429 responses')
+    parser.add_argument('--seed', type=int, help='seed for repeatable fault injection')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    config = FaultConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+    )
+    server = make_server(args.host, args.port, config, args.seed, args.verbose)
+    print(f'Fake Telnyx/MailerSend listening on http://{args.host}:{args.port}')
+    print(f'  TELNYX_API_BASE=http://{args.host}:{args.port}')
+    print(f'  MAILERSEND_API_BASE=http://{args.host}:{args.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""In-process stand-ins for the MailerSend and Telnyx clients."""
+import itertools
+import time
+from types import SimpleNamespace
+
+
+class FakeMailer:
+    """Mimics ``mailersend.emails.NewEmail.send``, which returns 'status\\nbody'."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = 0
+
+    def send(self, message):
+        if self.latency:
+            time.sleep(self.latency)
+        self.sent += 1
+        return "202\n"
+
+
+class FakeTelnyx:
+    """Mimics the ``telnyx`` module surface used by sms_notifications."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = 0
+        self._ids = itertools.count(1)
+        self.Message = SimpleNamespace(create=self._create_message)
+
+    def _create_message(self, from_, to, text):
+        if self.latency:
+            time.sleep(self.latency)
+        self.sent += 1
+        return SimpleNamespace(id=f'fake-{next(self._ids)}', to=to, text=text)
+
+
+def install(app_module, sms_module, latency=0.0):
+    """Swap the live provider clients for fakes and return them."""
+    mailer = FakeMailer(latency)
+    telnyx_client = FakeTelnyx(latency)
+    app_module.mailer = mailer
+    sms_module.get_telnyx_client = lambda: telnyx_client
+    return mailer, telnyx_client
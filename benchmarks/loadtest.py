@@ -0,0 +1,290 @@
+"""
+HTTP load generator that replays user journeys against the app.
+
+Usage:
+    # Start the app in-process on a seeded local SQLite database
+    python -m benchmarks.loadtest --users 50 --duration 60 --scale 10k
+
+    # Or drive an already running server (e.g. gunicorn on PostgreSQL)
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --users 200 --duration 120
+
+Journeys:
+    new        register -> login -> first_login -> confirm_schedules -> dashboard -> calendar
+    returning  login -> dashboard -> calendar
+
+Reports p50/p95/p99 latency and throughput per route. DB query counts are
+taken from the X-DB-Query-Count response header, which the in-process server
+always sets and a running server sets when started with SQL_PROFILING=1.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERY_COUNT_HEADER = 'X-DB-Query-Count'
+
+
+class Stats:
+    """Thread-safe per-route latency, status and query count samples."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = defaultdict(list)
+        self.journeys = defaultdict(int)
+
+    def record(self, route, elapsed, ok, queries):
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+            if queries is not None:
+                self.queries[route].append(queries)
+
+    def journey_done(self, name):
+        with self.lock:
+            self.journeys[name] += 1
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def report(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            queries = self.queries.get(route)
+            routes[route] = {
+                'requests': len(samples),
+                'errors': self.errors.get(route, 0),
+                'rps': len(samples) / elapsed,
+                'p50_ms': self._percentile(ordered, 0.50) * 1000,
+                'p95_ms': self._percentile(ordered, 0.95) * 1000,
+                'p99_ms': self._percentile(ordered, 0.99) * 1000,
+                'max_ms': ordered[-1] * 1000,
+                'db_queries_avg': sum(queries) / len(queries) if queries else None,
+                'db_queries_max': max(queries) if queries else None,
+            }
+        total = sum(r['requests'] for r in routes.values())
+        return {
+            'duration_seconds': elapsed,
+            'total_requests': total,
+            'total_rps': total / elapsed,
+            'journeys': dict(self.journeys),
+            'routes': routes,
+        }
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, runner, index):
+        super().__init__(daemon=True)
+        self.runner = runner
+        self.rng = random.Random(runner.args.seed + index)
+        self.session = requests.Session()
+
+    def request(self, route, method, path, **kwargs):
+        url = self.runner.base_url + path
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, allow_redirects=False,
+                                            timeout=self.runner.args.timeout, **kwargs)
+        except requests.RequestException:
+            self.runner.stats.record(route, time.perf_counter() - started, False, None)
+            return None
+        elapsed = time.perf_counter() - started
+        queries = response.headers.get(QUERY_COUNT_HEADER)
+        self.runner.stats.record(route, elapsed, response.status_code < 400,
+                                 int(queries) if queries is not None else None)
+        return response
+
+    def think(self):
+        if self.runner.args.think_time:
+            time.sleep(self.rng.uniform(0, 2 * self.runner.args.think_time / 1000.0))
+
+    def new_resident(self):
+        number = next(self.runner.registration_ids)
+        email = f'loadtest-{os.getpid()}-{number}@example.com'
+        postcode = self.rng.choice(self.runner.postcodes) if self.runner.postcodes else ''
+        self.session.cookies.clear()
+
+        self.request('GET /register', 'GET', '/register')
+        self.think()
+        self.request('POST /register', 'POST', '/register', data={
+            'email': email,
+            'phone': f'07{self.rng.randint(100000000, 999999999)}',
+            'postcode': postcode,
+            'password': self.runner.args.password,
+        })
+        self.think()
+        if not self.login(email):
+            return
+        self.think()
+        self.request('GET /first-login', 'GET', '/first-login')
+        self.think()
+        self.request('POST /confirm-schedules', 'POST', '/confirm-schedules', data={
+            'accept_refuse': 'on',
+            'accept_recycling': 'on',
+        })
+        self.think()
+        self.request('GET /dashboard', 'GET', '/dashboard')
+        self.think()
+        self.request('GET /calendar', 'GET', '/calendar')
+        self.runner.stats.journey_done('new')
+
+    def returning_resident(self):
+        email = f'user{self.rng.randint(2, self.runner.existing_users)}@example.com'
+        self.session.cookies.clear()
+        if not self.login(email):
+            return
+        self.think()
+        self.request('GET /dashboard', 'GET', '/dashboard')
+        self.think()
+        self.request('GET /calendar', 'GET', '/calendar')
+        self.runner.stats.journey_done('returning')
+
+    def login(self, email):
+        self.request('GET /login', 'GET', '/login')
+        response = self.request('POST /login', 'POST', '/login', data={
+            'email': email,
+            'password': self.runner.args.password,
+        })
+        return response is not None and response.status_code == 302 and '/login' not in response.headers.get('Location', '')
+
+    def run(self):
+        journeys = [self.new_resident, self.returning_resident]
+        weights = [self.runner.args.new_ratio, 1 - self.runner.args.new_ratio]
+        while time.monotonic() < self.runner.deadline:
+            self.rng.choices(journeys, weights)[0]()
+
+
+class LoadTestRunner:
+    def __init__(self, args):
+        self.args = args
+        self.stats = Stats()
+        self.registration_ids = itertools.count(1)
+        self.postcodes = []
+        self.existing_users = args.existing_users
+        self.server = None
+        self.base_url = (args.url or '').rstrip('/')
+
+    def serve_in_process(self):
+        """Seed a local database and serve the app from a background thread."""
+        workdir = tempfile.mkdtemp(prefix='binreminder-load-')
+        os.environ['DATABASE_URL'] = self.args.database_url or f'sqlite:///{os.path.join(workdir, "load.db")}'
+        # Adds the X-DB-Query-Count header to every response
+        os.environ['SQL_PROFILING'] = '1'
+
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        import sms_notifications
+        from benchmarks import datagen, fakes
+        from werkzeug.serving import make_server
+
+        fakes.install(app_module, sms_notifications, self.args.provider_latency / 1000.0)
+        from log_setup import configure_logging
+        configure_logging(stream=open(self.args.log_file, 'a'))
+        num_users = datagen.parse_scale(self.args.scale)
+        with app_module.app.app_context():
+            app_module.db.drop_all()
+            app_module.db.create_all()
+            datagen.generate(num_users, seed=self.args.seed)
+        self.existing_users = num_users
+
+        self.server = make_server('127.0.0.1', self.args.port, app_module.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def discover_postcodes(self):
+        if self.args.postcodes:
+            self.postcodes = self.args.postcodes
+            return
+        if self.server:
+            from models import PostcodeSchedule
+            import app as app_module
+            with app_module.app.app_context():
+                rows = app_module.db.session.query(PostcodeSchedule.postcode).distinct().all()
+            self.postcodes = [row.postcode for row in rows]
+
+    def run(self):
+        if not self.base_url:
+            self.serve_in_process()
+        self.discover_postcodes()
+
+        print(f'Running {self.args.users} virtual users for {self.args.duration}s against {self.base_url}',
+              file=sys.stderr)
+        started = time.monotonic()
+        self.deadline = started + self.args.duration
+        users = []
+        for index in range(self.args.users):
+            user = VirtualUser(self, index)
+            user.start()
+            users.append(user)
+            if self.args.ramp_up:
+                time.sleep(self.args.ramp_up / self.args.users)
+        for user in users:
+            user.join()
+        elapsed = time.monotonic() - started
+
+        if self.server:
+            self.server.shutdown()
+        return self.stats.report(elapsed)
+
+
+def print_report(report):
+    print(f"{'route':<26} {'reqs':>7} {'err':>5} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+    for route, r in report['routes'].items():
+        queries = f"{r['db_queries_avg']:.1f}" if r['db_queries_avg'] is not None else '-'
+        print(f"{route:<26} {r['requests']:>7} {r['errors']:>5} {r['rps']:>7.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {queries:>8}")
+    print(f"total: {report['total_requests']} requests, {report['total_rps']:.1f} req/s, "
+          f"journeys {report['journeys']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='target a running server instead of starting one in-process')
+    parser.add_argument('--users', type=int, default=20, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--ramp-up', type=float, default=0, help='seconds over which to start users')
+    parser.add_argument('--think-time', type=float, default=0, help='mean pause between steps, in ms')
+    parser.add_argument('--new-ratio', type=float, default=0.3, help='share of journeys that register')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--password', default=None,
+                        help='password for seeded users (defaults to the benchmark generator password)')
+    parser.add_argument('--existing-users', type=int, default=1000,
+                        help='number of seeded user<N>@example.com accounts on --url targets')
+    parser.add_argument('--postcodes', nargs='*', help='postcodes to register with on --url targets')
+    parser.add_argument('--scale', default='1k', help='users to seed for the in-process server')
+    parser.add_argument('--database-url', help='database for the in-process server (default: temp SQLite)')
+    parser.add_argument('--port', type=int, default=0, help='port for the in-process server')
+    parser.add_argument('--provider-latency', type=float, default=0.0, help='fake provider latency in ms')
+    parser.add_argument('--log-file', default=os.devnull, help='application log file for the in-process server')
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args(argv)
+
+    if args.password is None:
+        from benchmarks.datagen import BENCHMARK_PASSWORD
+        args.password = BENCHMARK_PASSWORD
+
+    report = LoadTestRunner(args).run()
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+"""
+Repeatable timing runs for the notification pipeline and web views.
+
+Usage:
+    python -m benchmarks.run --scale 1k --repeat 5 --output bench_base.json
+
+By default each run uses a throwaway SQLite database. Mutating benchmarks
+(the notification runs) restore a pristine copy of the seeded database before
+every repetition so each one sees the same data. Pass --database-url to run
+against PostgreSQL instead; the database is then re-seeded between mutating
+repetitions, which is slower but keeps runs comparable.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VIEW_BENCHMARKS = [
+    # (name, path, log in as admin)
+    ('dashboard', '/dashboard', False),
+    ('calendar_view', '/calendar', False),
+    ('admin_dashboard', '/admin', True),
+    ('admin_users', '/admin/users', True),
+    ('admin_reminders', '/admin/reminders', True),
+    ('admin_email_logs', '/admin/emails', True),
+    ('admin_sms_logs', '/admin/sms', True),
+]
+
+# Importing app.py in a fresh interpreter, as every CLI command, worker and
+# test process does; only the import itself is timed
+IMPORT_BENCHMARK = 'import_app'
+IMPORT_SNIPPET = 'import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)'
+
+NOTIFICATION_BENCHMARKS = [
+    'check_upcoming_collections[evening]',
+    'check_upcoming_collections[morning]',
+    'check_notifications',
+]
+
+# Per-message cost of logging on the send path: time the dispatching thread
+# spends inside logging calls during the evening run, divided by the messages
+# sent. Timing the calls themselves keeps database noise out of the figure.
+LOGGING_BENCHMARK = 'logging_overhead'
+LOGGING_SLOT = 'evening'
+
+# Building reminder email content for EMAIL_RENDER_COUNT recipients spread
+# over a few bins/date cohorts, per email; "f_string_median" times the inline
+# f-string the reminder used to be built from
+EMAIL_RENDER_BENCHMARK = 'email_render'
+EMAIL_RENDER_COUNT = 2000
+EMAIL_RENDER_COHORTS = [['refuse'], ['recycling'], ['refuse', 'recycling'], ['garden_waste']]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def summarise(runs):
+    return {
+        'runs': runs,
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'mean': statistics.mean(runs),
+        'max': max(runs),
+    }
+
+
+class BenchmarkRunner:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix='binreminder-bench-')
+        self.sqlite_path = None
+
+        if args.database_url:
+            os.environ['DATABASE_URL'] = args.database_url
+        else:
+            self.sqlite_path = os.path.join(self.workdir, 'bench.db')
+            os.environ['DATABASE_URL'] = f'sqlite:///{self.sqlite_path}'
+        self.template_path = os.path.join(self.workdir, 'template.db')
+
+        # The app reads DATABASE_URL when it is imported, so the environment
+        # must be prepared first.
+        sys.path.insert(0, ROOT)
+        import app as app_module
+        import sms_notifications
+        from benchmarks import datagen, fakes
+
+        self.app_module = app_module
+        self.app = app_module.app
+        self.db = app_module.db
+        self.datagen = datagen
+        self.mailer, self.telnyx = fakes.install(app_module, sms_notifications, args.provider_latency / 1000.0)
+
+        # Keep the app's log records (their formatting cost is part of what is
+        # being measured) but send them somewhere other than the terminal.
+        from log_setup import configure_logging
+        self.log_stream = open(args.log_file, 'a')
+        configure_logging(stream=self.log_stream)
+        self.num_users = datagen.parse_scale(args.scale)
+        self.rows = None
+
+    def seed(self):
+        with self.app.app_context():
+            self.db.drop_all()
+            self.db.create_all()
+            self.rows = self.datagen.generate(self.num_users, seed=self.args.seed)
+            self.db.session.remove()
+            self.db.engine.dispose()
+        if self.sqlite_path:
+            self._sqlite_copy(self.sqlite_path, self.template_path)
+
+    @staticmethod
+    def _sqlite_copy(source_path, target_path):
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+
+    def reset(self):
+        """Restore the seeded data set before a mutating run."""
+        if not self.sqlite_path:
+            self.seed()
+            return
+        # Copy rows back through the app's own engine rather than replacing
+        # the database file underneath connections SQLAlchemy may still hold.
+        tables = self.db.metadata.sorted_tables
+        with self.app.app_context():
+            with self.db.engine.connect() as conn:
+                conn.exec_driver_sql(f"ATTACH DATABASE '{self.template_path}' AS template")
+                for table in reversed(tables):
+                    conn.exec_driver_sql(f'DELETE FROM main."{table.name}"')
+                for table in tables:
+                    conn.exec_driver_sql(f'INSERT INTO main."{table.name}" SELECT * FROM template."{table.name}"')
+                conn.commit()
+                conn.exec_driver_sql('DETACH DATABASE template')
+                conn.commit()
+
+    def time_notifications(self, name):
+        runs = []
+        sent = []
+        for _ in range(self.args.repeat):
+            self.reset()
+            self.mailer.sent = self.telnyx.sent = 0
+            if name == 'check_notifications':
+                client = self.app.test_client()
+                started = time.perf_counter()
+                client.get('/api/check-notifications')
+            else:
+                slot = name.split('[')[1].rstrip(']')
+                # url_for(_external=True) needs a request context outside of
+                # a web request.
+                with self.app.test_request_context('/'):
+                    started = time.perf_counter()
+                    self.app_module.check_upcoming_collections(slot)
+            runs.append(time.perf_counter() - started)
+            sent.append({'email': self.mailer.sent, 'sms': self.telnyx.sent})
+        result = summarise(runs)
+        result['sent'] = sent[-1]
+        return result
+
+    def time_logging_overhead(self):
+        spent = []
+        log = logging.Logger._log
+
+        def timed_log(logger, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return log(logger, *args, **kwargs)
+            finally:
+                spent.append(time.perf_counter() - started)
+
+        runs = []
+        records = []
+        logging.Logger._log = timed_log
+        try:
+            for _ in range(self.args.repeat):
+                self.reset()
+                self.mailer.sent = self.telnyx.sent = 0
+                spent.clear()
+                with self.app.test_request_context('/'):
+                    self.app_module.check_upcoming_collections(LOGGING_SLOT)
+                messages = max(1, self.mailer.sent + self.telnyx.sent)
+                runs.append(sum(spent) / messages)
+                records.append(len(spent) / messages)
+        finally:
+            logging.Logger._log = log
+        result = summarise(runs)
+        result['messages'] = messages
+        result['records_per_message'] = statistics.median(records)
+        return result
+
+    def time_email_render(self):
+        from email_templates import _reminder_cohort, reminder_cohort, mail_payload
+        from digest import describe_bin_types
+
+        dates = [datetime(2026, 1, 5) + timedelta(days=day) for day in range(2)]
+        recipients = [
+            (f'user{i}@example.com', EMAIL_RENDER_COHORTS[i % len(EMAIL_RENDER_COHORTS)],
+             dates[i % len(dates)], i % 50, f'https://example.com/register?ref={i:08x}')
+            for i in range(EMAIL_RENDER_COUNT)
+        ]
+
+        def render_templates():
+            _reminder_cohort.cache_clear()
+            for email, bin_types, collection_date, credits, invite_url in recipients:
+                content = reminder_cohort(bin_types, collection_date).fill(sms_credits=credits, invite_url=invite_url)
+                mail_payload(email, content)
+
+        def render_f_string():
+            for email, bin_types, collection_date, credits, invite_url in recipients:
+                bins = describe_bin_types(bin_types)
+                collections = 'collections are' if len(bin_types) > 1 else 'collection is'
+                mail_body = f'''Dear Resident,
+
+This is a reminder that your {bins} bin {collections} scheduled for tomorrow, {collection_date.strftime('%A, %B %d, %Y')}.
+
+Please ensure your bin is placed outside before the collection time.
+
+Your Account Information:
+------------------------
+SMS Credits Balance: {credits} credits
+Want more credits? Share your referral link with friends!
+
+Referral Program:
+----------------
+• You'll get 20 SMS credits for each friend who signs up
+• Your friends will get 10 bonus SMS credits to start
+• Share your unique referral link: {invite_url}
+
+Best regards,
+Your Bin Collection Reminder Service'''
+                {
+                    "from": {"email": os.environ.get('MAILERSEND_FROM_EMAIL'), "name": "Bin Collection Reminder"},
+                    "to": [{"email": email}],
+                    "subject": f"Bin Collection Reminder: {describe_bin_types([b.title() for b in bin_types])} "
+                               f"Collection{'s' if len(bin_types) > 1 else ''} Tomorrow",
+                    "text": mail_body
+                }
+
+        def per_email(render):
+            runs = []
+            for _ in range(self.args.repeat):
+                started = time.perf_counter()
+                render()
+                runs.append((time.perf_counter() - started) / EMAIL_RENDER_COUNT)
+            return runs
+
+        with self.app.app_context():
+            render_templates()  # warm-up: compiles the templates
+            result = summarise(per_email(render_templates))
+            baseline = summarise(per_email(render_f_string))
+        result['f_string_median'] = baseline['median']
+        result['emails'] = EMAIL_RENDER_COUNT
+        return result
+
+    def time_import(self):
+        runs = []
+        for _ in range(self.args.repeat):
+            output = subprocess.check_output(
+                [sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT, stderr=subprocess.DEVNULL
+            )
+            runs.append(float(output.decode().split()[-1]))
+        return summarise(runs)
+
+    def time_view(self, path, as_admin):
+        self.reset()
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = '1' if as_admin else '2'
+            session['_fresh'] = True
+
+        response = client.get(path)  # warm-up
+        status = response.status_code
+        runs = []
+        for _ in range(self.args.repeat):
+            with self.app_module.query_profiler.budget(float('inf')) as statements:
+                started = time.perf_counter()
+                response = client.get(path)
+                runs.append(time.perf_counter() - started)
+        result = summarise(runs)
+        result['status'] = status
+        result['queries'] = len(statements)
+        result['bytes'] = len(response.data)
+        return result
+
+    def run(self):
+        selected = set(self.args.only or [])
+        started = time.perf_counter()
+        self.seed()
+        seed_seconds = time.perf_counter() - started
+        print(f'Seeded {self.rows} in {seed_seconds:.1f}s', file=sys.stderr)
+
+        results = {}
+        if not selected or IMPORT_BENCHMARK in selected:
+            results[IMPORT_BENCHMARK] = self.time_import()
+            print(f'{IMPORT_BENCHMARK}: median {results[IMPORT_BENCHMARK]["median"] * 1000:.1f} ms', file=sys.stderr)
+
+        for name in NOTIFICATION_BENCHMARKS:
+            if selected and name not in selected:
+                continue
+            results[name] = self.time_notifications(name)
+            print(f'{name}: median {results[name]["median"] * 1000:.1f} ms', file=sys.stderr)
+
+        if not selected or LOGGING_BENCHMARK in selected:
+            results[LOGGING_BENCHMARK] = self.time_logging_overhead()
+            print(f'{LOGGING_BENCHMARK}: median {results[LOGGING_BENCHMARK]["median"] * 1e6:.1f} us/message',
+                  file=sys.stderr)
+
+        if not selected or EMAIL_RENDER_BENCHMARK in selected:
+            results[EMAIL_RENDER_BENCHMARK] = self.time_email_render()
+            print(f'{EMAIL_RENDER_BENCHMARK}: median {results[EMAIL_RENDER_BENCHMARK]["median"] * 1e6:.1f} us/email '
+                  f'(f-string {results[EMAIL_RENDER_BENCHMARK]["f_string_median"] * 1e6:.1f} us/email)',
+                  file=sys.stderr)
+
+        for name, path, as_admin in VIEW_BENCHMARKS:
+            if selected and name not in selected:
+                continue
+            results[name] = self.time_view(path, as_admin)
+            print(f'{name}: median {results[name]["median"] * 1000:.1f} ms', file=sys.stderr)
+
+        with self.app.app_context():
+            dialect = self.db.engine.dialect.name
+
+        return {
+            'meta': {
+                'commit': git_commit(),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'database': dialect,
+                'scale': self.args.scale,
+                'seed': self.args.seed,
+                'repeat': self.args.repeat,
+                'provider_latency_ms': self.args.provider_latency,
+                'seed_seconds': seed_seconds,
+                'rows': self.rows,
+            },
+            'results': results,
+        }
+
+    def cleanup(self):
+        self.log_stream.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='1k', help="number of users: 1k, 10k, 100k or an integer")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--provider-latency', type=float, default=0.0,
+                        help='simulated provider latency per send, in milliseconds')
+    parser.add_argument('--database-url', help='benchmark against this database instead of SQLite')
+    parser.add_argument('--only', action='append', help='run only the named benchmark (repeatable)')
+    parser.add_argument('--log-file', default=os.devnull, help='where to write application logs')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    runner = BenchmarkRunner(args)
+    try:
+        report = runner.run()
+    finally:
+        runner.cleanup()
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,94 @@
+import os
+from contextlib import contextmanager
+from functools import wraps
+
+import click
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.expression import UpdateBase
+
+# Bind key of the optional read-only replica (DATABASE_REPLICA_URL)
+REPLICA_BIND = 'replica'
+_USE_REPLICA = 'use_replica'
 
 class Base(DeclarativeBase):
     pass
 
+class RoutingSession(Session):
+    """
+    Session that sends reads to the replica once replica_reads() or
+    @read_replica has been applied to it, when a replica is configured.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get(_USE_REPLICA) and not self._flushing
+                and not isinstance(clause, UpdateBase)):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Initialize database
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
+
+def pool_options(prefix):
+    """
+    Engine pool settings from <prefix>_POOL_SIZE, <prefix>_MAX_OVERFLOW and
+    <prefix>_POOL_TIMEOUT; only the variables that are set are passed on.
+    """
+    options = {}
+    for name, option, cast in (('POOL_SIZE', 'pool_size', int),
+                               ('MAX_OVERFLOW', 'max_overflow', int),
+                               ('POOL_TIMEOUT', 'pool_timeout', float)):
+        value = os.environ.get(f'{prefix}_{name}')
+        if value:
+            options[option] = cast(value)
+    return options
+
+@contextmanager
+def replica_reads():
+    """Run the block's reads against the replica (the primary if none is configured)."""
+    info = db.session.info
+    previous = info.get(_USE_REPLICA, False)
+    info[_USE_REPLICA] = True
+    try:
+        yield
+    finally:
+        info[_USE_REPLICA] = previous
+
+def read_replica(f):
+    """
+    Route a read-only view's queries to the replica for the rest of the
+    request, including responses streamed after the view returns. The
+    session, and with it the setting, is discarded when the request ends.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        db.session.info[_USE_REPLICA] = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+class MigrateCommands(click.Group):
+    """
+    The `flask db` commands, with Flask-Migrate (and Alembic, the slowest
+    import in the app) only loaded when one of them is run.
+    """
+
+    def __init__(self, app, **kwargs):
+        super().__init__(**kwargs)
+        self.app = app
+
+    def _commands(self):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_commands
+
+        if 'migrate' not in self.app.extensions:
+            Migrate(self.app, db)
+        return db_commands
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # Hand the whole invocation, options included, to Flask-Migrate's group
+        return self._commands().make_context(info_name, args, parent=parent, **extra)
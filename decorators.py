@@ -1,12 +1,44 @@
 from functools import wraps
-from flask import flash, redirect, url_for
+from flask import flash, redirect, url_for, request, jsonify, g
 from flask_login import current_user
+from database import db
+from models import ApiToken, User, user_cache
+
+def is_admin(user_id):
+    """
+    The user's is_admin flag, read from the database.
+
+    current_user may be a cached snapshot from before another process
+    granted or revoked admin, so admin access never relies on it.
+    """
+    admin = bool(db.session.query(User.is_admin).filter(User.id == user_id).scalar())
+    if admin != bool(current_user.is_admin):
+        user_cache.invalidate(user_id)
+    return admin
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or not current_user.is_admin:
+        if not current_user.is_authenticated or not is_admin(current_user.id):
             flash('Access denied. Admin privileges required.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_token_required(f):
+    """Authenticate a JSON API request from its `Authorization: Bearer` token.
+
+    Sets g.api_user_id and g.api_schedule_version for the view.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        row = ApiToken.authenticate(token.strip()) if scheme.lower() == 'bearer' else None
+        if row is None:
+            response = jsonify({'status': 'error', 'error': 'Invalid or missing API token'})
+            response.status_code = 401
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response
+        g.api_user_id, g.api_schedule_version = row
         return f(*args, **kwargs)
     return decorated_function
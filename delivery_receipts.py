@@ -0,0 +1,290 @@
+import atexit
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import pytz
+from sqlalchemy import bindparam, select, update
+
+from database import db
+from models import SMSLog, EmailLog
+from resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+GMT_TZ = pytz.timezone('GMT')
+
+# Final Telnyx message statuses (from `message.finalized` events) -> delivery_status
+TELNYX_STATUSES = {
+    'delivered': 'delivered',
+    'delivery_failed': 'failed',
+    'sending_failed': 'failed',
+    'delivery_unconfirmed': 'unconfirmed',
+}
+
+# MailerSend webhook event types -> delivery_status
+MAILERSEND_EVENTS = {
+    'activity.delivered': 'delivered',
+    'activity.soft_bounced': 'deferred',
+    'activity.hard_bounced': 'bounced',
+    'activity.spam_complaint': 'complained',
+}
+
+LOG_MODELS = {
+    'sms': SMSLog,
+    'email': EmailLog,
+}
+
+# Longest wait between attempts at a batch that failed to apply
+RETRY_MAX_SECONDS = 60
+
+
+class ReceiptError(ValueError):
+    pass
+
+
+def parse_telnyx_receipt(payload):
+    """[(message id, delivery status)] from a Telnyx messaging webhook; other events give []."""
+    try:
+        data = payload['data']
+        if data.get('event_type') != 'message.finalized':
+            return []
+        message = data['payload']
+        statuses = [recipient.get('status') for recipient in message.get('to', [])]
+        message_id = message['id']
+    except (KeyError, TypeError, AttributeError):
+        raise ReceiptError('Not a Telnyx messaging event')
+    status = next((TELNYX_STATUSES[s] for s in statuses if s in TELNYX_STATUSES), None)
+    return [(message_id, status)] if status else []
+
+
+def parse_mailersend_event(payload):
+    """[(message id, delivery status)] from a MailerSend activity webhook; other events give []."""
+    try:
+        status = MAILERSEND_EVENTS.get(payload['type'])
+        if status is None:
+            return []
+        message_id = payload['data']['email']['message']['id']
+    except (KeyError, TypeError):
+        raise ReceiptError('Not a MailerSend activity event')
+    return [(message_id, status)]
+
+
+def _unsigned(provider, setting, allow_unsigned):
+    # Receipts rewrite log rows, so an unverifiable webhook is refused
+    if not allow_unsigned:
+        logger.warning(f"Rejected {provider} webhook: {setting} is not set")
+    return allow_unsigned
+
+
+def verify_telnyx_signature(body, headers, allow_unsigned=False):
+    """
+    Check Telnyx's ed25519 signature against TELNYX_PUBLIC_KEY. Without a key
+    requests are rejected, unless `allow_unsigned` (local development).
+    """
+    if not os.environ.get('TELNYX_PUBLIC_KEY'):
+        return _unsigned('Telnyx', 'TELNYX_PUBLIC_KEY', allow_unsigned)
+    try:
+        import telnyx
+        from telnyx.webhook import WebhookSignature
+
+        telnyx.public_key = os.environ['TELNYX_PUBLIC_KEY']
+        return WebhookSignature.verify(
+            body,
+            headers.get('telnyx-signature-ed25519', ''),
+            headers.get('telnyx-timestamp', ''),
+            tolerance=300,
+        )
+    except Exception as e:
+        logger.warning(f"Rejected Telnyx webhook: {str(e)}")
+        return False
+
+
+def verify_mailersend_signature(body, headers, allow_unsigned=False):
+    """
+    Check MailerSend's HMAC-SHA256 `Signature` header against
+    MAILERSEND_WEBHOOK_SECRET. Without a secret requests are rejected, unless
+    `allow_unsigned` (local development).
+    """
+    secret = os.environ.get('MAILERSEND_WEBHOOK_SECRET')
+    if not secret:
+        return _unsigned('MailerSend', 'MAILERSEND_WEBHOOK_SECRET', allow_unsigned)
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, headers.get('Signature', ''))
+
+
+WEBHOOKS = {
+    # provider: (log kind, verify signature, parse payload)
+    'telnyx': ('sms', verify_telnyx_signature, parse_telnyx_receipt),
+    'mailersend': ('email', verify_mailersend_signature, parse_mailersend_event),
+}
+
+
+class ReceiptQueue:
+    """
+    In-process queue of delivery status updates from provider webhooks.
+
+    Webhook requests only enqueue and return, so a burst of receipts after a
+    run costs the web workers almost nothing. A background thread (started on
+    first use, one per app in each process) drains the queue and applies each
+    batch as one executemany UPDATE per log table, keyed on the indexed
+    provider message id.
+    Receipts still queued when the process exits are flushed by an atexit hook.
+
+    The webhook has already been acknowledged, so a batch that fails to apply
+    (e.g. the database is unavailable) is retried with backoff, up to
+    `retry_limit` attempts, before any newer receipts. Meanwhile the queue
+    fills and webhooks get 503s, so providers hold on to later receipts.
+    A batch that still fails is logged receipt by receipt for replaying.
+    Receipts that match no log row (e.g. for messages sent from elsewhere)
+    are counted and logged the same way.
+    """
+
+    def __init__(self, app=None, batch_size=500, flush_interval=1.0, maxsize=100000, retry_limit=5):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self.retry_limit = retry_limit
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.applied = 0
+        self.dropped = 0
+        self.unmatched = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('RECEIPT_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('RECEIPT_FLUSH_SECONDS', self.flush_interval)
+        self.maxsize = app.config.get('RECEIPT_QUEUE_SIZE', self.maxsize)
+        self.retry_limit = app.config.get('RECEIPT_RETRY_LIMIT', self.retry_limit)
+        self._queue = queue.Queue(self.maxsize)
+        app.extensions['receipt_queue'] = self
+
+    def put(self, kind, updates):
+        """Queue [(message id, status)] for the `kind` log table; False if the queue is full."""
+        self._ensure_started()
+        received_at = datetime.now(GMT_TZ)
+        try:
+            for message_id, status in updates:
+                self._queue.put_nowait((kind, message_id, status, received_at))
+        except queue.Full:
+            logger.warning(f"Delivery receipt queue full ({self.maxsize}); rejecting {kind} receipts")
+            return False
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so each worker starts its own
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is None:
+                    atexit.register(self.flush)
+                self._thread = threading.Thread(target=self._run, name='delivery-receipts', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply_with_retry(batch)
+
+    def _apply_with_retry(self, batch):
+        for attempt in range(self.retry_limit):
+            if attempt:
+                time.sleep(backoff_delay(attempt - 1, base=self.flush_interval, cap=RETRY_MAX_SECONDS))
+            if self.apply(batch):
+                return True
+        self._drop(batch)
+        return False
+
+    def _drop(self, batch):
+        self.dropped += len(batch)
+        logger.error(f"Gave up on {len(batch)} delivery receipts after {self.retry_limit} attempts")
+        for kind, message_id, status, received_at in batch:
+            logger.error("Dropped delivery receipt", extra={
+                'kind': kind, 'message_id': message_id, 'status': status, 'received_at': received_at.isoformat()})
+
+    def _log_unmatched(self, kind, params):
+        self.unmatched += len(params)
+        logger.warning(f"{len(params)} {kind} delivery receipts matched no log row")
+        for row in params:
+            logger.warning("Unmatched delivery receipt", extra={
+                'kind': kind, 'message_id': row['b_message_id'], 'status': row['b_status'],
+                'received_at': row['b_at'].isoformat()})
+
+    def flush(self):
+        """Apply everything queued so far on the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._flush_batch(batch)
+                batch = []
+        if batch:
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch):
+        # One attempt: flush() runs at exit, where waiting out an outage isn't an option
+        if not self.apply(batch):
+            self._drop(batch)
+
+    def apply(self, batch):
+        """Write one batch of receipts: one UPDATE statement per log table. Returns False if it failed."""
+        # Receipts for the same message arrive in order; keep the latest
+        rows = {kind: {} for kind in LOG_MODELS}
+        for kind, message_id, status, received_at in batch:
+            rows[kind][message_id] = {'b_message_id': message_id, 'b_status': status, 'b_at': received_at}
+
+        with self.app.app_context():
+            try:
+                unmatched = {}
+                for kind, params in rows.items():
+                    if not params:
+                        continue
+                    table = LOG_MODELS[kind].__table__
+                    statement = (
+                        update(table)
+                        .where(table.c.provider_message_id == bindparam('b_message_id'))
+                        .values(delivery_status=bindparam('b_status'), delivery_updated_at=bindparam('b_at'))
+                    )
+                    result = db.session.execute(statement, list(params.values()))
+                    if 0 <= result.rowcount < len(params):
+                        # Only look up which ones when some missed
+                        found = set(db.session.scalars(
+                            select(table.c.provider_message_id).where(table.c.provider_message_id.in_(params))
+                        ))
+                        unmatched[kind] = [row for message_id, row in params.items() if message_id not in found]
+                db.session.commit()
+                self.applied += len(batch)
+                for kind, params in unmatched.items():
+                    self._log_unmatched(kind, params)
+                logger.info(f"Applied {len(batch)} delivery receipts "
+                            f"({len(rows['sms'])} SMS, {len(rows['email'])} email)")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to apply {len(batch)} delivery receipts: {str(e)}")
+                db.session.rollback()
+                return False
@@ -0,0 +1,40 @@
+DIGEST_TEMPLATE = 'collection_reminder_digest'
+
+
+def describe_bin_types(bin_types):
+    """'refuse', 'refuse and recycling', 'refuse, recycling and garden waste'."""
+    names = [bin_type.replace('_', ' ') for bin_type in bin_types]
+    if len(names) <= 1:
+        return ''.join(names)
+    return f"{', '.join(names[:-1])} and {names[-1]}"
+
+
+def log_bin_types(bin_types):
+    """Value for the bin_type column of email/SMS logs; digests list every bin."""
+    return ','.join(bin_types)
+
+
+def group_due_schedules(schedules):
+    """
+    Group due schedules by (user, collection date), keeping query order.
+
+    Returns a list of (user, collection date, [schedules by bin type]); each
+    group becomes one message per channel.
+    """
+    groups = {}
+    for schedule in schedules:
+        key = (schedule.user_id, schedule.next_collection.date())
+        groups.setdefault(key, []).append(schedule)
+    return [
+        (group[0].user, collection_date, sorted(group, key=lambda schedule: schedule.bin_type))
+        for (_, collection_date), group in groups.items()
+    ]
+
+
+def group_retries(retries):
+    """Group queued retries that would have been one digest: same user, date, slot and channel."""
+    groups = {}
+    for retry in retries:
+        key = (retry.bin_schedule.user_id, retry.collection_date, retry.slot, retry.channel)
+        groups.setdefault(key, []).append(retry)
+    return [sorted(group, key=lambda retry: retry.bin_schedule.bin_type) for group in groups.values()]
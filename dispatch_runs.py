@@ -0,0 +1,108 @@
+import os
+import socket
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from models import DispatchRun
+
+# Phase timings (seconds) of the dispatch run on this thread/process, if any
+_phases = ContextVar('dispatch_phases', default=None)
+# Outcome Counter of that run, for tallies taken deeper down (see count())
+_outcomes = ContextVar('dispatch_outcomes', default=None)
+
+
+@contextmanager
+def recording(outcomes):
+    """
+    Collect phase() timings for the block, and count() tallies into the
+    `outcomes` Counter; yields {phase: seconds}.
+    """
+    phases = dict.fromkeys(DispatchRun.PHASES, 0.0)
+    phases_token = _phases.set(phases)
+    outcomes_token = _outcomes.set(outcomes)
+    try:
+        yield phases
+    finally:
+        _phases.reset(phases_token)
+        _outcomes.reset(outcomes_token)
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the block's wall time to the current run's `name` phase ('query',
+    'render', 'send' or 'commit'). Outside a run (retries, test sends) it
+    only costs the ContextVar lookup.
+    """
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] += time.perf_counter() - started
+
+
+def count(name, amount=1):
+    """Add to the current run's `name` outcome; outside a run it does nothing."""
+    outcomes = _outcomes.get()
+    if outcomes is not None:
+        outcomes[name] += amount
+
+
+def process_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_totals(outcomes, phases):
+    """DispatchRun column values from the outcome Counter and phase timings."""
+    values = {f'{phase}_ms': round(seconds * 1000, 1) for phase, seconds in phases.items()}
+    for channel in ('email', 'sms'):
+        for outcome in ('sent', 'failed', 'queued'):
+            values[f'{channel}_{outcome}'] = outcomes[f'{channel}_{outcome}']
+    values['duplicates'] = outcomes['email_duplicate'] + outcomes['sms_duplicate']
+    # Only decrements that succeeded; a balance spent elsewhere since the
+    # credit check still sends, but costs nothing
+    values['credits_used'] = outcomes['credits_used']
+    return values
+
+
+def find_overlaps(runs, now):
+    """
+    Ids of runs that were in progress at the same time as another run for the
+    same slot and shard (unfinished runs count as running until `now`).
+
+    Shards of one run are expected to overlap; two processes on the same
+    partition, or an hour's run still going when the next one starts, are not.
+    """
+    overlapping = set()
+    last = {}  # (slot, shard) -> (end, id) of the latest-ending run so far
+    for run in sorted(runs, key=lambda run: run.started_at):
+        key = (run.slot, run.shard)
+        end = run.finished_at or now
+        if key in last and last[key][0] > run.started_at:
+            overlapping.update((last[key][1], run.id))
+        if key not in last or end > last[key][0]:
+            last[key] = (end, run.id)
+    return overlapping
+
+
+def trend_chart(runs, series, width=600, height=120):
+    """
+    SVG polyline points for each (label, getter) series over `runs` (oldest
+    first), sharing one y scale. Runs without a value are skipped.
+    """
+    values = [[getter(run) for run in runs] for _, getter in series]
+    peak = max((value for line in values for value in line if value is not None), default=0) or 1
+    step = width / max(len(runs) - 1, 1)
+    lines = []
+    for (label, _), line in zip(series, values):
+        points = ' '.join(
+            f'{index * step:.1f},{height - value / peak * height:.1f}'
+            for index, value in enumerate(line) if value is not None
+        )
+        lines.append({'label': label, 'points': points})
+    return {'width': width, 'height': height, 'peak': peak, 'lines': lines}
@@ -0,0 +1,91 @@
+import functools
+import os
+
+from flask import current_app
+from markupsafe import Markup, escape
+
+from digest import describe_bin_types
+
+# Per-recipient fields. Cohort renders put a marker where each one goes and
+# fill() substitutes the values, so templates must output them unfiltered.
+USER_FIELDS = ('sms_credits', 'invite_url')
+_MARK = '\x00'
+_MARKERS = {name: Markup(f'{_MARK}{name}{_MARK}') for name in USER_FIELDS}
+
+
+class CohortEmail:
+    """
+    An email rendered once for a cohort (e.g. every recipient of a reminder
+    for the same bins and date), split around the per-recipient fields.
+    """
+
+    def __init__(self, subject, text, html):
+        self.subject = subject
+        self._text = self._split(text)
+        self._html = self._split(html)
+
+    @staticmethod
+    def _split(rendered):
+        parts = rendered.split(_MARK)
+        # Rendered text alternates with the names of the user fields
+        return parts[0], list(zip(parts[1::2], parts[2::2]))
+
+    @staticmethod
+    def _fill(split, values):
+        head, tail = split
+        out = [head]
+        for name, text in tail:
+            out.append(values[name])
+            out.append(text)
+        return ''.join(out)
+
+    def fill(self, **fields):
+        """subject/text/html for one recipient."""
+        values = {name: str(value) for name, value in fields.items()}
+        return {
+            'subject': self.subject,
+            'text': self._fill(self._text, values),
+            'html': self._fill(self._html, {name: str(escape(value)) for name, value in values.items()}),
+        }
+
+
+def render_cohort(name, **cohort):
+    """CohortEmail for templates/email/<name>{_subject.txt,.txt,.html} and the cohort's values."""
+    # Template objects are compiled once and cached by the app's Jinja environment
+    env = current_app.jinja_env
+    context = dict(cohort, **_MARKERS)
+    return CohortEmail(
+        subject=env.get_template(f'email/{name}_subject.txt').render(context).strip(),
+        text=env.get_template(f'email/{name}.txt').render(context),
+        html=env.get_template(f'email/{name}.html').render(context),
+    )
+
+
+def reminder_cohort(bin_types, collection_date):
+    """The collection reminder for one set of bins collected on one date, rendered once per process."""
+    return _reminder_cohort(tuple(bin_types), collection_date)
+
+
+@functools.lru_cache(maxsize=256)
+def _reminder_cohort(bin_types, collection_date):
+    return render_cohort(
+        'reminder',
+        bins=describe_bin_types(bin_types),
+        bins_title=describe_bin_types([bin_type.title() for bin_type in bin_types]),
+        plural=len(bin_types) > 1,
+        collection_date=collection_date.strftime('%A, %B %d, %Y'),
+    )
+
+
+def mail_payload(recipient_email, content):
+    """MailerSend payload with text and HTML parts; also valid as a bulk-email entry."""
+    return {
+        "from": {
+            "email": os.environ.get('MAILERSEND_FROM_EMAIL'),
+            "name": "Bin Collection Reminder"
+        },
+        "to": [{"email": recipient_email}],
+        "subject": content['subject'],
+        "text": content['text'],
+        "html": content['html'],
+    }
@@ -0,0 +1,152 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import DateTime, func, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+
+def _db_utcnow(seconds=0):
+    """
+    SQL for the database server's current time as naive UTC, plus `seconds`.
+
+    Lease times are written and compared with the database's clock, so a node
+    whose own clock is ahead can't see a live lease as expired.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        # Same text format SQLAlchemy stores, to the millisecond
+        return func.strftime('%Y-%m-%d %H:%M:%f000', 'now', f'{int(seconds):+d} seconds', type_=DateTime)
+    if dialect == 'postgresql':
+        now = func.timezone('UTC', func.now(), type_=DateTime)
+    else:
+        now = func.now(type_=DateTime)
+    return now + timedelta(seconds=seconds) if seconds else now
+
+
+class LeaderElection:
+    """
+    Lease-based leader election for the notification scheduler.
+
+    Every process runs its scheduler paused and competes for a single row in
+    scheduler_lease. The holder renews the lease every `renew_interval`
+    seconds and is the only process whose scheduler is resumed; if it dies,
+    the lease expires after `lease_seconds` and another process takes over
+    on its next attempt.
+    """
+
+    def __init__(self, app, scheduler, name='notification-dispatch', lease_seconds=15,
+                 renew_interval=5, on_elected=None):
+        self.app = app
+        self.scheduler = scheduler
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.renew_interval = renew_interval
+        self.on_elected = on_elected
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler paused and begin competing for the lease."""
+        if self._thread and self._thread.is_alive():
+            return
+        if not self.scheduler.running:
+            self.scheduler.start(paused=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='scheduler-leader-election', daemon=True)
+        self._thread.start()
+        logger.info(f"Scheduler leader election started as {self.identity}")
+
+    def stop(self):
+        """Stop competing and hand the lease over immediately if we hold it."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.renew_interval + 1)
+        if self.is_leader:
+            self._release()
+            self._demote()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                acquired = self._try_acquire()
+            except Exception as e:
+                logger.error(f"Scheduler lease check failed: {str(e)}")
+                acquired = False
+
+            if acquired and not self.is_leader:
+                self._promote()
+            elif not acquired and self.is_leader:
+                self._demote()
+
+            self._stop.wait(self.renew_interval)
+
+    def _try_acquire(self):
+        """Take or renew the lease; returns True if this process holds it."""
+        with self.app.app_context():
+            now = _db_utcnow()
+            expires_at = _db_utcnow(self.lease_seconds)
+            result = db.session.execute(
+                update(SchedulerLease)
+                .where(
+                    SchedulerLease.name == self.name,
+                    (SchedulerLease.holder == self.identity) | (SchedulerLease.expires_at < now)
+                )
+                .values(holder=self.identity, expires_at=expires_at)
+            )
+            if result.rowcount:
+                db.session.commit()
+                return True
+
+            exists = db.session.get(SchedulerLease, self.name) is not None
+            if exists:
+                db.session.rollback()
+                return False
+
+            try:
+                db.session.add(SchedulerLease(name=self.name, holder=self.identity, expires_at=expires_at))
+                db.session.commit()
+                return True
+            except IntegrityError:
+                # Another process created the row first
+                db.session.rollback()
+                return False
+
+    def _release(self):
+        try:
+            with self.app.app_context():
+                db.session.execute(
+                    update(SchedulerLease)
+                    .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.identity)
+                    .values(expires_at=_db_utcnow())
+                )
+                db.session.commit()
+            logger.info("Released scheduler lease")
+        except Exception as e:
+            logger.error(f"Failed to release scheduler lease: {str(e)}")
+
+    def _promote(self):
+        self.is_leader = True
+        logger.info(f"Elected scheduler leader ({self.identity})")
+        if self.on_elected:
+            try:
+                self.on_elected()
+            except Exception as e:
+                logger.error(f"Error preparing scheduler jobs: {str(e)}")
+        self.scheduler.resume()
+
+    def _demote(self):
+        self.is_leader = False
+        if self.scheduler.running:
+            self.scheduler.pause()
+        logger.warning(f"Lost scheduler leadership ({self.identity}); dispatch jobs paused")
@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database import db
+from models import SMSLog, EmailLog
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+EXPORT_STATUSES = ('success', 'failure')
+
+# Rows fetched per round trip, and roughly how much text is sent per chunk
+FETCH_SIZE = 2000
+CHUNK_BYTES = 64 * 1024
+
+
+class ExportError(ValueError):
+    pass
+
+
+EXPORTS = {
+    'sms': (SMSLog, ['id', 'sent_at', 'recipient_phone', 'bin_type', 'status', 'message_text', 'error_message',
+                     'provider_message_id', 'delivery_status']),
+    'email': (EmailLog, ['id', 'sent_at', 'recipient_email', 'bin_type', 'status', 'error_message',
+                         'provider_message_id', 'delivery_status']),
+}
+
+
+def _parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ExportError(f"Invalid {name} date '{value}', expected YYYY-MM-DD")
+
+
+def build_export_query(kind, start=None, end=None, status=None):
+    """
+    Select statement for a log export.
+
+    `start` and `end` are inclusive YYYY-MM-DD dates; `status` is 'success'
+    or 'failure'. Only plain columns are selected so rows never become ORM
+    objects.
+    """
+    if kind not in EXPORTS:
+        raise ExportError(f"Unknown log type '{kind}'")
+    if status and status not in EXPORT_STATUSES:
+        raise ExportError(f"Invalid status '{status}'")
+
+    model, columns = EXPORTS[kind]
+    start_date = _parse_date(start, 'start')
+    end_date = _parse_date(end, 'end')
+
+    query = select(*[getattr(model, name) for name in columns])
+    if start_date:
+        query = query.where(model.sent_at >= start_date)
+    if end_date:
+        query = query.where(model.sent_at < end_date + timedelta(days=1))
+    if status:
+        query = query.where(model.status == status)
+    return query.order_by(model.sent_at, model.id), columns
+
+
+def _stream_rows(query):
+    # yield_per turns on stream_results: a server-side cursor on PostgreSQL,
+    # so only FETCH_SIZE rows are held in memory at a time
+    result = db.session.execute(query.execution_options(yield_per=FETCH_SIZE))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _chunked(lines):
+    """Join small pieces of text into roughly CHUNK_BYTES sized chunks."""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_lines(rows, columns):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_serialize(value) for value in row])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+
+def _jsonl_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, map(_serialize, row)))) + '\n'
+
+
+def iter_export(kind, fmt='csv', start=None, end=None, status=None):
+    """
+    Validate the filters and return a generator of text chunks.
+
+    Validation happens before the first chunk so bad filters can still be
+    reported as an error response; the query itself runs lazily as the
+    generator is consumed.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'")
+    query, columns = build_export_query(kind, start, end, status)
+    lines = _csv_lines if fmt == 'csv' else _jsonl_lines
+    return _chunked(lines(_stream_rows(query), columns))
+
+
+def export_filename(kind, fmt, start=None, end=None, status=None):
+    parts = [f'{kind}-logs']
+    if start or end:
+        parts.append(f"{start or 'start'}_to_{end or 'now'}")
+    if status:
+        parts.append(status)
+    return '-'.join(parts) + f'.{fmt}'
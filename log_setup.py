@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMATS = ('kv', 'json')
+
+# Attributes every LogRecord has; anything else was passed in `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_state = {'listener': None, 'stream': None, 'level': None, 'fmt': None}
+
+
+def record_fields(record):
+    """Standard fields plus any `extra=` values, in a stable order."""
+    fields = {
+        'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+        'level': record.levelname,
+        'logger': record.name,
+        'msg': record.getMessage(),
+    }
+    for key, value in record.__dict__.items():
+        if key not in _RECORD_ATTRS and not key.startswith('_'):
+            fields[key] = value
+    return fields
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`ts=... level=INFO logger=app msg="..." key=value` lines."""
+
+    @staticmethod
+    def _value(value):
+        text = str(value)
+        if not text or any(c in text for c in ' "=\n'):
+            return json.dumps(text)
+        return text
+
+    def format(self, record):
+        line = ' '.join(f'{key}={self._value(value)}' for key, value in record_fields(record).items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        fields = record_fields(record)
+        if record.exc_info:
+            fields['exc'] = self.formatException(record.exc_info)
+        return json.dumps(fields, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that hands the record over untouched.
+
+    The stock prepare() formats the message on the calling thread so records
+    can be pickled for other processes; the listener here is a thread in the
+    same process, so formatting is left to it.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """
+    Route all logging through a queue to a listener thread that formats and
+    writes the records, so logging calls on the send path only enqueue.
+
+    `level` and `fmt` default to LOG_LEVEL (INFO) and LOG_FORMAT ('kv' or
+    'json'); `stream` to stderr. Calling it again replaces the previous
+    setup, e.g. to redirect output.
+    """
+    level = level or os.environ.get('LOG_LEVEL', 'INFO').upper()
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'kv').lower()
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"LOG_FORMAT must be one of {', '.join(LOG_FORMATS)}")
+    stream = stream or sys.stderr
+
+    stop_logging()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else KeyValueFormatter())
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+
+    if _state['stream'] is None:
+        atexit.register(stop_logging)
+        # The listener thread doesn't survive a fork (e.g. gunicorn --preload)
+        os.register_at_fork(after_in_child=_restart_after_fork)
+    _state.update(listener=listener, stream=stream, level=level, fmt=fmt)
+    return listener
+
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    listener = _state['listener']
+    if listener is not None:
+        _state['listener'] = None
+        listener.stop()
+
+
+def _restart_after_fork():
+    if _state['listener'] is not None:
+        _state['listener'] = None
+        configure_logging(_state['level'], _state['fmt'], _state['stream'])
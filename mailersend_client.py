@@ -0,0 +1,31 @@
+import requests
+from mailersend import emails
+
+
+class SendResponse(str):
+    """The SDK's 'status\\nbody' response string, plus MailerSend's message id."""
+
+    def __new__(cls, value, message_id=None):
+        response = super().__new__(cls, value)
+        response.message_id = message_id
+        return response
+
+
+class MailerSendClient(emails.NewEmail):
+    """
+    NewEmail whose send() keeps the X-Message-Id header and has a timeout.
+
+    The SDK only returns the status and body, and a queued email's body is
+    empty; the header is the id MailerSend's webhooks refer to. It also posts
+    without a timeout, so a hung connection would stall the dispatcher;
+    `timeout` is requests' (connect, read) seconds.
+    """
+
+    def __init__(self, api_key, timeout=(5, 30)):
+        super().__init__(api_key)
+        self.timeout = timeout
+
+    def send(self, message):
+        response = requests.post(f"{self.api_base}/email", headers=self.headers_default, json=message,
+                                 timeout=self.timeout)
+        return SendResponse(f"{response.status_code}\n{response.text}", response.headers.get('X-Message-Id'))
@@ -1,21 +1,25 @@
 import os
 import atexit
-from app import app, scheduler, logger
+from log_setup import configure_logging
 
-def shutdown_scheduler():
-    if scheduler.running:
-        scheduler.shutdown()
-        logger.info("Scheduler shut down successfully")
+# Before importing the app, so its start-up messages are formatted too
+configure_logging()
+
+from app import app, init_db, start_scheduler, stop_scheduler, logger
 
 if __name__ == "__main__":
-    # Register scheduler shutdown
-    atexit.register(shutdown_scheduler)
+    # Create any missing tables; CLI commands and workers never do this
+    init_db()
+
+    # Register scheduler shutdown, handing the lease over straight away
+    # instead of waiting for it to expire
+    atexit.register(stop_scheduler)
 
-    # Start the scheduler
-    if not scheduler.running:
-        scheduler.start()
-        logger.info("Notification scheduler started successfully")
+    # Start the scheduler; dispatch jobs only run while this process is the
+    # elected leader, so several instances can run side by side
+    start_scheduler()
+    logger.info("Notification scheduler started successfully")
 
     # Use environment port if available, otherwise default to 5000
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
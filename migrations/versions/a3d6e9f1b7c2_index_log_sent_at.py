@@ -0,0 +1,32 @@
+"""Index email_log and sms_log on sent_at for date-range exports
+
+Revision ID: a3d6e9f1b7c2
+Revises: f5a8c3d6b194
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d6e9f1b7c2'
+down_revision = 'f5a8c3d6b194'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_log', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_email_log_sent_at'), ['sent_at'], unique=False)
+
+    with op.batch_alter_table('sms_log', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sms_log_sent_at'), ['sent_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sms_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sms_log_sent_at'))
+
+    with op.batch_alter_table('email_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_email_log_sent_at'))
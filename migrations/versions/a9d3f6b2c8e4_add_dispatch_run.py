@@ -0,0 +1,54 @@
+"""Add dispatch_run history of reminder dispatch runs
+
+Revision ID: a9d3f6b2c8e4
+Revises: f2c8a4d6b1e9
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3f6b2c8e4'
+down_revision = 'f2c8a4d6b1e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dispatch_run',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('slot', sa.String(length=10), nullable=False),
+        sa.Column('hour', sa.Integer(), nullable=True),
+        sa.Column('shard', sa.Integer(), nullable=True),
+        sa.Column('shards', sa.Integer(), nullable=True),
+        sa.Column('process', sa.String(length=100), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('cohort_size', sa.Integer(), nullable=False),
+        sa.Column('users', sa.Integer(), nullable=False),
+        sa.Column('email_sent', sa.Integer(), nullable=False),
+        sa.Column('email_failed', sa.Integer(), nullable=False),
+        sa.Column('email_queued', sa.Integer(), nullable=False),
+        sa.Column('sms_sent', sa.Integer(), nullable=False),
+        sa.Column('sms_failed', sa.Integer(), nullable=False),
+        sa.Column('sms_queued', sa.Integer(), nullable=False),
+        sa.Column('duplicates', sa.Integer(), nullable=False),
+        sa.Column('credits_used', sa.Integer(), nullable=False),
+        sa.Column('query_ms', sa.Float(), nullable=False),
+        sa.Column('render_ms', sa.Float(), nullable=False),
+        sa.Column('send_ms', sa.Float(), nullable=False),
+        sa.Column('commit_ms', sa.Float(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('dispatch_run', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_dispatch_run_started_at'), ['started_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('dispatch_run', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_dispatch_run_started_at'))
+
+    op.drop_table('dispatch_run')
@@ -0,0 +1,25 @@
+"""Index lower(email) for case-insensitive login and registration lookups
+
+Revision ID: b6e1c9d4f7a2
+Revises: a9d3f6b2c8e4
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1c9d4f7a2'
+down_revision = 'a9d3f6b2c8e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Not unique: existing accounts may differ only by letter case
+    op.create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_email_lower', table_name='user')
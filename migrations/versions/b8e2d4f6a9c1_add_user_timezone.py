@@ -0,0 +1,34 @@
+"""Add per-user time zone and include it in the dispatch indexes
+
+Revision ID: b8e2d4f6a9c1
+Revises: a3d6e9f1b7c2
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2d4f6a9c1'
+down_revision = 'a3d6e9f1b7c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('timezone', sa.String(length=50), server_default='Europe/London', nullable=False))
+        batch_op.drop_index('ix_user_evening_dispatch')
+        batch_op.drop_index('ix_user_morning_dispatch')
+        batch_op.create_index('ix_user_evening_dispatch', ['evening_notification', 'evening_notification_time', 'timezone'], unique=False)
+        batch_op.create_index('ix_user_morning_dispatch', ['morning_notification', 'morning_notification_time', 'timezone'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_morning_dispatch')
+        batch_op.drop_index('ix_user_evening_dispatch')
+        batch_op.create_index('ix_user_evening_dispatch', ['evening_notification', 'evening_notification_time'], unique=False)
+        batch_op.create_index('ix_user_morning_dispatch', ['morning_notification', 'morning_notification_time'], unique=False)
+        batch_op.drop_column('timezone')
@@ -0,0 +1,26 @@
+"""Add schedule_version to user for page caching and ETags
+
+Revision ID: c9f1a7e3d5b8
+Revises: b8e2d4f6a9c1
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f1a7e3d5b8'
+down_revision = 'b8e2d4f6a9c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('schedule_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('schedule_version')
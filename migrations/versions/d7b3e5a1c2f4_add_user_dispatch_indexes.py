@@ -0,0 +1,28 @@
+"""Add (slot, hour) indexes for hourly notification dispatch
+
+Revision ID: d7b3e5a1c2f4
+Revises: c4e8a1f2b9d3
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b3e5a1c2f4'
+down_revision = 'c4e8a1f2b9d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_evening_dispatch', ['evening_notification', 'evening_notification_time'], unique=False)
+        batch_op.create_index('ix_user_morning_dispatch', ['morning_notification', 'morning_notification_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_morning_dispatch')
+        batch_op.drop_index('ix_user_evening_dispatch')
@@ -0,0 +1,34 @@
+"""Add notification_delivery ledger for idempotent dispatch
+
+Revision ID: e2c9f4b7a815
+Revises: d7b3e5a1c2f4
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c9f4b7a815'
+down_revision = 'd7b3e5a1c2f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_delivery',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('bin_schedule_id', sa.Integer(), nullable=False),
+        sa.Column('collection_date', sa.Date(), nullable=False),
+        sa.Column('slot', sa.String(length=10), nullable=False),
+        sa.Column('channel', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['bin_schedule_id'], ['bin_schedule.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('bin_schedule_id', 'collection_date', 'slot', 'channel', name='uq_notification_delivery')
+    )
+
+
+def downgrade():
+    op.drop_table('notification_delivery')
@@ -0,0 +1,44 @@
+"""Widen email/SMS log bin_type for same-day digests
+
+Revision ID: e7b1d3f5a2c6
+Revises: d4a7c2e9f1b3
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b1d3f5a2c6'
+down_revision = 'd4a7c2e9f1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_log', schema=None) as batch_op:
+        batch_op.alter_column('bin_type',
+               existing_type=sa.String(length=20),
+               type_=sa.String(length=50),
+               existing_nullable=False)
+
+    with op.batch_alter_table('sms_log', schema=None) as batch_op:
+        batch_op.alter_column('bin_type',
+               existing_type=sa.String(length=20),
+               type_=sa.String(length=50),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sms_log', schema=None) as batch_op:
+        batch_op.alter_column('bin_type',
+               existing_type=sa.String(length=50),
+               type_=sa.String(length=20),
+               existing_nullable=True)
+
+    with op.batch_alter_table('email_log', schema=None) as batch_op:
+        batch_op.alter_column('bin_type',
+               existing_type=sa.String(length=50),
+               type_=sa.String(length=20),
+               existing_nullable=False)
@@ -0,0 +1,44 @@
+"""Add provider message ids and delivery status to email/SMS logs
+
+Revision ID: f2c8a4d6b1e9
+Revises: e7b1d3f5a2c6
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8a4d6b1e9'
+down_revision = 'e7b1d3f5a2c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('provider_message_id', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('delivery_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('delivery_updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_email_log_provider_message_id'), ['provider_message_id'], unique=False)
+
+    with op.batch_alter_table('sms_log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('provider_message_id', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('delivery_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('delivery_updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_sms_log_provider_message_id'), ['provider_message_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sms_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sms_log_provider_message_id'))
+        batch_op.drop_column('delivery_updated_at')
+        batch_op.drop_column('delivery_status')
+        batch_op.drop_column('provider_message_id')
+
+    with op.batch_alter_table('email_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_email_log_provider_message_id'))
+        batch_op.drop_column('delivery_updated_at')
+        batch_op.drop_column('delivery_status')
+        batch_op.drop_column('provider_message_id')
@@ -0,0 +1,42 @@
+"""Add notification_retry queue for transient delivery failures
+
+Revision ID: f5a8c3d6b194
+Revises: e2c9f4b7a815
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a8c3d6b194'
+down_revision = 'e2c9f4b7a815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_retry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('bin_schedule_id', sa.Integer(), nullable=False),
+        sa.Column('collection_date', sa.Date(), nullable=False),
+        sa.Column('slot', sa.String(length=10), nullable=False),
+        sa.Column('channel', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['bin_schedule_id'], ['bin_schedule.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('bin_schedule_id', 'collection_date', 'slot', 'channel', name='uq_notification_retry')
+    )
+    with op.batch_alter_table('notification_retry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_retry_next_attempt_at'), ['next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_retry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_retry_next_attempt_at'))
+
+    op.drop_table('notification_retry')
@@ -1,7 +1,13 @@
 from database import db
+from flask import current_app
 from flask_login import UserMixin
+from werkzeug.local import LocalProxy
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, delete, insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+import hashlib
 import secrets
 import logging
 import pytz
@@ -10,6 +16,20 @@ logger = logging.getLogger(__name__)
 
 GMT_TZ = pytz.timezone('GMT')
 
+REFERRAL_CODE_ATTEMPTS = 5
+
+# Hours a user may choose for each reminder slot, in their own time zone.
+# Dispatch jobs run for every slot at all 24 UTC hours (see DISPATCH_JOBS)
+# and pick the users whose local hour is due.
+NOTIFICATION_HOURS = {
+    'evening': range(12, 23),
+    'morning': range(5, 12),
+}
+
+def is_referral_code_conflict(error):
+    """True if an IntegrityError came from the referral_code unique constraint."""
+    return 'referral_code' in str(error.orig)
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -33,6 +53,13 @@ class User(UserMixin, db.Model):
     morning_notification_time = db.Column(db.Integer, default=7, nullable=False)
     morning_notification_type = db.Column(db.String(10), default='both', nullable=False)
 
+    # Bumped whenever anything shown on the user's dashboard/calendar changes;
+    # keys the page cache and ETags
+    schedule_version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+
+    # IANA time zone; notification hours are local to it
+    timezone = db.Column(db.String(50), default='Europe/London', server_default='Europe/London', nullable=False)
+
     # Referral system and SMS credits
     sms_credits = db.Column(db.Integer, default=6, nullable=False)
     referral_code = db.Column(db.String(10), unique=True, nullable=False)
@@ -41,11 +68,29 @@ class User(UserMixin, db.Model):
                                backref=db.backref('referred_by', remote_side=[id]),
                                foreign_keys=[referred_by_id])
 
+    # Hourly dispatch looks users up by (slot enabled, local slot hour, time zone)
+    __table_args__ = (
+        db.Index('ix_user_evening_dispatch', 'evening_notification', 'evening_notification_time', 'timezone'),
+        db.Index('ix_user_morning_dispatch', 'morning_notification', 'morning_notification_time', 'timezone'),
+        # Case-insensitive email lookups (see find_by_email)
+        db.Index('ix_user_email_lower', func.lower(email)),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if not self.referral_code:
             self.referral_code = self.generate_referral_code()
 
+    @staticmethod
+    def normalize_email(email):
+        """Emails are stored lowercased and compared case-insensitively."""
+        return (email or '').strip().lower()
+
+    @classmethod
+    def find_by_email(cls, email):
+        """The user with this email in any letter case (older accounts may be stored mixed-case)."""
+        return cls.query.filter(func.lower(cls.email) == cls.normalize_email(email)).first()
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -54,29 +99,59 @@ class User(UserMixin, db.Model):
 
     @staticmethod
     def generate_referral_code():
-        """Generate a unique 8-character referral code."""
-        while True:
-            code = secrets.token_hex(4)  # 8 characters
-            if not User.query.filter_by(referral_code=code).first():
-                return code
+        """
+        Generate a random 8-character referral code.
+
+        Uniqueness is left to the database constraint rather than checked with
+        a query first; use insert_with_unique_referral_code() to retry on the
+        rare collision.
+        """
+        return secrets.token_hex(4)  # 8 characters
+
+    def insert_with_unique_referral_code(self, max_attempts=REFERRAL_CODE_ATTEMPTS):
+        """Add and flush this new user, drawing a fresh code if the current one is taken."""
+        for attempt in range(max_attempts):
+            try:
+                with db.session.begin_nested():
+                    db.session.add(self)
+                return self
+            except IntegrityError as e:
+                if not is_referral_code_conflict(e) or attempt == max_attempts - 1:
+                    raise
+                logger.info(f"Referral code collision on {self.referral_code}, retrying")
+                self.referral_code = self.generate_referral_code()
 
     def has_sms_credits(self):
         """Check if user has SMS credits available."""
         return self.sms_credits > 0
 
     def use_sms_credit(self):
-        """Use one SMS credit if available."""
+        """Use one SMS credit if available; the caller commits."""
         if self.has_sms_credits():
-            self.sms_credits -= 1
-            db.session.commit()
-            return True
+            # Decrement in SQL so a cached (possibly stale) balance can't
+            # overwrite credits granted elsewhere in the meantime.
+            result = db.session.execute(
+                update(User)
+                .where(User.id == self.id, User.sms_credits > 0)
+                .values(sms_credits=User.sms_credits - 1)
+            )
+            user_cache.invalidate(self.id)
+            return result.rowcount > 0
         return False
 
+    def bump_schedule_version(self):
+        """Invalidate cached pages and ETags for this user (applied on the next flush)."""
+        self.schedule_version = User.schedule_version + 1
+
     def add_credits(self, amount):
         """Add SMS credits to the user's account."""
-        self.sms_credits += amount
+        self.sms_credits = User.sms_credits + amount
         db.session.commit()
 
+# The current app's session user snapshots for the Flask-Login loader (a
+# UserCache built in create_app)
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])
+
 class PostcodeSchedule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     postcode = db.Column(db.String(10), nullable=False)
@@ -127,11 +202,15 @@ class BinSchedule(db.Model):
 
 class EmailLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    sent_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(GMT_TZ))
+    sent_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(GMT_TZ), index=True)
     recipient_email = db.Column(db.String(120), nullable=False)
-    bin_type = db.Column(db.String(20), nullable=False)
+    bin_type = db.Column(db.String(50), nullable=False)  # comma-separated for same-day digests
     status = db.Column(db.String(10), nullable=False)
     error_message = db.Column(db.Text, nullable=True)
+    # Set from MailerSend's response; delivery webhooks look rows up by it
+    provider_message_id = db.Column(db.String(64), nullable=True, index=True)
+    delivery_status = db.Column(db.String(20), nullable=True)
+    delivery_updated_at = db.Column(db.DateTime, nullable=True)
 
 class SMSTemplate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -158,9 +237,245 @@ class SMSTemplate(db.Model):
 
 class SMSLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    sent_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(GMT_TZ))
+    sent_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(GMT_TZ), index=True)
     recipient_phone = db.Column(db.String(20), nullable=False)
     message_text = db.Column(db.Text, nullable=False)
     status = db.Column(db.String(10), nullable=False)
     error_message = db.Column(db.Text, nullable=True)
-    bin_type = db.Column(db.String(20), nullable=True)
\ No newline at end of file
+    bin_type = db.Column(db.String(50), nullable=True)  # comma-separated for same-day digests
+    # Telnyx message id; delivery receipts look rows up by it
+    provider_message_id = db.Column(db.String(64), nullable=True, index=True)
+    delivery_status = db.Column(db.String(20), nullable=True)
+    delivery_updated_at = db.Column(db.DateTime, nullable=True)
+
+class SchedulerLease(db.Model):
+    """Single-row lease deciding which process runs the notification scheduler."""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class NotificationDelivery(db.Model):
+    """
+    Ledger of reminders handed to a provider, one row per schedule, collection
+    date, slot and channel.
+
+    The dispatcher claims a row before sending, so overlapping or repeated
+    runs skip deliveries that already happened. Claims are committed on their
+    own connection, independent of the caller's session.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    bin_schedule_id = db.Column(db.Integer, db.ForeignKey('bin_schedule.id', ondelete='CASCADE'), nullable=False)
+    collection_date = db.Column(db.Date, nullable=False)
+    slot = db.Column(db.String(10), nullable=False)  # 'evening' or 'morning'
+    channel = db.Column(db.String(10), nullable=False)  # 'email' or 'sms'
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(GMT_TZ))
+
+    __table_args__ = (
+        db.UniqueConstraint('bin_schedule_id', 'collection_date', 'slot', 'channel',
+                            name='uq_notification_delivery'),
+    )
+
+    KEY_COLUMNS = ['bin_schedule_id', 'collection_date', 'slot', 'channel']
+
+    @classmethod
+    def claim(cls, bin_schedule_id, collection_date, slot, channel):
+        """Record a delivery; returns False if it was already recorded."""
+        values = {
+            'bin_schedule_id': bin_schedule_id,
+            'collection_date': collection_date,
+            'slot': slot,
+            'channel': channel,
+            'created_at': datetime.now(GMT_TZ),
+        }
+        engine = db.engine
+        dialect = engine.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = dialect_insert(cls).values(**values).on_conflict_do_nothing(index_elements=cls.KEY_COLUMNS)
+            with engine.begin() as conn:
+                return conn.execute(stmt).rowcount == 1
+
+        # Other databases: rely on the unique constraint
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(cls).values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    @classmethod
+    def release(cls, bin_schedule_id, collection_date, slot, channel):
+        """Drop a claim whose send failed so a later run can retry it."""
+        with db.engine.begin() as conn:
+            conn.execute(
+                delete(cls).where(
+                    cls.bin_schedule_id == bin_schedule_id,
+                    cls.collection_date == collection_date,
+                    cls.slot == slot,
+                    cls.channel == channel
+                )
+            )
+
+class NotificationRetry(db.Model):
+    """
+    Reminder deliveries waiting to be retried after a transient provider failure.
+
+    The matching NotificationDelivery claim stays in place while a retry is
+    queued, so only the retry worker can send it.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    bin_schedule_id = db.Column(db.Integer, db.ForeignKey('bin_schedule.id', ondelete='CASCADE'), nullable=False)
+    collection_date = db.Column(db.Date, nullable=False)
+    slot = db.Column(db.String(10), nullable=False)
+    channel = db.Column(db.String(10), nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, index=True)  # naive UTC
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(GMT_TZ))
+    bin_schedule = db.relationship('BinSchedule')
+
+    __table_args__ = (
+        db.UniqueConstraint('bin_schedule_id', 'collection_date', 'slot', 'channel',
+                            name='uq_notification_retry'),
+    )
+
+    @staticmethod
+    def utcnow():
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    @classmethod
+    def enqueue(cls, bin_schedule_id, collection_date, slot, channel, delay, error=None):
+        """Queue a delivery for another attempt in `delay` seconds."""
+        retry = cls(
+            bin_schedule_id=bin_schedule_id,
+            collection_date=collection_date,
+            slot=slot,
+            channel=channel,
+            next_attempt_at=cls.utcnow() + timedelta(seconds=delay),
+            last_error=error
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(retry)
+            db.session.commit()
+        except IntegrityError:
+            # Already queued by an overlapping run
+            db.session.rollback()
+
+class DispatchRun(db.Model):
+    """
+    One check_upcoming_collections run (or one shard of it), for the admin
+    dispatch timeline.
+
+    The row is inserted when the run starts and completed when it finishes,
+    both on their own connection, so a run still in progress (or one that
+    died) shows up with no finished_at. Times are naive UTC.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    slot = db.Column(db.String(10), nullable=False)
+    hour = db.Column(db.Integer, nullable=True)  # UTC hour dispatched, None for a manual run
+    shard = db.Column(db.Integer, nullable=True)
+    shards = db.Column(db.Integer, nullable=True)
+    process = db.Column(db.String(100), nullable=True)  # host:pid
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    cohort_size = db.Column(db.Integer, nullable=False, default=0)  # due schedules fetched
+    users = db.Column(db.Integer, nullable=False, default=0)
+    email_sent = db.Column(db.Integer, nullable=False, default=0)
+    email_failed = db.Column(db.Integer, nullable=False, default=0)
+    email_queued = db.Column(db.Integer, nullable=False, default=0)
+    sms_sent = db.Column(db.Integer, nullable=False, default=0)
+    sms_failed = db.Column(db.Integer, nullable=False, default=0)
+    sms_queued = db.Column(db.Integer, nullable=False, default=0)
+    duplicates = db.Column(db.Integer, nullable=False, default=0)
+    credits_used = db.Column(db.Integer, nullable=False, default=0)
+    query_ms = db.Column(db.Float, nullable=False, default=0)
+    render_ms = db.Column(db.Float, nullable=False, default=0)
+    send_ms = db.Column(db.Float, nullable=False, default=0)
+    commit_ms = db.Column(db.Float, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    PHASES = ['query', 'render', 'send', 'commit']
+
+    @staticmethod
+    def utcnow():
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    @classmethod
+    def start(cls, slot, hour=None, shard=None, shards=None, process=None):
+        """Record a run as started; returns its id."""
+        with db.engine.begin() as conn:
+            result = conn.execute(insert(cls).values(
+                slot=slot, hour=hour, shard=shard, shards=shards, process=process,
+                started_at=cls.utcnow(), cohort_size=0, users=0,
+                email_sent=0, email_failed=0, email_queued=0,
+                sms_sent=0, sms_failed=0, sms_queued=0, duplicates=0, credits_used=0,
+                query_ms=0, render_ms=0, send_ms=0, commit_ms=0
+            ))
+            return result.inserted_primary_key[0]
+
+    @classmethod
+    def finish(cls, run_id, **values):
+        """Record a run's end time and totals."""
+        with db.engine.begin() as conn:
+            conn.execute(update(cls).where(cls.id == run_id).values(finished_at=cls.utcnow(), **values))
+
+    @property
+    def duration_ms(self):
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds() * 1000
+
+    @property
+    def messages(self):
+        """Reminders handed to (or attempted with) a provider."""
+        return (self.email_sent + self.email_failed + self.email_queued
+                + self.sms_sent + self.sms_failed + self.sms_queued)
+
+    @property
+    def throughput(self):
+        """Messages per second over the whole run."""
+        if not self.duration_ms:
+            return None
+        return self.messages / (self.duration_ms / 1000)
+
+    @property
+    def other_ms(self):
+        """Time not in a timed phase (grouping, ORM bookkeeping, logging)."""
+        if self.duration_ms is None:
+            return None
+        return max(self.duration_ms - sum(getattr(self, f'{phase}_ms') for phase in self.PHASES), 0)
+
+class ApiToken(db.Model):
+    """
+    Bearer token for the JSON API.
+
+    Only a SHA-256 of the token is stored; the token itself is shown to the
+    user once when it is issued.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(50), nullable=False, default='API token')
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(GMT_TZ))
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user_id, name='API token'):
+        """Create a token for a user; returns (row, plain token). The caller commits."""
+        token = secrets.token_urlsafe(32)
+        row = cls(user_id=user_id, name=name, token_hash=cls.hash_token(token))
+        db.session.add(row)
+        return row, token
+
+    @classmethod
+    def authenticate(cls, token):
+        """(user_id, schedule_version) for a valid token, or None. One indexed query."""
+        if not token:
+            return None
+        return db.session.query(User.id, User.schedule_version).join(
+            cls, cls.user_id == User.id
+        ).filter(cls.token_hash == cls.hash_token(token)).first()
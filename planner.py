@@ -0,0 +1,289 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+import pytz
+from sqlalchemy import func, and_
+from sqlalchemy.orm import aliased
+
+from database import db
+from models import User, BinSchedule, NOTIFICATION_HOURS
+from timezones import offset_buckets
+
+FREQUENCY_DAYS = {'weekly': 7, 'biweekly': 14}
+MAX_PLAN_DAYS = 92
+# Each user has at most one schedule per bin type
+MAX_SCHEDULES_PER_USER = 3
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _slot_columns(slot):
+    if slot == 'evening':
+        return User.evening_notification, User.evening_notification_time, User.evening_notification_type
+    return User.morning_notification, User.morning_notification_time, User.morning_notification_type
+
+
+def _slot_filter(slot):
+    """
+    Users a slot's runs can reach. The evening run before a collection moves
+    the schedule on, so morning runs only match users without evening
+    reminders.
+    """
+    enabled, _, _ = _slot_columns(slot)
+    if slot == 'evening':
+        return enabled == True
+    return and_(enabled == True, User.evening_notification == False)
+
+
+def _zone_hours(zones, run_date):
+    """
+    {zone: {local hour: (UTC hour, local date)}} for the 24 hourly dispatch
+    runs on `run_date` (a UTC date), bucketed as due_cohort_filter does.
+    """
+    hours = defaultdict(dict)
+    midnight = datetime.combine(run_date, time(0), tzinfo=pytz.utc)
+    for utc_hour in range(24):
+        for local_date, local_hour, names in offset_buckets(midnight + timedelta(hours=utc_hour), zones):
+            for name in names:
+                # A local hour repeated by a DST change is only sent once (the ledger)
+                hours[name].setdefault(local_hour, (utc_hour, local_date))
+    return hours
+
+
+def _collection_groups(slot):
+    """Due schedules for a slot, aggregated by time zone, next collection day, frequency, bin type, hour and channel."""
+    _, hour, notification_type = _slot_columns(slot)
+    collection_day = func.date(BinSchedule.next_collection)
+    rows = db.session.query(
+        User.timezone,
+        collection_day,
+        BinSchedule.frequency,
+        BinSchedule.bin_type,
+        hour,
+        notification_type,
+        func.count(BinSchedule.id)
+    ).join(User).filter(
+        _slot_filter(slot)
+    ).group_by(
+        User.timezone, collection_day, BinSchedule.frequency, BinSchedule.bin_type, hour, notification_type
+    ).all()
+    return [
+        (zone, _as_date(day), FREQUENCY_DAYS.get(frequency, 14), bin_type, hour, channel_type, count)
+        for zone, day, frequency, bin_type, hour, channel_type, count in rows
+    ]
+
+
+def _same_day_sets(slot, size):
+    """
+    Sets of `size` schedules belonging to one user, aggregated by each
+    member's collection day and frequency plus the user's time zone, hour
+    and channel.
+
+    When every member of a set is due on the same run they share one digest
+    message, so these counts turn reminders into messages (see
+    _messages_due).
+    """
+    _, hour, notification_type = _slot_columns(slot)
+    members = [aliased(BinSchedule) for _ in range(size)]
+    columns = []
+    for member in members:
+        columns += [func.date(member.next_collection), member.frequency]
+
+    query = db.session.query(*columns, User.timezone, hour, notification_type, func.count()).select_from(
+        members[0]
+    ).join(User, User.id == members[0].user_id)
+    for previous, member in zip(members, members[1:]):
+        query = query.join(member, and_(member.user_id == members[0].user_id, member.id > previous.id))
+    rows = query.filter(_slot_filter(slot)).group_by(*columns, User.timezone, hour, notification_type).all()
+
+    return [
+        ([(_as_date(row[2 * i]), FREQUENCY_DAYS.get(row[2 * i + 1], 14)) for i in range(size)],
+         row[-4], row[-3], row[-2], row[-1])
+        for row in rows
+    ]
+
+
+def _low_credit_schedules(slot, max_sms):
+    """
+    Schedules of SMS users who could run out of credits during the plan.
+
+    A run sends each user at most one SMS (a digest when several bins are
+    due), so only users with fewer credits than `max_sms` (the number of runs
+    planned) can be short, which keeps this to a small set of rows.
+    """
+    _, hour, notification_type = _slot_columns(slot)
+    rows = db.session.query(
+        User.id, User.email, User.sms_credits, User.timezone, hour,
+        func.date(BinSchedule.next_collection), BinSchedule.frequency
+    ).join(User).filter(
+        _slot_filter(slot),
+        notification_type.in_(['sms', 'both']),
+        User.sms_credits < max_sms
+    ).all()
+    return [
+        (user_id, email, credits, zone, hour, _as_date(day), FREQUENCY_DAYS.get(frequency, 14))
+        for user_id, email, credits, zone, hour, day, frequency in rows
+    ]
+
+
+def _due(base_day, period, target_date, start_date, recurring):
+    """
+    Whether a run for `target_date` matches a schedule whose next collection
+    is `base_day`, as check_upcoming_collections' window does.
+
+    The dispatcher only matches next_collection exactly, so a schedule
+    already behind the plan's start date is never sent again. Only evening
+    runs move next_collection on (including the one the night before the
+    plan starts), so only they see later collections (`recurring`).
+    """
+    if base_day < start_date:
+        return False
+    offset = (target_date - base_day).days
+    if offset == 0:
+        return True
+    return recurring and offset > 0 and offset % period == 0
+
+
+def _due_run(zone_hours, slot, zone, hour, members, start_date):
+    """
+    (UTC hour, collection date) of the `slot` run that day reaching a user
+    in `zone` who chose local `hour`, if all of `members` ((next collection
+    day, period) pairs) are due on it; otherwise None.
+    """
+    found = zone_hours.get(zone, {}).get(hour) if hour in NOTIFICATION_HOURS[slot] else None
+    if found is None:
+        return None
+    utc_hour, local_date = found
+    target_date = local_date + timedelta(days=1) if slot == 'evening' else local_date
+    recurring = slot == 'evening'
+    if not all(_due(base_day, period, target_date, start_date, recurring) for base_day, period in members):
+        return None
+    return utc_hour, target_date
+
+
+def plan_notifications(start_date, days=1, slots=None):
+    """
+    Predict what the dispatcher will send, without sending anything.
+
+    Each entry covers the 24 hourly dispatch jobs of one slot on one UTC
+    date. As with check_upcoming_collections(hour=...), users are reached
+    at their chosen local hour, bucketed by their time zone's UTC offset,
+    and evening runs cover the next local day's collections and morning
+    runs the same local day's, for users with the slot enabled. Schedules
+    are aggregated in SQL by time zone and projected the way
+    check_upcoming_collections moves them: a run only matches a schedule's
+    current next collection, and only evening runs advance it by its
+    frequency, so schedules already in the past and morning-only reminders
+    are not repeated. Sends are assumed to succeed. A user's bins due on
+    the same day count as one digest message, by inclusion-exclusion over
+    same-user pairs and triples of schedules. Credit shortfalls start from
+    current balances and spend them run by run, in UTC order. A reminder
+    skipped for lack of credits is still projected as if it moved the
+    schedule on; the dispatcher leaves an SMS-only evening schedule where
+    it is, so such users' later reminders for it may differ.
+
+    Returns one entry per (UTC run date, slot) with the local collection
+    dates it covers, email/SMS message counts, reminders by bin type,
+    messages by UTC dispatch hour, credits consumed and users skipped for
+    lack of credits.
+    """
+    if isinstance(start_date, str):
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+    days = max(1, min(int(days), MAX_PLAN_DAYS))
+    slots = list(slots or NOTIFICATION_HOURS)
+
+    zones = [zone for (zone,) in db.session.query(User.timezone).distinct()]
+    zone_hours = [_zone_hours(zones, start_date + timedelta(days=day_offset)) for day_offset in range(days)]
+
+    runs = []
+    # Low-credit users' SMS per run: (run date, UTC hour, user id, run, email, credits)
+    sms_due = []
+    for slot in slots:
+        groups = _collection_groups(slot)
+        same_day_sets = {size: _same_day_sets(slot, size) for size in range(2, MAX_SCHEDULES_PER_USER + 1)}
+        low_credit = _low_credit_schedules(slot, days * len(slots))
+
+        for day_offset in range(days):
+            run_date = start_date + timedelta(days=day_offset)
+            day_hours = zone_hours[day_offset]
+
+            collection_dates = set()
+            channels = {'email': 0, 'sms': 0}
+            by_bin_type = defaultdict(lambda: {'email': 0, 'sms': 0})
+            by_hour = defaultdict(lambda: {'email': 0, 'sms': 0})
+            for zone, base_day, period, bin_type, hour, channel_type, count in groups:
+                run_at = _due_run(day_hours, slot, zone, hour, [(base_day, period)], start_date)
+                if run_at is None:
+                    continue
+                utc_hour, target_date = run_at
+                collection_dates.add(target_date)
+                for channel in ('email', 'sms'):
+                    if channel_type in (channel, 'both'):
+                        channels[channel] += count
+                        by_bin_type[bin_type][channel] += count
+                        by_hour[utc_hour][channel] += count
+
+            # Messages = schedules - same-day pairs + same-day triples
+            for size, sets in same_day_sets.items():
+                sign = -1 if size % 2 == 0 else 1
+                for members, zone, hour, channel_type, count in sets:
+                    run_at = _due_run(day_hours, slot, zone, hour, members, start_date)
+                    if run_at is None:
+                        continue
+                    utc_hour, _ = run_at
+                    for channel in ('email', 'sms'):
+                        if channel_type in (channel, 'both'):
+                            channels[channel] += sign * count
+                            by_hour[utc_hour][channel] += sign * count
+
+            run = {
+                'run_date': run_date.isoformat(),
+                'slot': slot,
+                'collection_dates': [day.isoformat() for day in sorted(collection_dates)],
+                'email': channels['email'],
+                'sms': channels['sms'],
+                'credits_consumed': channels['sms'],
+                'skipped_sms': 0,
+                'by_bin_type': dict(by_bin_type),
+                'by_hour': {str(hour): counts for hour, counts in sorted(by_hour.items())},
+                'skipped_users': [],
+            }
+            runs.append(run)
+
+            # A run sends each user one SMS however many of their bins are due
+            users = {}
+            for user_id, email, credits, zone, hour, base_day, period in low_credit:
+                run_at = _due_run(day_hours, slot, zone, hour, [(base_day, period)], start_date)
+                if run_at is not None:
+                    users[user_id] = (run_at[0], email, credits)
+            for user_id, (utc_hour, email, credits) in users.items():
+                sms_due.append((run['run_date'], utc_hour, user_id, run, email, credits))
+
+    # Low-credit users' balances carry over from run to run, across slots
+    balances = {}
+    sms_due.sort(key=lambda entry: entry[:3])
+    for _, _, user_id, run, email, credits in sms_due:
+        balance = balances.setdefault(user_id, credits)
+        if balance >= 1:
+            balances[user_id] = balance - 1
+            continue
+        run['skipped_users'].append({'user_id': user_id, 'email': email, 'sms_credits': balance, 'sms_due': 1})
+    for run in runs:
+        run['skipped_sms'] = len(run['skipped_users'])
+        run['credits_consumed'] = run['sms'] - run['skipped_sms']
+
+    runs.sort(key=lambda run: (run['run_date'], run['slot'] != 'morning'))
+    totals = {key: sum(run[key] for run in runs) for key in ('email', 'sms', 'credits_consumed', 'skipped_sms')}
+    return {
+        'start_date': start_date.isoformat(),
+        'days': days,
+        'slots': slots,
+        'totals': totals,
+        'runs': runs,
+    }
@@ -0,0 +1,174 @@
+import csv
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from database import db
+from models import User, is_referral_code_conflict, REFERRAL_CODE_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+REQUIRED_COLUMNS = {'email', 'phone'}
+# Batches with fewer passwords to hash than this skip the process pool;
+# starting it would cost more than it saves
+INLINE_HASH_ROWS = 50
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+
+def _truthy(value):
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+
+def _parse_rows(reader, default_credits, validate_phone, result):
+    """Yield cleaned row dicts, recording problems in `result` as it goes."""
+    seen = set()
+    for line_number, row in enumerate(reader, start=2):
+        row = {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+        email = User.normalize_email(row.get('email'))
+        phone = row.get('phone', '')
+
+        if not email or not phone:
+            result.errors.append(f"Line {line_number}: email and phone are required")
+            continue
+        if validate_phone and not validate_phone(phone):
+            result.errors.append(f"Line {line_number}: invalid phone number {phone}")
+            continue
+        if not row.get('password') and not row.get('password_hash'):
+            result.errors.append(f"Line {line_number}: password or password_hash is required")
+            continue
+        if email in seen:
+            result.skipped += 1
+            continue
+        seen.add(email)
+
+        try:
+            sms_credits = int(row['sms_credits']) if row.get('sms_credits') else default_credits
+        except ValueError:
+            result.errors.append(f"Line {line_number}: invalid sms_credits {row['sms_credits']}")
+            continue
+
+        yield {
+            'email': email,
+            'phone': phone,
+            'postcode': row.get('postcode') or None,
+            'password': row.get('password'),
+            'password_hash': row.get('password_hash') or None,
+            'sms_credits': sms_credits,
+            'is_admin': _truthy(row.get('is_admin')),
+        }
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert_batch(batch, result):
+    """Insert one batch, re-drawing referral codes if the unique constraint trips."""
+    # Existing accounts may be stored mixed-case; imported emails are already lowercased
+    emails = [row['email'] for row in batch]
+    email_lower = func.lower(User.email)
+    existing = set(db.session.scalars(select(email_lower).where(email_lower.in_(emails))))
+    rows = [row for row in batch if row['email'] not in existing]
+    result.skipped += len(batch) - len(rows)
+    if not rows:
+        return
+
+    for attempt in range(REFERRAL_CODE_ATTEMPTS):
+        for row in rows:
+            row['referral_code'] = User.generate_referral_code()
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(User), rows)
+            db.session.commit()
+            result.created += len(rows)
+            return
+        except IntegrityError as e:
+            if not is_referral_code_conflict(e) or attempt == REFERRAL_CODE_ATTEMPTS - 1:
+                raise
+            logger.info(f"Referral code collision in import batch, retrying ({attempt + 1})")
+
+
+def _hash_passwords(passwords, workers, pool):
+    """Hash `passwords`, in `pool` (started on first use) for large batches; returns the hashes and the pool."""
+    if workers <= 1 or len(passwords) < INLINE_HASH_ROWS:
+        return [generate_password_hash(password) for password in passwords], pool
+    if pool is None:
+        # Spawned rather than forked: the caller may be a web process running
+        # the receipt queue, log listener and scheduler threads (see dispatch.py)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(pool.map(generate_password_hash, passwords, chunksize=chunksize)), pool
+
+
+def import_users_csv(stream, default_credits=6, validate_phone=None, batch_size=BATCH_SIZE, workers=None,
+                     max_rows=None):
+    """
+    Create users from CSV text.
+
+    Columns: email, phone (required), password or password_hash, and optional
+    postcode, sms_credits and is_admin. Rows whose email already exists are
+    skipped. Passwords are hashed across a process pool because hashing, not
+    the inserts, dominates the cost of a large import; with workers=1, or for
+    batches under INLINE_HASH_ROWS passwords, they are hashed inline. A file
+    with more than `max_rows` rows is rejected without importing anything.
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.StringIO(stream.decode('utf-8-sig'))
+    elif isinstance(stream, str):
+        stream = io.StringIO(stream)
+
+    result = ImportResult()
+    reader = csv.DictReader(stream)
+    columns = {(name or '').strip().lower() for name in reader.fieldnames or []}
+    missing = REQUIRED_COLUMNS - columns
+    if missing:
+        result.errors.append(f"Missing required column(s): {', '.join(sorted(missing))}")
+        return result
+
+    if max_rows is not None:
+        reader = list(itertools.islice(reader, max_rows + 1))
+        if len(reader) > max_rows:
+            result.errors.append(f"File has more than {max_rows} rows; import it with `flask import-users`")
+            return result
+
+    rows = _parse_rows(reader, default_credits, validate_phone, result)
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    try:
+        for batch in _batches(rows, batch_size):
+            plaintext = [row for row in batch if not row['password_hash']]
+            hashes, pool = _hash_passwords([row['password'] for row in plaintext], workers, pool)
+            for row, password_hash in zip(plaintext, hashes):
+                row['password_hash'] = password_hash
+            for row in batch:
+                del row['password']
+
+            _insert_batch(batch, result)
+            logger.info(f"Imported {result.created} users so far ({result.skipped} skipped)")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return result
@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = 'X-DB-Query-Count'
+QUERY_TIME_HEADER = 'X-DB-Time-Ms'
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class _AppProfile:
+    """One app's profiling settings and aggregates (app.extensions['query_profiler'])."""
+
+    def __init__(self, enabled, slow_query_ms):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.slow_statements = []
+
+
+class QueryProfiler:
+    """
+    Opt-in per-request SQL instrumentation.
+
+    Counts queries and DB time for each request through SQLAlchemy engine
+    events, adds them as response headers and keeps per-endpoint aggregates
+    for the admin report. Enable with the SQL_PROFILING config flag; each
+    app has its own settings and aggregates. The engine hooks are only
+    installed once an app enables profiling or a budget() block is entered,
+    so otherwise statements run without them.
+    """
+
+    def __init__(self, app=None, slowest=5, max_statements=20):
+        self.slowest = slowest
+        self.max_statements = max_statements
+        self._budgets = threading.local()
+        self._hooks_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        enabled = bool(app.config.get('SQL_PROFILING'))
+        app.extensions['query_profiler'] = _AppProfile(enabled, float(app.config.get('SQL_SLOW_QUERY_MS', 100)))
+        if enabled:
+            self._install_hooks()
+            app.before_request(self._start_request)
+            app.after_request(self._finish_request)
+            logger.info("SQL query profiling enabled")
+
+    @staticmethod
+    def _profile():
+        return current_app.extensions['query_profiler']
+
+    @property
+    def enabled(self):
+        return self._profile().enabled
+
+    def reset(self):
+        profile = self._profile()
+        with profile.lock:
+            profile.endpoints = {}
+            profile.slow_statements = []
+
+    # Engine hooks
+
+    def _install_hooks(self):
+        # Process-wide and left in place once installed; outside a profiled
+        # request or budget block they only time the statement
+        with self._hooks_lock:
+            if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+                event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+                event.listen(Engine, 'handle_error', self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start_time')
+        if not starts:
+            # Started before the hooks were installed
+            return
+        elapsed = time.perf_counter() - starts.pop()
+
+        budgets = getattr(self._budgets, 'active', None)
+        if budgets:
+            for budget in budgets:
+                budget.append(statement)
+
+        # Only set in requests to an app with profiling enabled
+        if not has_request_context():
+            return
+        profile = g.get('query_profile')
+        if profile is None:
+            return
+        profile['count'] += 1
+        profile['time'] += elapsed
+        profile['statements'].append((elapsed, statement))
+        if elapsed * 1000 >= self._profile().slow_query_ms:
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) on {request.endpoint}: {statement[:200]}")
+
+    def _handle_error(self, context):
+        # A failed statement never reaches after_cursor_execute; drop its start
+        # time so it doesn't pile up on the pooled connection
+        if context.statement is not None and context.connection is not None:
+            starts = context.connection.info.get('query_start_time')
+            if starts:
+                starts.pop()
+
+    # Request hooks
+
+    def _start_request(self):
+        g.query_profile = {'count': 0, 'time': 0.0, 'statements': []}
+
+    def _finish_request(self, response):
+        profile = g.pop('query_profile', None)
+        if profile is None:
+            return response
+
+        response.headers[QUERY_COUNT_HEADER] = str(profile['count'])
+        response.headers[QUERY_TIME_HEADER] = f"{profile['time'] * 1000:.2f}"
+
+        slowest = sorted(profile['statements'], key=lambda s: s[0], reverse=True)[:self.slowest]
+        endpoint = request.endpoint or request.path
+        aggregates = self._profile()
+        with aggregates.lock:
+            stats = aggregates.endpoints.setdefault(endpoint, {
+                'endpoint': endpoint,
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'db_time': 0.0,
+                'max_db_time': 0.0,
+            })
+            stats['requests'] += 1
+            stats['queries'] += profile['count']
+            stats['max_queries'] = max(stats['max_queries'], profile['count'])
+            stats['db_time'] += profile['time']
+            stats['max_db_time'] = max(stats['max_db_time'], profile['time'])
+
+            for elapsed, statement in slowest:
+                aggregates.slow_statements.append({
+                    'endpoint': endpoint,
+                    'time_ms': elapsed * 1000,
+                    'statement': statement,
+                })
+            aggregates.slow_statements.sort(key=lambda s: s['time_ms'], reverse=True)
+            del aggregates.slow_statements[self.max_statements:]
+
+        return response
+
+    # Reporting
+
+    def report(self):
+        """Per-endpoint aggregates for the current app, worst average query count first."""
+        aggregates = self._profile()
+        with aggregates.lock:
+            rows = []
+            for stats in aggregates.endpoints.values():
+                rows.append(dict(
+                    stats,
+                    avg_queries=stats['queries'] / stats['requests'],
+                    avg_db_time_ms=stats['db_time'] * 1000 / stats['requests'],
+                    max_db_time_ms=stats['max_db_time'] * 1000,
+                ))
+            rows.sort(key=lambda r: r['avg_queries'], reverse=True)
+            return {'endpoints': rows, 'slow_statements': list(aggregates.slow_statements)}
+
+    @contextmanager
+    def budget(self, max_queries):
+        """
+        Fail if the block runs more than max_queries statements on this thread.
+
+        Example:
+            with query_profiler.budget(3):
+                client.get('/dashboard')
+        """
+        self._install_hooks()
+        statements = []
+        active = getattr(self._budgets, 'active', None)
+        if active is None:
+            active = self._budgets.active = []
+        active.append(statements)
+        try:
+            yield statements
+        finally:
+            active.remove(statements)
+        if len(statements) > max_queries:
+            listing = '\n'.join(f'  {s[:200]}' for s in statements)
+            raise QueryBudgetExceeded(
+                f"Expected at most {max_queries} queries, ran {len(statements)}:\n{listing}"
+            )
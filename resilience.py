@@ -0,0 +1,174 @@
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_STATUS_CODES = {408, 425, 429}
+
+
+@functools.lru_cache(maxsize=None)
+def transient_errors():
+    """Provider client exceptions worth retrying; imported on first use to keep app import cheap."""
+    import requests
+    import telnyx.error
+
+    return (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        telnyx.error.APIConnectionError,
+        telnyx.error.RateLimitError,
+        telnyx.error.ServiceUnavailableError,
+        telnyx.error.TimeoutError,
+    )
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class ProviderResponseError(Exception):
+    """A provider answered with an error status."""
+
+    def __init__(self, status, body=''):
+        super().__init__(f"HTTP {status}: {body}")
+        self.http_status = status
+
+
+class TransientDeliveryError(Exception):
+    """A send failed in a way that is worth retrying later."""
+
+
+def is_transient(error):
+    """True for failures that may succeed on retry: outages, timeouts and throttling."""
+    while error is not None:
+        if isinstance(error, (CircuitOpenError, TransientDeliveryError) + transient_errors()):
+            return True
+        status = getattr(error, 'http_status', None)
+        if isinstance(status, int) and (status in TRANSIENT_STATUS_CODES or status >= 500):
+            return True
+        error = error.__cause__
+    return False
+
+
+def backoff_delay(attempt, base=60, cap=3600, rng=random):
+    """Seconds to wait before retry number `attempt` (0-based), with full jitter."""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    After `failure_threshold` consecutive transient failures the circuit
+    opens and calls fail immediately with CircuitOpenError. Once
+    `reset_timeout` seconds have passed a single probe call is let through;
+    its success closes the circuit, its failure opens it again. Permanent
+    errors (bad number, invalid request) count neither against the provider
+    nor for it: they don't reset the failure count or close the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """True if a call may go to the provider now (and reserves the probe when half open)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info(f"Circuit for {self.name} half open, probing provider")
+                return True
+            return False
+
+    def is_open(self):
+        """True while calls would be short-circuited; does not reserve a probe."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self._probing
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """Give up a reserved probe without a verdict, so the next call probes instead."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    @contextmanager
+    def call(self):
+        """
+        Guard a provider call.
+
+        Example:
+            with breakers['telnyx'].call():
+                telnyx.Message.create(...)
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit open, not sending")
+        try:
+            yield
+        except Exception as e:
+            if is_transient(e):
+                self.record_failure()
+            else:
+                # Says nothing about the provider's health either way
+                self.release_probe()
+            raise
+        self.record_success()
+
+
+PROVIDERS = ('mailersend', 'telnyx')
+
+
+def init_breakers(app):
+    """Give `app` one breaker per provider, configured from its CIRCUIT_* settings."""
+    app.extensions['breakers'] = {
+        name: CircuitBreaker(name,
+                             failure_threshold=app.config.get('CIRCUIT_FAILURE_THRESHOLD', 5),
+                             reset_timeout=app.config.get('CIRCUIT_RESET_SECONDS', 30))
+        for name in PROVIDERS
+    }
+
+
+# The current app's breakers, by provider name
+breakers = LocalProxy(lambda: current_app.extensions['breakers'])
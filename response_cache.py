@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of rendered page bodies.
+
+    Keys embed everything the page depends on (user id, schedule version,
+    credits, date, host), so entries are never invalidated explicitly: a
+    change produces a new key and the old entry ages out.
+    """
+
+    def __init__(self, maxsize=2000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,196 @@
+import hashlib
+from datetime import datetime
+
+import pytz
+
+from database import db
+from models import BinSchedule, NOTIFICATION_HOURS
+from timezones import is_valid_timezone
+
+BIN_TYPES = ('refuse', 'recycling', 'garden_waste')
+FREQUENCIES = ('weekly', 'biweekly')
+NOTIFICATION_TYPES = ('email', 'sms', 'both')
+MAX_SCHEDULE_CHANGES = 20
+
+# Compact preference keys -> User column suffix
+SLOT_FIELDS = {'on': '', 'hour': '_time', 'via': '_type'}
+
+
+class ApiValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def state_etag(user_id, schedule_version):
+    """ETag for a user's API state; changes exactly when schedule_version does."""
+    return hashlib.sha1(f'api:{user_id}:{schedule_version}'.encode()).hexdigest()[:20]
+
+
+def serialize_state(user, schedules):
+    """
+    Compact JSON-ready view of a user's schedules and notification preferences.
+
+    Dates are YYYY-MM-DD and preference keys are short, so a typical state is
+    a few hundred bytes.
+    """
+    state = {
+        'v': user.schedule_version,
+        'tz': user.timezone,
+        'schedules': [
+            {
+                'id': schedule.id,
+                'bin': schedule.bin_type,
+                'freq': schedule.frequency,
+                'next': schedule.next_collection.strftime('%Y-%m-%d'),
+            }
+            for schedule in sorted(schedules, key=lambda s: s.bin_type)
+        ],
+    }
+    for slot in NOTIFICATION_HOURS:
+        state[slot] = {
+            key: getattr(user, f'{slot}_notification{suffix}')
+            for key, suffix in SLOT_FIELDS.items()
+        }
+    return state
+
+
+def _parse_next(value):
+    """Collection date from YYYY-MM-DD, today (GMT) or later; None if invalid."""
+    try:
+        next_collection = datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+    if next_collection.date() < datetime.now(pytz.timezone('GMT')).date():
+        return None
+    return next_collection
+
+
+def _validate_schedule_changes(changes, existing, errors):
+    if not isinstance(changes, list):
+        errors.append('schedules: must be a list')
+        return []
+    if len(changes) > MAX_SCHEDULE_CHANGES:
+        errors.append(f'schedules: at most {MAX_SCHEDULE_CHANGES} changes per request')
+        return []
+
+    validated = []
+    seen = set()
+    for index, change in enumerate(changes):
+        where = f'schedules[{index}]'
+        if not isinstance(change, dict):
+            errors.append(f'{where}: must be an object')
+            continue
+        unknown = set(change) - {'bin', 'freq', 'next', 'delete'}
+        if unknown:
+            errors.append(f"{where}: unknown fields {', '.join(sorted(unknown))}")
+            continue
+
+        bin_type = change.get('bin')
+        if bin_type not in BIN_TYPES:
+            errors.append(f"{where}.bin: must be one of {', '.join(BIN_TYPES)}")
+            continue
+        if bin_type in seen:
+            errors.append(f'{where}.bin: {bin_type} changed more than once')
+            continue
+        seen.add(bin_type)
+
+        if change.get('delete'):
+            # Deleting a schedule that is already gone is a no-op, so retries are safe
+            if bin_type in existing:
+                validated.append((bin_type, None))
+            continue
+
+        fields = {}
+        if 'freq' in change:
+            if change['freq'] not in FREQUENCIES:
+                errors.append(f"{where}.freq: must be one of {', '.join(FREQUENCIES)}")
+                continue
+            fields['frequency'] = change['freq']
+        if 'next' in change:
+            next_collection = _parse_next(change['next'])
+            if next_collection is None:
+                errors.append(f'{where}.next: must be a YYYY-MM-DD date from today onwards')
+                continue
+            fields['next_collection'] = next_collection
+        if bin_type not in existing and len(fields) < 2:
+            errors.append(f'{where}: freq and next are required for a new schedule')
+            continue
+        validated.append((bin_type, fields))
+    return validated
+
+
+def _validate_slot_changes(slot, changes, errors):
+    if not isinstance(changes, dict):
+        errors.append(f'{slot}: must be an object')
+        return {}
+    unknown = set(changes) - set(SLOT_FIELDS)
+    if unknown:
+        errors.append(f"{slot}: unknown fields {', '.join(sorted(unknown))}")
+        return {}
+
+    fields = {}
+    if 'on' in changes:
+        if not isinstance(changes['on'], bool):
+            errors.append(f'{slot}.on: must be true or false')
+        else:
+            fields[f'{slot}_notification'] = changes['on']
+    if 'hour' in changes:
+        hour = changes['hour']
+        if isinstance(hour, bool) or not isinstance(hour, int) or hour not in NOTIFICATION_HOURS[slot]:
+            hours = NOTIFICATION_HOURS[slot]
+            errors.append(f'{slot}.hour: must be between {hours.start} and {hours.stop - 1}')
+        else:
+            fields[f'{slot}_notification_time'] = hour
+    if 'via' in changes:
+        if changes['via'] not in NOTIFICATION_TYPES:
+            errors.append(f"{slot}.via: must be one of {', '.join(NOTIFICATION_TYPES)}")
+        else:
+            fields[f'{slot}_notification_type'] = changes['via']
+    return fields
+
+
+def apply_changes(user, schedules, payload):
+    """
+    Validate a batch of changes and apply them to `user` and its schedules.
+
+    `payload` may contain `schedules` (a list of upserts keyed by bin type, or
+    {"bin": ..., "delete": true}), `evening`/`morning` preference objects and
+    `tz`; anything omitted is left as it is. Every change is validated before
+    any is applied, so a batch is all or nothing. Raises ApiValidationError.
+    The caller commits.
+    """
+    if not isinstance(payload, dict):
+        raise ApiValidationError(['body: must be a JSON object'])
+    unknown = set(payload) - {'schedules', 'tz', *NOTIFICATION_HOURS}
+    if unknown:
+        raise ApiValidationError([f"body: unknown fields {', '.join(sorted(unknown))}"])
+
+    errors = []
+    existing = {schedule.bin_type: schedule for schedule in schedules}
+    schedule_changes = _validate_schedule_changes(payload.get('schedules', []), existing, errors)
+
+    user_fields = {}
+    for slot in NOTIFICATION_HOURS:
+        if slot in payload:
+            user_fields.update(_validate_slot_changes(slot, payload[slot], errors))
+    if 'tz' in payload:
+        if not isinstance(payload['tz'], str) or not is_valid_timezone(payload['tz']):
+            errors.append('tz: must be an IANA time zone name')
+        else:
+            user_fields['timezone'] = payload['tz']
+
+    if errors:
+        raise ApiValidationError(errors)
+
+    for bin_type, fields in schedule_changes:
+        schedule = existing.get(bin_type)
+        if fields is None:
+            db.session.delete(schedule)
+        elif schedule is None:
+            db.session.add(BinSchedule(user_id=user.id, bin_type=bin_type, **fields))
+        else:
+            for name, value in fields.items():
+                setattr(schedule, name, value)
+    for name, value in user_fields.items():
+        setattr(user, name, value)
@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+from flask import url_for
+
+# GSM 03.38 default alphabet; anything else forces the whole message into UCS-2
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Extension table characters take an escape plus the character (2 septets)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+# Lookalikes that templates pick up from word processors, replaced with
+# their GSM-7 equivalents so one smart quote doesn't switch the message to UCS-2
+GSM7_REPLACEMENTS = {
+    '‘': "'", '’': "'", '‚': "'", '′': "'",
+    '“': '"', '”': '"', '„': '"', '″': '"',
+    '–': '-', '—': '-', '−': '-',
+    '…': '...', ' ': ' ', '•': '-', '\t': ' ',
+}
+
+# (single-segment limit, per-segment limit once concatenated), in septets for
+# GSM-7 and UTF-16 code units for UCS-2
+SEGMENT_LIMITS = {
+    'GSM-7': (160, 153),
+    'UCS-2': (70, 67),
+}
+
+SegmentInfo = namedtuple('SegmentInfo', 'encoding length segments unsupported')
+
+# Worst-case values for previewing templates: the longest bin list and date
+PREVIEW_VALUES = {
+    'bin_type': 'garden waste',
+    'bin_types': 'refuse, recycling and garden waste',
+    'collection_date': 'Wednesday, September 30, 2026',
+    'sms_balance': 100,
+}
+PREVIEW_REFERRAL_CODE = 'a1b2c3d4'
+
+
+def to_gsm7(text):
+    """Replace typographic punctuation that has a GSM-7 equivalent."""
+    return ''.join(GSM7_REPLACEMENTS.get(char, char) for char in text)
+
+
+def segment_info(text):
+    """Encoding, length in encoding units, segment count and the characters that forced UCS-2."""
+    unsupported = sorted({char for char in text if char not in GSM7_BASIC and char not in GSM7_EXTENDED})
+    if unsupported:
+        encoding = 'UCS-2'
+        length = len(text.encode('utf-16-le')) // 2
+    else:
+        encoding = 'GSM-7'
+        length = sum(2 if char in GSM7_EXTENDED else 1 for char in text)
+    single, multi = SEGMENT_LIMITS[encoding]
+    segments = 1 if length <= single else -(-length // multi)
+    return SegmentInfo(encoding, length, segments, unsupported)
+
+
+def fit_segments(required, optional=(), max_segments=1):
+    """
+    `required` followed by as many of the `optional` parts (in order) as
+    still fit in `max_segments`; `required` alone is returned even if longer.
+    """
+    text = required
+    for part in optional:
+        if segment_info(text + part).segments > max_segments:
+            break
+        text += part
+    return text
+
+
+def short_invite_url(referral_code):
+    """Short /r/<code> link to the registration page with the referral code."""
+    return url_for('main.short_link', code=referral_code, _external=True)
+
+
+def preview_template(template):
+    """
+    Render an SMS template with worst-case values and return (text, SegmentInfo),
+    or (None, None) if it doesn't render. Needs a request context for the link.
+    """
+    text = template.render(invite_url=short_invite_url(PREVIEW_REFERRAL_CODE), **PREVIEW_VALUES)
+    if text is None:
+        return None, None
+    text = to_gsm7(text)
+    return text, segment_info(text)
@@ -1,10 +1,12 @@
 import os
-import telnyx
 import logging
 from database import db
-from flask import url_for
 import re
 from models import SMSTemplate, SMSLog  # Added SMSLog import
+from resilience import breakers, is_transient, TransientDeliveryError
+from digest import DIGEST_TEMPLATE, describe_bin_types, log_bin_types
+from sms_composer import to_gsm7, segment_info, fit_segments, short_invite_url
+from dispatch_runs import count, phase
 
 logger = logging.getLogger(__name__)
 
@@ -15,22 +17,22 @@ def format_phone_number(phone_number: str) -> str:
         cleaned = re.sub(r'\D', '', phone_number)
 
         # Log the cleaning process
-        logger.info(f"Cleaning phone number: {phone_number} -> {cleaned}")
+        logger.debug("Cleaning phone number: %s -> %s", phone_number, cleaned)
 
         # If number starts with '0', assume UK number and replace with +44
         if cleaned.startswith('0'):
             cleaned = '44' + cleaned[1:]
-            logger.info(f"Converting UK number: added country code -> {cleaned}")
+            logger.debug("Converting UK number: added country code -> %s", cleaned)
 
         # If no country code (less than 11 digits), assume UK and add +44
         if len(cleaned) <= 10:
             cleaned = '44' + cleaned
-            logger.info(f"Adding UK country code to short number -> {cleaned}")
+            logger.debug("Adding UK country code to short number -> %s", cleaned)
 
         # Add + prefix if not present
         if not cleaned.startswith('+'):
             cleaned = '+' + cleaned
-            logger.info(f"Adding + prefix -> {cleaned}")
+            logger.debug("Adding + prefix -> %s", cleaned)
 
         return cleaned
     except Exception as e:
@@ -45,8 +47,15 @@ def get_telnyx_client():
         return None
 
     try:
-        logger.info(f"Initializing Telnyx client with API key (length: {len(api_key)})")
+        # Imported here so importing the app doesn't pay for the SDK
+        import telnyx
+
+        logger.debug("Initializing Telnyx client with API key (length: %d)", len(api_key))
         telnyx.api_key = api_key.strip()
+        # Allow pointing at a local stand-in (see benchmarks/fake_providers.py)
+        api_base = os.environ.get("TELNYX_API_BASE")
+        if api_base:
+            telnyx.api_base = api_base.rstrip('/')
         return telnyx
     except Exception as e:
         logger.error(f"Failed to initialize Telnyx client: {str(e)}")
@@ -65,8 +74,17 @@ def get_message_from_template(template_name, **kwargs):
         logger.error(f"Error getting template '{template_name}': {str(e)}")
     return None
 
-def send_sms_reminder(to_phone_number: str, bin_type: str, collection_date, user) -> bool:
-    """Send SMS reminder with error handling, logging, and credit check."""
+def send_sms_reminder(to_phone_number: str, bin_type, collection_date, user, raise_transient=False) -> bool:
+    """
+    Send SMS reminder with error handling, logging, and credit check.
+
+    `bin_type` may be a list of bin types collected on the same day, which are
+    sent as one digest message costing a single credit. With raise_transient,
+    failures worth retrying raise TransientDeliveryError (after being logged)
+    instead of returning False.
+    """
+    bin_types = [bin_type] if isinstance(bin_type, str) else list(bin_type)
+    bins = describe_bin_types(bin_types)
     try:
         # Check if user has SMS credits
         if not user.has_sms_credits():
@@ -82,54 +100,77 @@ def send_sms_reminder(to_phone_number: str, bin_type: str, collection_date, user
         formatted_to_number = format_phone_number(to_phone_number)
         source_number = format_phone_number(os.environ.get("TELNYX_PHONE_NUMBER", ""))
 
-        logger.info(f"Phone number formatting completed - From: {source_number}, To: {formatted_to_number}")
-
-        # Create invite URL
-        invite_url = url_for('register', ref=user.referral_code, _external=True)
-        logger.info(f"Generated invite URL: {invite_url}")
-
-        # Get message from template or use default
-        message_text = get_message_from_template('collection_reminder', 
-            bin_type=bin_type,
-            collection_date=collection_date.strftime('%A, %B %d, %Y'),
-            invite_url=invite_url,
-            user=user
-        )
-
-        if not message_text:
-            logger.warning("Template 'collection_reminder' not found or inactive, using default message")
-            message_text = (
-                f"Reminder: Your {bin_type} bin collection is scheduled for tomorrow, "
-                f"{collection_date.strftime('%A, %B %d, %Y')}. Please ensure your bin is "
-                f"placed outside before collection time.\n\n"
-                f"You have {user.sms_credits} SMS credits remaining.\n"
-                f"Invite friends to get more SMS credits! Share your link: {invite_url}"
+        logger.debug("Phone number formatting completed - From: %s, To: %s", source_number, formatted_to_number)
+
+        with phase('render'):
+            # Short /r/<code> invite link; the full register URL costs a segment
+            invite_url = short_invite_url(user.referral_code)
+            logger.debug("Generated invite URL: %s", invite_url)
+
+            # Get message from template or use default. Digests prefer their own
+            # template and fall back to the single reminder with the bins listed.
+            message_text = None
+            if len(bin_types) > 1:
+                message_text = get_message_from_template(DIGEST_TEMPLATE,
+                    bin_types=bins,
+                    bin_type=bins,
+                    collection_date=collection_date.strftime('%A, %B %d, %Y'),
+                    invite_url=invite_url,
+                    user=user
+                )
+            if not message_text:
+                message_text = get_message_from_template('collection_reminder', 
+                    bin_type=bins,
+                    collection_date=collection_date.strftime('%A, %B %d, %Y'),
+                    invite_url=invite_url,
+                    user=user
+                )
+
+            if not message_text:
+                logger.warning("Template 'collection_reminder' not found or inactive, using default message")
+                bins_are, them = ('bins are', 'them') if len(bin_types) > 1 else ('bin is', 'it')
+                reminder = (
+                    f"Reminder: your {bins} {bins_are} collected tomorrow, "
+                    f"{collection_date.strftime('%a %d %b')}. Please put {them} out."
+                )
+                # The credits line and invite link are only added while the
+                # message stays within one segment
+                message_text = fit_segments(reminder, [
+                    f"\n{user.sms_credits} SMS credits left.",
+                    f"\nInvite friends for more: {invite_url}",
+                ])
+
+            message_text = to_gsm7(message_text)
+            segments = segment_info(message_text)
+        logger.debug("Attempting to send SMS - %d %s chars, %d segment(s)", segments.length, segments.encoding, segments.segments)
+        logger.debug("Message content: %s", message_text)
+
+        with phase('send'), breakers['telnyx'].call():
+            message = telnyx_client.Message.create(
+                from_=source_number,
+                to=formatted_to_number,
+                text=message_text
             )
-
-        logger.info(f"Attempting to send SMS - Length: {len(message_text)} chars")
-        logger.debug(f"Message content: {message_text}")
-
-        message = telnyx_client.Message.create(
-            from_=source_number,
-            to=formatted_to_number,
-            text=message_text
-        )
-        logger.info(f"Telnyx API response - Message ID: {message.id}")
+        logger.debug("Telnyx API response - Message ID: %s", message.id)
 
         # Create SMS log entry
         sms_log = SMSLog(
             recipient_phone=formatted_to_number,
             message_text=message_text,
             status='success',
-            bin_type=bin_type
+            bin_type=log_bin_types(bin_types),
+            provider_message_id=message.id
         )
         db.session.add(sms_log)
 
         # Deduct SMS credit
-        user.use_sms_credit()
-        db.session.commit()
+        with phase('commit'):
+            credit_used = user.use_sms_credit()
+            db.session.commit()
+        if credit_used:
+            count('credits_used')
 
-        logger.info(f"Successfully sent SMS reminder to {formatted_to_number} (ID: {message.id})")
+        logger.debug("Successfully sent SMS reminder to %s (ID: %s)", formatted_to_number, message.id)
         return True
     except Exception as e:
         logger.error(f"Failed to send SMS reminder to {to_phone_number}: {str(e)}")
@@ -140,12 +181,15 @@ def send_sms_reminder(to_phone_number: str, bin_type: str, collection_date, user
                 message_text=message_text if 'message_text' in locals() else "Message creation failed",
                 status='failure',
                 error_message=str(e),
-                bin_type=bin_type
+                bin_type=log_bin_types(bin_types)
             )
             db.session.add(sms_log)
-            db.session.commit()
+            with phase('commit'):
+                db.session.commit()
         except Exception as log_error:
             logger.error(f"Failed to create SMS log entry: {str(log_error)}")
+        if raise_transient and is_transient(e):
+            raise TransientDeliveryError(str(e)) from e
         return False
 
 def send_test_sms(to_phone_number: str, user) -> bool:
@@ -167,8 +211,7 @@ def send_test_sms(to_phone_number: str, user) -> bool:
 
         logger.info(f"Formatted numbers - From: {source_number}, To: {formatted_to_number}")
 
-        # Create invite URL using Flask's url_for
-        invite_url = url_for('register', ref=user.referral_code, _external=True)
+        invite_url = short_invite_url(user.referral_code)
 
         # Get message from template or use default
         message_text = get_message_from_template('test_message',
@@ -184,7 +227,10 @@ def send_test_sms(to_phone_number: str, user) -> bool:
                 f"Invite friends to get more SMS credits! Share your link: {invite_url}"
             )
 
-        logger.info(f"Attempting to send test SMS from {source_number} to {formatted_to_number}")
+        message_text = to_gsm7(message_text)
+        segments = segment_info(message_text)
+        logger.info(f"Attempting to send test SMS from {source_number} to {formatted_to_number} "
+                    f"({segments.segments} {segments.encoding} segment(s))")
         message = telnyx_client.Message.create(
             from_=source_number,
             to=formatted_to_number,
@@ -195,7 +241,8 @@ def send_test_sms(to_phone_number: str, user) -> bool:
         sms_log = SMSLog(
             recipient_phone=formatted_to_number,
             message_text=message_text,
-            status='success'
+            status='success',
+            provider_message_id=message.id
         )
         db.session.add(sms_log)
 
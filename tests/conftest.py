@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+# app.py builds its module-level app on import
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('SESSION_SECRET', 'test')
+
+from app import create_app  # noqa: E402
+from database import db  # noqa: E402
+from models import User  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A file database: the ledger and the lease use their own connections
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'USER_CACHE_TTL': 0,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(email, **fields):
+        user = User(email=email, phone='07700900000', **fields)
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
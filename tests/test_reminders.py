@@ -0,0 +1,121 @@
+from datetime import date, datetime
+
+from sqlalchemy import update
+
+from database import db
+from leader_election import LeaderElection
+from models import ApiToken, BinSchedule, NotificationDelivery, SchedulerLease, User
+from planner import plan_notifications
+
+
+class FakeScheduler:
+    running = False
+
+    def start(self, paused=False):
+        self.running = True
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+
+def test_ledger_claim_is_idempotent(app, make_user):
+    user = make_user('ledger@example.com')
+    schedule = BinSchedule(user_id=user.id, bin_type='refuse', frequency='weekly',
+                           next_collection=datetime(2030, 1, 15))
+    db.session.add(schedule)
+    db.session.commit()
+    key = (schedule.id, date(2030, 1, 15), 'evening')
+
+    assert NotificationDelivery.claim(*key, 'email')
+    assert not NotificationDelivery.claim(*key, 'email')
+    # Each channel and slot is its own delivery
+    assert NotificationDelivery.claim(*key, 'sms')
+    assert NotificationDelivery.claim(schedule.id, date(2030, 1, 15), 'morning', 'email')
+
+    NotificationDelivery.release(*key, 'email')
+    assert NotificationDelivery.claim(*key, 'email')
+    assert NotificationDelivery.query.count() == 3
+
+
+def test_lease_is_taken_over_once_expired(app):
+    first = LeaderElection(app, FakeScheduler(), lease_seconds=60)
+    second = LeaderElection(app, FakeScheduler(), lease_seconds=60)
+
+    assert first._try_acquire()
+    assert not second._try_acquire()
+    # Renewing keeps it
+    assert first._try_acquire()
+    assert not second._try_acquire()
+
+    db.session.execute(update(SchedulerLease).values(expires_at=datetime(2000, 1, 1)))
+    db.session.commit()
+    assert second._try_acquire()
+    assert not first._try_acquire()
+    assert db.session.get(SchedulerLease, second.name).holder == second.identity
+
+
+def test_lease_release_hands_over_immediately(app):
+    first = LeaderElection(app, FakeScheduler(), lease_seconds=60)
+    second = LeaderElection(app, FakeScheduler(), lease_seconds=60)
+
+    assert first._try_acquire()
+    first._release()
+    assert second._try_acquire()
+
+
+def test_api_patch_with_stale_if_match_is_refused(client, make_user):
+    user = make_user('api@example.com')
+    _, token = ApiToken.issue(user.id)
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/api/v1/state', headers=headers)
+    etag = response.headers['ETag']
+
+    response = client.patch('/api/v1/state', headers={**headers, 'If-Match': '"stale"'},
+                            json={'tz': 'America/New_York'})
+    assert response.status_code == 412
+    assert client.get('/api/v1/state', headers=headers).get_json()['tz'] == 'Europe/London'
+
+    response = client.patch('/api/v1/state', headers={**headers, 'If-Match': etag},
+                            json={'tz': 'America/New_York'})
+    assert response.status_code == 200
+    assert response.get_json()['tz'] == 'America/New_York'
+    assert response.headers['ETag'] != etag
+
+    # The ETag the first write used is now stale too
+    response = client.patch('/api/v1/state', headers={**headers, 'If-Match': etag},
+                            json={'tz': 'Europe/Paris'})
+    assert response.status_code == 412
+    db.session.expire_all()
+    assert db.session.get(User, user.id).timezone == 'America/New_York'
+
+
+def test_plan_counts_same_day_bins_as_one_digest(app, make_user):
+    collection = datetime(2030, 1, 15)
+    digest_user = make_user('digest@example.com', evening_notification_type='email')
+    sms_user = make_user('sms@example.com', evening_notification_type='both', timezone='America/New_York')
+    for user, bin_type in [(digest_user, 'refuse'), (digest_user, 'recycling'), (sms_user, 'garden_waste')]:
+        db.session.add(BinSchedule(user_id=user.id, bin_type=bin_type, frequency='weekly',
+                                   next_collection=collection))
+    db.session.add(BinSchedule(user_id=digest_user.id, bin_type='garden_waste', frequency='weekly',
+                               next_collection=datetime(2030, 1, 18)))
+    db.session.commit()
+
+    plan = plan_notifications(date(2030, 1, 14), days=1, slots=['evening'])
+    run = plan['runs'][0]
+
+    assert run['collection_dates'] == ['2030-01-15']
+    # Two bins for the first user share one email
+    assert run['email'] == 2
+    assert run['sms'] == 1
+    assert run['by_bin_type']['refuse'] == {'email': 1, 'sms': 0}
+    assert run['by_bin_type']['recycling'] == {'email': 1, 'sms': 0}
+    assert run['by_bin_type']['garden_waste'] == {'email': 1, 'sms': 1}
+    # 18:00 local: London is on UTC in January, New York five hours behind
+    assert run['by_hour'] == {'18': {'email': 1, 'sms': 0}, '23': {'email': 1, 'sms': 1}}
+    assert run['credits_consumed'] == 1
+    assert plan['totals']['skipped_sms'] == 0
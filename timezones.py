@@ -0,0 +1,36 @@
+from collections import defaultdict
+
+import pytz
+
+DEFAULT_TIMEZONE = 'Europe/London'
+
+# Offered in the preferences form; any IANA name in pytz.all_timezones is accepted
+COMMON_TIMEZONES = pytz.common_timezones
+
+
+def is_valid_timezone(name):
+    return name in pytz.all_timezones_set
+
+
+def offset_buckets(run_at, zones):
+    """
+    Group time zones by their UTC offset at `run_at` (an aware UTC datetime).
+
+    Returns a list of (local_date, local_hour, [zone names]), one per
+    distinct offset. Conversion happens once per zone rather than once per
+    user. Zones with a half-hour offset fall into the hour that has just
+    started locally.
+    """
+    buckets = defaultdict(list)
+    for name in zones:
+        try:
+            offset = run_at.astimezone(pytz.timezone(name)).utcoffset()
+        except pytz.UnknownTimeZoneError:
+            offset = run_at.astimezone(pytz.timezone(DEFAULT_TIMEZONE)).utcoffset()
+        buckets[offset].append(name)
+
+    result = []
+    for offset, names in sorted(buckets.items()):
+        local = run_at + offset
+        result.append((local.date(), local.hour, sorted(names)))
+    return result
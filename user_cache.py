@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    Short-lived, size-bounded cache of session user snapshots.
+
+    Snapshots are detached copies of a user's column values. They are merged
+    back into the request's session with load=False, so a cache hit costs no
+    query while lazy relationships still load normally. Any flush that changes
+    or deletes a cached row invalidates it in the current app's cache (each
+    app keeps its own in app.extensions['user_cache']); other processes see
+    the change once the TTL expires, so checks that can't lag (admin access,
+    see decorators.admin_required) read the database instead.
+    """
+
+    def __init__(self, model, ttl=10, maxsize=10000):
+        self.model = model
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session, user_id):
+        """Return the user attached to `session`, from cache when possible."""
+        if self.ttl <= 0:
+            return session.get(self.model, user_id)
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                snapshot, expires = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                else:
+                    del self._entries[user_id]
+                    snapshot = None
+            else:
+                snapshot = None
+
+        if snapshot is not None:
+            return session.merge(snapshot, load=False)
+
+        self.misses += 1
+        user = session.get(self.model, user_id)
+        if user is not None:
+            self.put(user)
+        return user
+
+    def put(self, user):
+        state = inspect(user)
+        if state.key is None or state.modified:
+            return
+
+        mapper = state.mapper
+        snapshot = mapper.class_manager.new_instance()
+        for attr in mapper.column_attrs:
+            if attr.key in state.dict:
+                set_committed_value(snapshot, attr.key, state.dict[attr.key])
+        make_transient_to_detached(snapshot)
+
+        with self._lock:
+            self._entries[state.identity[0]] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(state.identity[0])
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate_flushed(self, session):
+        for instance in list(session.dirty) + list(session.deleted):
+            if isinstance(instance, self.model):
+                identity = inspect(instance).identity
+                if identity:
+                    self.invalidate(identity[0])
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    # One listener for every app; the flushing app's cache is the one to update
+    cache = current_app.extensions.get('user_cache') if has_app_context() else None
+    if cache is not None:
+        cache.invalidate_flushed(session)